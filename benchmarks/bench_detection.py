@@ -0,0 +1,207 @@
+"""
+End-to-end benchmark of vessel_detection.run on synthetic clips.
+
+Each scenario (resolution x length) runs in a fresh interpreter, so peak RSS is per
+scenario. MongoDB is replaced by mongomock unless --mongo-uri points at a local mongod,
+in which case every command sent to the server is counted as a round trip. Redis
+progress publishing is disabled.
+
+Reported per scenario: fps, p50/p95 per-frame latency, peak RSS, and DB round trips
+(mongod) or MongoDBHandler operations (mongomock). Results are written as JSON, keyed by
+commit, and can be compared with an earlier run.
+
+Usage:
+    python benchmarks/bench_detection.py [--scenarios 640x360x150,1280x720x300]
+        [--weights PATH] [--mongo-uri mongodb://localhost:27017/bench]
+        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_SCENARIOS = "640x360x150,1280x720x150,1920x1080x150,1280x720x600"
+DEFAULT_WEIGHTS = BENCH_DIR / "weights" / "tiny-vessels.pt"
+
+
+def make_tiny_weights(path: Path) -> Path:
+    """
+    Save an untrained YOLOv8n with the vessel classes. Inference cost matches a trained
+    model of the same size, and the class names are valid VesselTypes.
+    """
+    import typing
+    import torch
+    from ultralytics.nn.tasks import DetectionModel
+    from leisair_ml.schemas import VesselTypes
+
+    names = [name for name in typing.get_args(VesselTypes) if name != "Not Vessel"]
+    model = DetectionModel("yolov8n.yaml", nc=len(names), verbose=False)
+    model.names = dict(enumerate(names))
+    model.args = {}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({"model": model, "train_args": {}}, path)
+    return path
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_scenario(width: int, height: int, frames: int, weights: Path, mongo_uri: str) -> dict:
+    """
+    Run one scenario in the current process. Called in a child interpreter.
+    """
+    os.environ.pop("REDIS_URL", None)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(BENCH_DIR))
+    from synthetic_video import clip_name, generate_clip
+    from pymongo import monitoring
+    from prometheus_client import REGISTRY
+
+    round_trips = []
+    if mongo_uri:
+        class CommandCounter(monitoring.CommandListener):
+            def started(self, event):
+                round_trips.append(event.command_name)
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        monitoring.register(CommandCounter())
+        os.environ["MONGODB_URI"] = mongo_uri
+
+    from leisair_ml.utils.metrics import add_stage_listener
+    from leisair_ml.utils.mongo_handler import MongoDBHandler
+    from leisair_ml.services import vessel_detection
+
+    if not mongo_uri:
+        import mongomock
+        MongoDBHandler().use_client(mongomock.MongoClient())
+
+    frame_seconds = []
+    add_stage_listener("frame", frame_seconds.append)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        clip = generate_clip(Path(work_dir) / clip_name(f"Bench{width}x{height}"), width, height, frames)
+        started = time.perf_counter()
+        video_id = vessel_detection.run(weights=weights, source=clip)
+        elapsed = time.perf_counter() - started
+
+    operations = {}
+    for metric in REGISTRY.collect():
+        if metric.name != "leisair_mongo_op_seconds":
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith("_count") and sample.value:
+                operations[sample.labels["operation"]] = int(sample.value)
+
+    return {
+        "scenario": f"{width}x{height}x{frames}",
+        "videoId": str(video_id),
+        "frames": len(frame_seconds),
+        "seconds": elapsed,
+        "fps": len(frame_seconds) / elapsed if elapsed else 0.0,
+        "p50FrameMs": percentile(frame_seconds, 50) * 1000.0,
+        "p95FrameMs": percentile(frame_seconds, 95) * 1000.0,
+        "peakRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "dbRoundTrips": len(round_trips) if mongo_uri else None,
+        "dbOperations": operations,
+        "mongo": "mongod" if mongo_uri else "mongomock",
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: Path) -> None:
+    baseline = {entry["scenario"]: entry for entry in json.loads(baseline_path.read_text())["scenarios"]}
+    print(f"\nCompared with {baseline_path} ({json.loads(baseline_path.read_text()).get('commit')}):")
+    for entry in results["scenarios"]:
+        before = baseline.get(entry["scenario"])
+        if before is None:
+            continue
+        for key in ("fps", "p50FrameMs", "p95FrameMs", "peakRssMb"):
+            if before[key]:
+                change = (entry[key] - before[key]) / before[key] * 100.0
+                print(f"  {entry['scenario']:>16} {key:>11}: {before[key]:9.2f} -> {entry[key]:9.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="comma-separated WIDTHxHEIGHTxFRAMES")
+    parser.add_argument("--weights", type=Path, default=DEFAULT_WEIGHTS)
+    parser.add_argument("--mongo-uri", default="", help="use a local mongod instead of mongomock")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results file to compare with")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        width, height, frames = (int(value) for value in args.child.split("x"))
+        print(json.dumps(run_scenario(width, height, frames, args.weights, args.mongo_uri)))
+        return
+
+    if not args.weights.exists():
+        print(f"Creating tiny weights at {args.weights}")
+        make_tiny_weights(args.weights)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "weights": str(args.weights),
+        "scenarios": [],
+    }
+    for scenario in args.scenarios.split(","):
+        command = [sys.executable, __file__, "--child", scenario, "--weights", str(args.weights)]
+        if args.mongo_uri:
+            command += ["--mongo-uri", args.mongo_uri]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"{scenario}: failed\n{output.stderr[-2000:]}")
+            continue
+        entry = json.loads(output.stdout.strip().splitlines()[-1])
+        results["scenarios"].append(entry)
+        print(
+            f"{entry['scenario']:>16}: {entry['fps']:7.2f} fps, p50 {entry['p50FrameMs']:7.2f}ms, "
+            f"p95 {entry['p95FrameMs']:7.2f}ms, peak RSS {entry['peakRssMb']:7.1f}MB, "
+            f"DB {entry['dbRoundTrips'] if entry['dbRoundTrips'] is not None else sum(entry['dbOperations'].values())}"
+        )
+
+    output_path = args.output or BENCH_DIR / "results" / f"detection-{commit}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark of cameraVideo read paths on a video with many detections.
+
+Inserts one video with --detections detections, then times each read path and measures
+the Python memory it allocates (tracemalloc peak):
+
+- model: read_camera_video, validating the whole document into CameraVideo
+- view: read_camera_video_view, detections left unbuilt
+- view-summary: read_camera_video_view of filename and startTime only
+- view-frame: read_camera_video_view of a single frame, then building its detections
+- view-all-trusted: a view, then building every detection without validation
+- view-all-validated: a view, then validating every detection
+
+Uses mongomock unless --mongo-uri is given, in which case the video is deleted afterwards.
+
+Usage:
+    python benchmarks/camera_video_reads.py [--detections 100000] [--per-frame 5] [--repeat 5]
+"""
+
+import argparse
+import datetime
+import os
+import statistics
+import time
+import tracemalloc
+
+
+def make_video(detections: int, per_frame: int) -> dict:
+    frames = {}
+    for index in range(detections):
+        frame = str(index // per_frame)
+        x = float(index % 1000)
+        frames.setdefault(frame, []).append({
+            "vesselId": str(index % 50),
+            "type": "Rowing Boat",
+            "confidence": 0.5 + (index % 50) / 100.0,
+            "speed": None,
+            "direction": None,
+            "bbox": {"x1": x, "y1": 100.0, "x2": x + 80.0, "y2": 160.0},
+        })
+    return {
+        "locationId": "bench",
+        "filename": "Bench 2024-01-01_12_00_00_000000",
+        "startTime": datetime.datetime(2024, 1, 1, 12),
+        "endTime": None,
+        "fps": 25.0,
+        "frameCount": len(frames),
+        "processingVersion": 1,
+        "vesselsDetected": frames,
+    }
+
+
+def measure(read, repeat: int) -> dict:
+    seconds = []
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        read()
+        seconds.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"medianMs": statistics.median(seconds) * 1000.0, "peakMb": max(peaks) / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, default=100_000)
+    parser.add_argument("--per-frame", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo-uri", default="")
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+    from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+    mongo_handler = MongoDBHandler()
+    if not args.mongo_uri:
+        import mongomock
+        mongo_handler.use_client(mongomock.MongoClient())
+
+    collection = mongo_handler._get_collection("cameraVideo")
+    inserted_id = collection.insert_one(make_video(args.detections, args.per_frame)).inserted_id
+    video_id = str(inserted_id)
+    middle_frame = args.detections // args.per_frame // 2
+
+    def all_detections(validate: bool):
+        view = mongo_handler.read_camera_video_view(video_id, validate=validate)
+        return sum(len(view.vesselsDetected[frame]) for frame in view.vesselsDetected)
+
+    paths = {
+        "model": lambda: mongo_handler.read_camera_video(video_id),
+        "view": lambda: mongo_handler.read_camera_video_view(video_id),
+        "view-summary": lambda: mongo_handler.read_camera_video_view(video_id, ["filename", "startTime"]),
+        "view-frame": lambda: mongo_handler.read_camera_video_view(
+            video_id, [f"vesselsDetected.{middle_frame}"]
+        ).vesselsDetected[middle_frame],
+        "view-all-trusted": lambda: all_detections(False),
+        "view-all-validated": lambda: all_detections(True),
+    }
+    try:
+        print(f"{args.detections} detections, {args.per_frame} per frame")
+        for name, read in paths.items():
+            result = measure(read, args.repeat)
+            print(f"{name:>20}: {result['medianMs']:9.2f}ms, peak {result['peakMb']:8.2f}MB")
+    finally:
+        collection.delete_one({"_id": inserted_id})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of the video decoder backends against ultralytics LoadImages.
+
+For each clip resolution, every configuration decodes the same synthetic clip and
+letterboxes the frames to the model input size, as detection does. Reported per
+configuration: frames delivered, frames per second, and CPU time per frame across all
+decoder threads (process time, so threaded decoding is not flattered).
+
+Usage:
+    python benchmarks/decoders.py [--resolutions 1920x1080,3840x2160] [--frames 300] [--stride 3]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def measure(frames) -> dict:
+    from ultralytics.data.augment import LetterBox
+
+    letterbox = LetterBox((640, 640), auto=False)
+    started, cpu_started = time.perf_counter(), time.process_time()
+    count = 0
+    for image in frames:
+        letterbox(image=image)
+        count += 1
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return {"frames": count, "fps": count / elapsed if elapsed else 0.0, "cpuMsPerFrame": cpu / count * 1000.0 if count else 0.0}
+
+
+def load_images_frames(clip: Path, stride: int):
+    from ultralytics.data.loaders import LoadImages
+
+    for _, images, _, _ in LoadImages(clip, imgsz=640, vid_stride=stride):
+        yield images[0]
+
+
+def decoder_frames(clip: Path, backend: str, max_size: int, stride: int):
+    from leisair_ml.services.video_decoder import open_decoder
+
+    with open_decoder(clip, backend, max_size) as decoder:
+        for _, image in decoder.frames(stride=stride):
+            yield image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default="1920x1080,3840x2160")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--stride", type=int, default=3, help="stride of the strided configurations")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BENCH_DIR))
+    from synthetic_video import clip_name, generate_clip
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for resolution in args.resolutions.split(","):
+            width, height = (int(value) for value in resolution.split("x"))
+            clip = generate_clip(Path(work_dir) / clip_name(f"Decode{resolution}"), width, height, args.frames)
+            configurations = {
+                "LoadImages": lambda: load_images_frames(clip, 1),
+                "opencv full-size": lambda: decoder_frames(clip, "opencv", 0, 1),
+                "opencv scaled": lambda: decoder_frames(clip, "opencv", 640, 1),
+                "pyav full-size": lambda: decoder_frames(clip, "pyav", 0, 1),
+                "pyav scaled": lambda: decoder_frames(clip, "pyav", 640, 1),
+                f"LoadImages stride {args.stride}": lambda: load_images_frames(clip, args.stride),
+                f"opencv scaled stride {args.stride}": lambda: decoder_frames(clip, "opencv", 640, args.stride),
+                f"pyav scaled stride {args.stride}": lambda: decoder_frames(clip, "pyav", 640, args.stride),
+            }
+            print(f"{resolution}, {args.frames} frames")
+            for name, frames in configurations.items():
+                try:
+                    result = measure(frames())
+                except ImportError as e:
+                    print(f"  {name:>26}: skipped ({e})")
+                    continue
+                print(f"  {name:>26}: {result['frames']:5d} frames, {result['fps']:8.1f} fps, "
+                      f"{result['cpuMsPerFrame']:7.2f} ms CPU/frame")
+
+
+if __name__ == "__main__":
+    main()
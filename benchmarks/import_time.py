@@ -0,0 +1,77 @@
+"""
+Import-time benchmark for the API process.
+
+Imports the API module in a fresh interpreter with `python -X importtime` and fails when
+the import exceeds the time budget or pulls in the ML stack, which must only be loaded
+by Celery workers.
+
+Usage:
+    python benchmarks/import_time.py [--module leisair_ml.run_api] [--budget-ms 1500]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+FORBIDDEN_MODULES = ("torch", "ultralytics", "supervision", "cv2")
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def measure(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter and parse the -X importtime report.
+
+    Returns:
+        dict: The cumulative import time in microseconds of every imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        cumulative[name] = int(match.group(2))
+        if len(match.group(3)) == 1:
+            top_level[name] = int(match.group(2))
+    return {"modules": cumulative, "top_level": top_level, "total_us": sum(top_level.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="leisair_ml.run_api")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest top-level imports to show")
+    args = parser.parse_args()
+
+    report = measure(args.module)
+    total_ms = report["total_us"] / 1000.0
+    print(f"import {args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.1f}ms)")
+    slowest = sorted(report["top_level"].items(), key=lambda item: item[1], reverse=True)[: args.top]
+    for name, micros in slowest:
+        print(f"  {micros / 1000.0:8.1f}ms  {name}")
+
+    failures = []
+    forbidden = sorted(
+        name for name in report["modules"]
+        if name.split(".")[0] in FORBIDDEN_MODULES
+    )
+    if forbidden:
+        failures.append(f"{args.module} imports the ML stack: {', '.join(sorted({name.split('.')[0] for name in forbidden}))}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.1f}ms, over the {args.budget_ms:.1f}ms budget")
+
+    assert not failures, "; ".join(failures)
+
+
+if __name__ == "__main__":
+    main()
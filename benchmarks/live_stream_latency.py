@@ -0,0 +1,63 @@
+"""
+Latency benchmark of the live-stream mode, replaying a synthetic clip at real-time speed.
+
+Runs live_stream.run_live on a generated clip with mongomock and the tiny weights of
+bench_detection.py, and reports the end-to-end latency percentiles and the dropped-frame
+ratio. Lower --max-latency-ms or raise the
+resolution to see frames being dropped instead of latency growing.
+
+Usage:
+    python benchmarks/live_stream_latency.py [--width 1920] [--height 1080] [--seconds 20]
+        [--fps 25] [--max-latency-ms 500] [--segment-seconds 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--max-latency-ms", type=float, default=500.0)
+    parser.add_argument("--segment-seconds", type=float, default=5.0)
+    parser.add_argument("--weights", type=Path, default=BENCH_DIR / "weights" / "tiny-vessels.pt")
+    args = parser.parse_args()
+
+    os.environ.pop("REDIS_URL", None)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(BENCH_DIR))
+    from bench_detection import make_tiny_weights
+    from synthetic_video import generate_clip
+    import mongomock
+    from leisair_ml.utils.mongo_handler import MongoDBHandler
+    from leisair_ml.services import live_stream
+
+    MongoDBHandler().use_client(mongomock.MongoClient())
+    if not args.weights.exists():
+        make_tiny_weights(args.weights)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        frames = int(args.seconds * args.fps)
+        clip = generate_clip(Path(work_dir) / "live.mp4", args.width, args.height, frames, args.fps)
+        report = live_stream.run_live(
+            args.weights, str(clip), "Bench", args.max_latency_ms, args.segment_seconds, realtime=True
+        )
+
+    print(f"{args.width}x{args.height} at {args.fps} fps, bound {args.max_latency_ms:.0f}ms")
+    print(f"  frames read {report['framesRead']}, processed {report['framesProcessed']}, "
+          f"dropped {report['framesDropped']} ({report['droppedRatio']:.1%})")
+    print(f"  latency p50 {report['latencyP50Ms']:.1f}ms, p95 {report['latencyP95Ms']:.1f}ms, "
+          f"max {report['latencyMaxMs']:.1f}ms")
+    print(f"  segments: {len(report['segments'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Load test of the upload and status endpoints with Celery on an in-memory broker.
+
+The API is served by uvicorn in this process, with RABBIT_URL=memory:// so queued tasks
+stay in memory, VIDEOS_PATH in a temporary directory and MongoDB replaced by mongomock
+unless --mongo-uri is given. A monitor task on the server's event loop records how late
+it wakes up (event-loop lag), which is where a blocking call in an async route shows.
+The load is generated by a separate client process so it does not compete with the
+server for the GIL.
+
+Uploads of the given sizes are sent by --concurrency clients, either one file per
+/upload request or --batch-size files per /upload/batch request, while --pollers
+clients poll /videos/{id}/status. Reported: throughput, latency percentiles per
+endpoint, status codes and event-loop lag. With --max-lag-ms the run exits non-zero
+when the worst lag exceeds the budget.
+
+Usage:
+    python benchmarks/load_api.py [--uploads 200] [--sizes-mb 1,8] [--concurrency 16]
+        [--batch-size 1] [--pollers 8] [--max-lag-ms 100] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+LAG_INTERVAL_S = 0.01
+STATUS_VIDEOS = 50
+
+
+def percentiles(values: list) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+
+    def at(pct: float) -> float:
+        return ordered[min(len(ordered) - 1, round(pct / 100.0 * (len(ordered) - 1)))] * 1000.0
+
+    return {"count": len(ordered), "p50Ms": at(50), "p95Ms": at(95), "p99Ms": at(99), "maxMs": ordered[-1] * 1000.0}
+
+
+async def drive(base_url: str, args) -> dict:
+    """
+    Client side: run the uploaders and pollers and return the raw measurements.
+    """
+    import httpx
+
+    sizes = [int(float(size) * 1024 * 1024) for size in args.sizes_mb.split(",")]
+    payloads = {size: os.urandom(size) for size in sizes}
+    jobs = asyncio.Queue()
+    for index in range(args.uploads):
+        jobs.put_nowait(index)
+
+    latencies = defaultdict(list)
+    statuses = Counter()
+    uploaded_bytes = 0
+    uploads_done = asyncio.Event()
+
+    async def upload_worker(client: httpx.AsyncClient, worker: int):
+        nonlocal uploaded_bytes
+        while True:
+            files = []
+            while len(files) < args.batch_size and not jobs.empty():
+                index = jobs.get_nowait()
+                size = sizes[index % len(sizes)]
+                name = f"Load{worker} 2024-01-01_12_00_00_{index:06d}.mp4"
+                files.append(("files" if args.batch_size > 1 else "file", (name, payloads[size], "video/mp4")))
+                uploaded_bytes += size
+            if not files:
+                return
+            endpoint = "/upload/batch" if args.batch_size > 1 else "/upload"
+            started = time.perf_counter()
+            response = await client.post(endpoint, files=files)
+            latencies[endpoint].append(time.perf_counter() - started)
+            statuses[f"{endpoint} {response.status_code}"] += 1
+
+    async def poller(client: httpx.AsyncClient, worker: int):
+        index = worker
+        while not uploads_done.is_set():
+            video_id = f"load-{index % STATUS_VIDEOS}"
+            started = time.perf_counter()
+            response = await client.get(f"/videos/{video_id}/status")
+            latencies["/videos/{id}/status"].append(time.perf_counter() - started)
+            statuses[f"/videos/{{id}}/status {response.status_code}"] += 1
+            index += args.pollers
+
+    limits = httpx.Limits(max_connections=args.concurrency + args.pollers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300.0) as client:
+        pollers = [asyncio.create_task(poller(client, worker)) for worker in range(args.pollers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(upload_worker(client, worker) for worker in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        uploads_done.set()
+        await asyncio.gather(*pollers)
+
+    return {
+        "seconds": elapsed,
+        "uploadedBytes": uploaded_bytes,
+        "latencies": dict(latencies),
+        "statuses": dict(statuses),
+    }
+
+
+def run_client(args) -> None:
+    print(json.dumps(asyncio.run(drive(f"http://127.0.0.1:{args.port}", args))))
+
+
+async def monitor_lag(samples: list) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL_S)
+        samples.append(max(0.0, loop.time() - started - LAG_INTERVAL_S))
+
+
+def start_server(port: int, lag_samples: list):
+    """
+    Serve the API on a background thread, with the lag monitor on the same event loop.
+    """
+    import uvicorn
+    from leisair_ml.run_api import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+
+    async def serve():
+        monitor = asyncio.create_task(monitor_lag(lag_samples))
+        try:
+            await server.serve()
+        finally:
+            monitor.cancel()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=200, help="number of files to upload")
+    parser.add_argument("--sizes-mb", default="1,8", help="comma-separated upload sizes, used round-robin")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent upload clients")
+    parser.add_argument("--batch-size", type=int, default=1, help="files per /upload/batch request, 1 uses /upload")
+    parser.add_argument("--pollers", type=int, default=8, help="concurrent status poll clients")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mongo-uri", default="", help="use a MongoDB instead of mongomock")
+    parser.add_argument("--max-lag-ms", type=float, default=None, help="fail if the worst event-loop lag exceeds this")
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args)
+        return
+
+    videos_dir = tempfile.TemporaryDirectory()
+    os.environ["RABBIT_URL"] = "memory://"
+    os.environ["VIDEOS_PATH"] = videos_dir.name
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.pop("REDIS_URL", None)
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+
+    from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+    mongo_handler = MongoDBHandler()
+    if not args.mongo_uri:
+        import mongomock
+        mongo_handler.use_client(mongomock.MongoClient())
+    for index in range(STATUS_VIDEOS):
+        mongo_handler.create_video_status(f"load-{index}", f"load-{index}.mp4", "processing", 50.0)
+
+    lag_samples = []
+    server, thread = start_server(args.port, lag_samples)
+    try:
+        command = [sys.executable, __file__, "--client"] + sys.argv[1:]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(output.stderr[-2000:])
+            sys.exit(output.returncode)
+        measured = json.loads(output.stdout.strip().splitlines()[-1])
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        videos_dir.cleanup()
+        if args.mongo_uri:
+            mongo_handler._get_collection("videoStatus").delete_many({"_id": {"$regex": "^load-"}})
+
+    seconds = measured["seconds"]
+    report = {
+        "uploads": args.uploads,
+        "batchSize": args.batch_size,
+        "concurrency": args.concurrency,
+        "pollers": args.pollers,
+        "seconds": seconds,
+        "uploadsPerSecond": args.uploads / seconds,
+        "uploadMbPerSecond": measured["uploadedBytes"] / seconds / 1024 / 1024,
+        "endpoints": {endpoint: percentiles(values) for endpoint, values in measured["latencies"].items()},
+        "statuses": measured["statuses"],
+        "eventLoopLag": percentiles(lag_samples),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    worst_lag_ms = report["eventLoopLag"].get("maxMs", 0.0)
+    if args.max_lag_ms is not None and worst_lag_ms > args.max_lag_ms:
+        print(f"Event-loop lag {worst_lag_ms:.1f}ms exceeds the {args.max_lag_ms:.1f}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of the registry version lookups behind /check-updates, with no network.
+
+A local httpx.MockTransport plays the registry: it answers after --latency-ms with
+--tags tags and an ETag, and with 304 when If-None-Match matches. The script reports
+the time of a /check-updates lookup in each cache state and the registry requests it
+made; the cache behaviour itself is covered by tests/test_registry_versions.py.
+
+Usage:
+    python benchmarks/registry_versions.py [--latency-ms 150] [--tags 2000]
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+import httpx
+from leisair_ml.utils.registry_versions import RegistryVersions
+
+PACKAGES = ("leisair-nextjs", "leisair-ml")
+
+
+def mock_registry(latency_s: float, tag_count: int, requests: Counter) -> httpx.MockTransport:
+    tags = [f"{major}.{minor}.{patch}" for major in range(3) for minor in range(30) for patch in range(30)]
+    tags = (tags + ["latest", "main", "1.0.0rc1"] * tag_count)[:tag_count]
+    etag = '"tags-v1"'
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_s)
+        if request.headers.get("if-none-match") == etag:
+            requests["304"] += 1
+            return httpx.Response(304, headers={"ETag": etag})
+        requests["200"] += 1
+        return httpx.Response(200, json={"name": request.url.path, "tags": tags}, headers={"ETag": etag})
+
+    return httpx.MockTransport(handler)
+
+
+async def check_updates(versions: RegistryVersions) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(versions.latest_version(package) for package in PACKAGES))
+    return (time.perf_counter() - started) * 1000.0
+
+
+async def run(latency_s: float, tag_count: int) -> None:
+    requests = Counter()
+    transport = mock_registry(latency_s, tag_count, requests)
+
+    # The previous behaviour: sequential lookups, each with its own client and no cache
+    started = time.perf_counter()
+    for package in PACKAGES:
+        uncached = RegistryVersions(ttl=0, stale_ttl=0, transport=transport)
+        await uncached.latest_version(package)
+        await uncached.aclose()
+    print(f"{'serial, uncached':>24}: {(time.perf_counter() - started) * 1000.0:8.2f}ms")
+    requests.clear()
+
+    versions = RegistryVersions(ttl=60, stale_ttl=3600, transport=transport)
+    print(f"{'concurrent, cold':>24}: {await check_updates(versions):8.2f}ms")
+    print(f"{'fresh cache':>24}: {await check_updates(versions):8.2f}ms")
+
+    versions.ttl = 0
+    print(f"{'stale, revalidating':>24}: {await check_updates(versions):8.2f}ms")
+    await asyncio.sleep(latency_s * 2)
+
+    versions.stale_ttl = 0
+    print(f"{'expired, conditional':>24}: {await check_updates(versions):8.2f}ms")
+    print(f"Registry requests after warm-up: {dict(requests)}")
+    await versions.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--tags", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency_ms / 1000.0, args.tags))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Simulation of the video scheduler against the previous first-in, first-out queue.
+
+One location dumps a backlog of old clips while the others keep uploading fresh
+ones, and --workers workers take --service-s (plus jitter) per clip. With FIFO every
+fresh clip waits behind the backlog. With the FairShareScheduler of
+leisair_ml.services.video_scheduler, the video at the head of a location's queue is
+dispatched after at most sum(B + w_L / w_X + 1) dispatches of the other locations L,
+where B is the freshness boost and w the weights. The script checks every clip
+against that bound, and exits non-zero if one exceeds it.
+
+Usage:
+    python benchmarks/scheduler_simulation.py [--backlog 200] [--locations 4] [--workers 2]
+"""
+
+import argparse
+import math
+import random
+import sys
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from leisair_ml.services.video_scheduler import FairShareScheduler, QueuedVideo
+
+BACKLOG_LOCATION = "Backfill"
+
+
+class FifoQueue:
+    """
+    The previous behaviour: one queue in upload order.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+
+    def submit(self, video: QueuedVideo, now: datetime) -> None:
+        self.queue.append(video)
+
+    def next(self) -> Optional[QueuedVideo]:
+        return self.queue.popleft() if self.queue else None
+
+    def head(self, location: str) -> Optional[QueuedVideo]:
+        return next((video for video in self.queue if video.location == location), None)
+
+
+def arrivals(args) -> List[QueuedVideo]:
+    epoch = datetime(2024, 6, 1, 12, 0)
+    videos = [
+        QueuedVideo(
+            file_path=f"{BACKLOG_LOCATION} clip-{index}.mp4",
+            location=BACKLOG_LOCATION,
+            submitted_at=0.0,
+            footage_time=epoch - timedelta(days=7, minutes=5 * index),
+        )
+        for index in range(args.backlog)
+    ]
+    for location_index in range(args.locations):
+        location = f"Camera{location_index}"
+        # Stagger the uploads of the locations within an interval
+        offset = args.interval_s * location_index / args.locations
+        for index in range(int(args.duration_s / args.interval_s)):
+            submitted_at = offset + index * args.interval_s
+            videos.append(QueuedVideo(
+                file_path=f"{location} clip-{index}.mp4",
+                location=location,
+                submitted_at=submitted_at,
+                footage_time=epoch + timedelta(seconds=submitted_at - args.interval_s),
+            ))
+    return sorted(videos, key=lambda video: video.submitted_at)
+
+
+def simulate(queue, args) -> Dict[str, Dict]:
+    """
+    Run the clips through the queue and the workers on a simulated clock.
+
+    Returns:
+        dict: Per location, the waits in seconds and in dispatches of other locations.
+    """
+    rng = random.Random(args.seed)
+    epoch = datetime(2024, 6, 1, 12, 0)
+    pending = deque(arrivals(args))
+    workers_free_at = [0.0] * args.workers
+    locations = {video.location for video in pending}
+    waits = {location: {"seconds": [], "dispatches": []} for location in locations}
+    # Dispatches of other locations since a video became the head of its location
+    head_waits: Dict[int, int] = {}
+    now = 0.0
+    queued = 0
+    while pending or queued:
+        worker = min(range(args.workers), key=workers_free_at.__getitem__)
+        if pending and (pending[0].submitted_at <= workers_free_at[worker] or not queued):
+            now = max(now, pending[0].submitted_at)
+            video = pending.popleft()
+            queue.submit(video, epoch + timedelta(seconds=now))
+            queued += 1
+            continue
+        now = max(now, workers_free_at[worker])
+        video = queue.next()
+        queued -= 1
+        workers_free_at[worker] = now + args.service_s * rng.uniform(1 - args.jitter, 1 + args.jitter)
+        waits[video.location]["seconds"].append(now - video.submitted_at)
+        waits[video.location]["dispatches"].append(head_waits.pop(id(video), 0))
+        for location in locations - {video.location}:
+            head = queue.head(location)
+            if head is not None:
+                head_waits[id(head)] = head_waits.get(id(head), 0) + 1
+    return waits
+
+
+def dispatch_bound(scheduler: FairShareScheduler, location: str, locations) -> int:
+    weight = scheduler.weight(location)
+    return sum(
+        math.floor(scheduler.fresh_boost + scheduler.weight(other) / weight) + 1
+        for other in locations if other != location
+    )
+
+
+def report(name: str, waits: Dict[str, Dict]) -> None:
+    print(name)
+    print(f"{'location':>12} {'clips':>6} {'p50 wait s':>11} {'p95 wait s':>11} {'max wait s':>11} {'max head wait':>14}")
+    for location in sorted(waits):
+        seconds = sorted(waits[location]["seconds"])
+        print(
+            f"{location:>12} {len(seconds):>6} {seconds[len(seconds) // 2]:>11.0f} "
+            f"{seconds[int(len(seconds) * 0.95)]:>11.0f} {seconds[-1]:>11.0f} "
+            f"{max(waits[location]['dispatches']):>14}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backlog", type=int, default=200, help="old clips uploaded at once by one location")
+    parser.add_argument("--locations", type=int, default=4, help="locations uploading fresh clips")
+    parser.add_argument("--interval-s", type=float, default=300.0, help="time between the clips of a location")
+    parser.add_argument("--duration-s", type=float, default=6 * 3600.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--service-s", type=float, default=90.0, help="mean processing time of a clip")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--backlog-weight", type=float, default=1.0)
+    parser.add_argument("--fresh-boost", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report("FIFO", simulate(FifoQueue(), args))
+    print()
+    scheduler = FairShareScheduler({BACKLOG_LOCATION: args.backlog_weight}, fresh_boost=args.fresh_boost)
+    waits = simulate(scheduler, args)
+    report("Fair share", waits)
+
+    exceeded = []
+    for location, location_waits in sorted(waits.items()):
+        bound = dispatch_bound(scheduler, location, waits)
+        worst = max(location_waits["dispatches"])
+        print(f"{location:>12}: head of queue waited at most {worst} dispatches, bound {bound}")
+        if worst > bound:
+            exceeded.append(location)
+    if exceeded:
+        print(f"Wait bound exceeded for {', '.join(sorted(exceeded))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the DB-wait share of per-frame time for video status updates.
+
+Simulates the per-frame loop of vessel_detection.run: a fixed amount of work per frame
+followed by MongoDBHandler.update_video_status. Each mode runs in a fresh interpreter
+so STATUS_WRITE_BEHIND is picked up at import. Requires a MongoDB at MONGODB_URI.
+
+Usage:
+    python benchmarks/status_write_behind.py [--frames 2000] [--frame-ms 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def run_mode(frames: int, frame_ms: float) -> dict:
+    from nanoid import generate
+    from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+    mongo_handler = MongoDBHandler()
+    video_id = f"bench-{generate()}"
+    mongo_handler.create_video_status(video_id, video_id, "processing", 0.0)
+
+    db_seconds = 0.0
+    started = time.perf_counter()
+    for idx in range(frames):
+        work_until = time.perf_counter() + frame_ms / 1000.0
+        while time.perf_counter() < work_until:
+            pass
+        call_started = time.perf_counter()
+        mongo_handler.update_video_status(video_id, "processing", idx / frames * 100.0)
+        db_seconds += time.perf_counter() - call_started
+    call_started = time.perf_counter()
+    mongo_handler.update_video_status(video_id, "done", 100.0)
+    db_seconds += time.perf_counter() - call_started
+    total_seconds = time.perf_counter() - started
+
+    mongo_handler._get_collection("videoStatus").delete_one({"_id": video_id})
+    return {
+        "frames": frames,
+        "totalSeconds": total_seconds,
+        "dbWaitSeconds": db_seconds,
+        "dbWaitShare": db_seconds / total_seconds,
+        "dbWaitPerFrameMs": db_seconds / frames * 1000.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--frame-ms", type=float, default=5.0, help="simulated inference time per frame")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.frames, args.frame_ms)))
+        return
+
+    results = {}
+    for mode, flag in (("synchronous", "false"), ("write-behind", "true")):
+        env = {**os.environ, "STATUS_WRITE_BEHIND": flag}
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--frames", str(args.frames), "--frame-ms", str(args.frame_ms)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:>12}: {results[mode]['dbWaitShare'] * 100:5.1f}% of frame time waiting on MongoDB "
+            f"({results[mode]['dbWaitPerFrameMs']:.3f}ms/frame)"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Generates synthetic MP4 clips with moving box-shaped "vessels" on a water-like background.
+
+Clips are named "<location> <YYYY-MM-DD_HH_MM_SS_ffffff>.mp4", the format vessel_detection
+expects. Generation is seeded, so the same arguments always produce the same frames.
+
+Usage:
+    python benchmarks/synthetic_video.py OUTPUT_DIR [--width 1280] [--height 720] [--frames 300]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+import cv2
+import numpy as np
+
+BASE_TIME = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def clip_name(location: str, index: int = 0) -> str:
+    start = BASE_TIME + timedelta(minutes=index)
+    return f"{location} {start.strftime('%Y-%m-%d_%H_%M_%S_%f')}.mp4"
+
+
+def generate_clip(
+    path: Path,
+    width: int,
+    height: int,
+    frames: int,
+    fps: float = 25.0,
+    vessels: int = 4,
+    seed: int = 0,
+) -> Path:
+    """
+    Write a clip of boxes crossing the frame at different speeds and sizes.
+
+    Returns:
+        Path: The path of the written clip.
+    """
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+
+    # Vertical gradient for the water, horizon band for the far bank
+    gradient = np.linspace(90, 160, height, dtype=np.float32)[:, None]
+    background = np.zeros((height, width, 3), dtype=np.uint8)
+    background[..., 0] = np.clip(gradient + 40, 0, 255).astype(np.uint8)
+    background[..., 1] = np.clip(gradient, 0, 255).astype(np.uint8)
+    background[..., 2] = np.clip(gradient - 40, 0, 255).astype(np.uint8)
+    background[: height // 5] = (70, 110, 80)
+
+    sizes = rng.uniform(0.05, 0.2, size=(vessels, 2)) * (width, height)
+    rows = rng.uniform(height * 0.3, height * 0.85, size=vessels)
+    speeds = rng.uniform(1.0, 6.0, size=vessels) * rng.choice((-1, 1), size=vessels) * width / 640
+    offsets = rng.uniform(0, width, size=vessels)
+    colours = rng.integers(0, 255, size=(vessels, 3))
+
+    try:
+        for frame_idx in range(frames):
+            frame = background.copy()
+            noise = rng.integers(-8, 8, size=(height // 4, width // 4, 1), dtype=np.int16)
+            frame = np.clip(frame + cv2.resize(noise, (width, height))[..., None], 0, 255).astype(np.uint8)
+            for vessel in range(vessels):
+                box_width, box_height = sizes[vessel]
+                x = (offsets[vessel] + speeds[vessel] * frame_idx) % (width + box_width) - box_width
+                y = rows[vessel] + 3 * np.sin(frame_idx / 10 + vessel)
+                top_left = (int(x), int(y - box_height))
+                bottom_right = (int(x + box_width), int(y))
+                cv2.rectangle(frame, top_left, bottom_right, tuple(int(c) for c in colours[vessel]), -1)
+                cv2.rectangle(frame, top_left, bottom_right, (20, 20, 20), 2)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--vessels", type=int, default=4)
+    parser.add_argument("--location", default="Bench")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = generate_clip(
+        args.output_dir / clip_name(args.location),
+        args.width, args.height, args.frames, args.fps, args.vessels, args.seed,
+    )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
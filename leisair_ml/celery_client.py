@@ -0,0 +1,90 @@
+"""
+Lightweight Celery client for the API process.
+
+Tasks are enqueued by name, so the API never imports the worker module and with it
+torch, ultralytics and supervision.
+"""
+
+import os
+import time
+from typing import List, Optional, Tuple
+from celery import Celery
+from celery.canvas import Signature
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROCESS_FILE_TASK = "tasks.process_file"
+UPDATE_MODEL_TASK = "tasks.update_model"
+SHADOW_INFERENCE_TASK = "tasks.shadow_inference"
+
+# Shadow inference runs after everything else, or on its own queue when SHADOW_QUEUE is set
+SHADOW_PRIORITY = 0
+SHADOW_QUEUE = os.getenv("SHADOW_QUEUE")
+
+CELERY_CONFIG = dict(
+    task_track_started=True,
+    task_serializer="json",
+    result_expires=3600,
+    worker_log_color=False,
+    worker_hijack_root_logger=False,
+    accept_content=["json"],
+    broker_connection_retry_on_startup=True,
+    # Priorities need a priority queue and a worker that reserves one task at a time
+    task_queue_max_priority=10,
+    task_default_priority=5,
+    worker_prefetch_multiplier=1,
+)
+
+celery_app = Celery("nash_client", broker=os.environ.get("RABBIT_URL"))
+celery_app.conf.update(**CELERY_CONFIG)
+
+
+def process_file_signature(
+    file_path: str,
+    batch_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    priority: Optional[int] = None,
+) -> Signature:
+    """
+    Build a process_file signature, e.g. to enqueue files as part of a group.
+    """
+    kwargs = {"enqueued_at": time.time()}
+    if batch_id:
+        kwargs["batch_id"] = batch_id
+    if job_id:
+        kwargs["job_id"] = job_id
+    options = {"priority": priority} if priority is not None else {}
+    return celery_app.signature(PROCESS_FILE_TASK, args=(file_path,), kwargs=kwargs, **options)
+
+
+def enqueue_process_file(
+    file_path: str,
+    batch_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    priority: Optional[int] = None,
+):
+    """
+    Queue a video file for detection. Uploads go through the video scheduler, which
+    passes the ID of its queue entry and the message priority.
+    """
+    return process_file_signature(file_path, batch_id, job_id, priority).apply_async()
+
+
+def enqueue_update_model():
+    """
+    Queue a model retraining run.
+    """
+    return celery_app.send_task(UPDATE_MODEL_TASK)
+
+
+def enqueue_shadow_inference(video_id: str, model_id: str, primary_weights: str, frames: List[Tuple[int, str]]):
+    """
+    Queue the comparison of a shadow candidate with the primary model on the sampled frames of a video.
+    """
+    options = {"priority": SHADOW_PRIORITY}
+    if SHADOW_QUEUE:
+        options["queue"] = SHADOW_QUEUE
+    return celery_app.send_task(
+        SHADOW_INFERENCE_TASK, args=(video_id, model_id, primary_weights, frames), **options
+    )
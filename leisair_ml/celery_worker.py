@@ -1,17 +1,29 @@
 import sys
 import os
+import time
 from dotenv import load_dotenv
 from celery import Celery
+from celery.signals import task_postrun, worker_init, worker_process_shutdown
 from celery.utils.log import get_task_logger
 import logging
+from contextlib import nullcontext
+from typing import Optional
 from leisair_ml.services.model_update import update
 from leisair_ml.utils.mongo_handler import MongoDBHandler
-from leisair_ml.services.vessel_detection import run
+from leisair_ml.services.vessel_detection import RunCancelled, run, selected_weights
+from leisair_ml.services.traffic_rollups import update_video_rollups
+from leisair_ml.services.storage_lifecycle import start_storage_lifecycle
+from leisair_ml.services.shadow_inference import run_shadow
+from leisair_ml.services.video_scheduler import start_periodic_dispatch, video_scheduler
 from pathlib import Path
 from leisair_ml.utils.logger import custom_logger
+from leisair_ml.celery_client import CELERY_CONFIG, PROCESS_FILE_TASK, SHADOW_INFERENCE_TASK, UPDATE_MODEL_TASK
+from leisair_ml.utils.metrics import MULTIPROCESS, QUEUE_WAIT_SECONDS, mark_process_dead, start_metrics_server
 
 load_dotenv()
 
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
 # initialize mongo_handler
 mongo_handler = MongoDBHandler()
 
@@ -27,31 +39,96 @@ logger = get_task_logger(__name__)
 celery_app = Celery("nash_worker", broker=os.environ.get("RABBIT_URL"))
 
 
-celery_app.conf.update(
-    task_track_started=True,
-    task_serializer="json",
-    result_expires=3600,
-    worker_log_color=False,
-    worker_hijack_root_logger=False,
-    accept_content=["json"],
-    broker_connection_retry_on_startup=True,
-)
-
-
-@celery_app.task(name="tasks.process_file", bind=True)
-def process_file(self, file_path: str):
-    selected_model = mongo_handler.get_selected_model()
-    if selected_model:
-        model_path = Path(selected_model["path"])
-    else:
-        model_path = Path(os.environ.get("MODEL_PATH",current_dir)) / "best.pt"
+celery_app.conf.update(**CELERY_CONFIG)
+
+
+@celery_app.task(name=PROCESS_FILE_TASK, bind=True)
+def process_file(
+    self,
+    file_path: str,
+    batch_id: Optional[str] = None,
+    enqueued_at: Optional[float] = None,
+    job_id: Optional[str] = None,
+):
+    if enqueued_at:
+        QUEUE_WAIT_SECONDS.labels("process_file").observe(max(0.0, time.time() - enqueued_at))
+    model_path = selected_weights(current_dir)
     logger.info("Starting to process file: %s", file_path)
-    run(
-        weights=model_path,
-        source=Path(file_path)
-    )
+    video_id = None
+    running = None
+    try:
+        # Heartbeats tell the scheduler the slot is still in use
+        with video_scheduler.running(job_id, self.request.hostname) if job_id else nullcontext() as running:
+            if running is not None and running.lost.is_set():
+                logger.warning("File %s is no longer dispatched to this worker, skipping it", file_path)
+                return
+            video_id = run(
+                weights=model_path,
+                source=Path(file_path),
+                stop=running.lost if running is not None else None,
+            )
+            if video_id:
+                update_video_rollups(video_id)
+    except RunCancelled as e:
+        # The video was requeued and another worker owns it now, including its batch entry
+        logger.warning("%s: the video was requeued", e)
+        return
+    except Exception:
+        if batch_id:
+            mongo_handler.mark_video_batch_file(batch_id, Path(file_path).name, "failed")
+        raise
+    finally:
+        if running is not None:
+            # Frees the scheduler slot and dispatches the next video
+            video_scheduler.complete(running, "done" if video_id else "failed")
+    if batch_id:
+        mongo_handler.mark_video_batch_file(batch_id, Path(file_path).name, "done" if video_id else "failed", video_id)
 
-@celery_app.task(name="tasks.update_model", bind=True)
+@celery_app.task(name=UPDATE_MODEL_TASK, bind=True)
 def retrain_model(self):
     logger.info("Starting to update model")
-    update()
\ No newline at end of file
+    update()
+
+
+@celery_app.task(name=SHADOW_INFERENCE_TASK, bind=True)
+def shadow_inference(self, video_id: str, model_id: str, primary_weights: str, frames: list):
+    logger.info("Starting shadow inference of model %s on video %s", model_id, video_id)
+    run_shadow(video_id, model_id, primary_weights, [tuple(frame) for frame in frames])
+
+
+@worker_init.connect
+def serve_metrics(sender=None, **kwargs):
+    pool = getattr(sender, "pool_cls", "")
+    if not MULTIPROCESS and "prefork" in getattr(pool, "__module__", str(pool)):
+        logger.error(
+            "PROMETHEUS_MULTIPROC_DIR is not set: only the metrics of the parent process are served, "
+            "not those of the prefork children running the tasks"
+        )
+    start_metrics_server(WORKER_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+@worker_init.connect
+def start_storage_sweeps(*args, **kwargs):
+    start_storage_lifecycle()
+
+
+@worker_init.connect
+def dispatch_queued_videos(sender=None, **kwargs):
+    # Requeues the videos this worker was running when it stopped, and picks up videos
+    # queued while no worker was running
+    try:
+        video_scheduler.recover(sender.hostname)
+    except Exception as e:
+        logger.error("Could not dispatch queued videos: %s", e)
+    start_periodic_dispatch()
+
+
+@task_postrun.connect
+def flush_pending_writes(*args, **kwargs):
+    # Runs after every task, whether it succeeded or failed
+    mongo_handler.flush_video_status()
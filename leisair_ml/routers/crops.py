@@ -0,0 +1,18 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from leisair_ml.utils.crop_cache import crop_store
+
+router = APIRouter()
+
+
+@router.get("/crops/{content_id}")
+async def get_crop(content_id: str):
+    """
+    Serve a track crop or keyframe cached at detection time.
+    """
+    path = await run_in_threadpool(crop_store.path, content_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Crop not found")
+    # Content-addressed, so the bytes behind an id never change
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+from bson.objectid import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from leisair_ml.utils.datetimes import naive_utc
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+router = APIRouter()
+logger = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+VIDEO_SUMMARY_PROJECTION = {
+    "locationId": 1,
+    "filename": 1,
+    "startTime": 1,
+    "endTime": 1,
+    "fps": 1,
+    "frameCount": 1,
+    "processingVersion": 1,
+}
+
+
+@router.on_event("startup")
+def create_indexes():
+    try:
+        mongo_handler.ensure_camera_video_indexes()
+    except Exception as e:
+        logger.error("Error creating cameraVideo indexes: %s", e)
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _decode_video_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decode a (startTime, _id) cursor of the video listing.
+    """
+    values = _decode_cursor(cursor)
+    if len(values) != 2 or not all(isinstance(value, str) for value in values) or not ObjectId.is_valid(values[1]):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return datetime.fromisoformat(values[0]), ObjectId(values[1])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _decode_frame_cursor(cursor: str) -> int:
+    """
+    Decode the next-frame cursor of the detections of a video.
+    """
+    values = _decode_cursor(cursor)
+    # bool is an int, but never a frame number
+    if len(values) != 1 or not isinstance(values[0], int) or isinstance(values[0], bool) or values[0] < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0]
+
+
+def _video_id(video_id: str) -> ObjectId:
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(status_code=404, detail="Video not found")
+    return ObjectId(video_id)
+
+
+def _respond(payload: dict, etag: str) -> Response:
+    """
+    Build a JSON response carrying an ETag. Size and latency are recorded by the API metrics middleware.
+    """
+    return JSONResponse(content=jsonable_encoder(payload), headers={"ETag": etag})
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+
+@router.get("/locations/{location_id}/videos")
+def list_videos(
+    location_id: str,
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    List the videos of a location within a time window, without their detections.
+    """
+    after = None
+    if cursor:
+        after = _decode_video_cursor(cursor)
+
+    documents = mongo_handler.find_camera_videos(
+        location_id, naive_utc(start), naive_utc(end), after, limit + 1, VIDEO_SUMMARY_PROJECTION
+    )
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = _encode_cursor([last["startTime"].isoformat(), str(last["_id"])])
+
+    versions = ",".join(f"{document['_id']}:{document.get('processingVersion', 0)}" for document in documents)
+    etag = '"' + hashlib.sha1(f"{versions}|{next_cursor}".encode()).hexdigest() + '"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    videos = [{**document, "_id": str(document["_id"])} for document in documents]
+    return _respond({"videos": videos, "nextCursor": next_cursor}, etag)
+
+
+def _frame_range(video: dict, frame_start, frame_end, start_time, end_time) -> tuple:
+    """
+    Resolve the requested frame or timestamp range to [first, last) frame numbers.
+    """
+    first = frame_start or 0
+    last = frame_end + 1 if frame_end is not None else None
+
+    if start_time is not None or end_time is not None:
+        fps = video.get("fps")
+        if not fps:
+            raise HTTPException(status_code=400, detail="Video has no frame rate, query by frame instead")
+        if start_time is not None:
+            offset = (naive_utc(start_time) - video["startTime"]).total_seconds()
+            first = max(first, int(offset * fps))
+        if end_time is not None:
+            offset = (naive_utc(end_time) - video["startTime"]).total_seconds()
+            frame = int(offset * fps) + 1
+            last = frame if last is None else min(last, frame)
+
+    if last is None:
+        last = video.get("frameCount")
+    if last is None:
+        last_detected = mongo_handler.get_last_detected_frame(str(video["_id"]))
+        last = last_detected + 1 if last_detected is not None else 0
+    return max(first, 0), max(last, 0)
+
+
+@router.get("/videos/{video_id}/detections")
+def get_detections(
+    video_id: str,
+    request: Request,
+    frame_start: Optional[int] = Query(None, ge=0),
+    frame_end: Optional[int] = Query(None, ge=0),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(300, ge=1, le=1800, description="Maximum number of frames per page"),
+):
+    """
+    Get the detections of a video for a frame or timestamp range, one page of frames at a time.
+    """
+    video = mongo_handler.read_camera_video_fields(str(_video_id(video_id)), VIDEO_SUMMARY_PROJECTION)
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    first, last = _frame_range(video, frame_start, frame_end, start_time, end_time)
+    if cursor:
+        first = max(first, _decode_frame_cursor(cursor))
+    page_end = min(last, first + limit)
+
+    etag = f'"{video_id}-v{video.get("processingVersion", 0)}-{first}-{page_end}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    frames = {}
+    if first < page_end:
+        projection = {f"vesselsDetected.{frame}": 1 for frame in range(first, page_end)}
+        document = mongo_handler.read_camera_video_fields(video_id, projection) or {}
+        frames = document.get("vesselsDetected") or {}
+
+    payload = {
+        "videoId": video_id,
+        "fps": video.get("fps"),
+        "startTime": video.get("startTime"),
+        "frameStart": first,
+        "frameEnd": page_end,
+        "frames": frames,
+        "nextCursor": _encode_cursor([page_end]) if page_end < last else None,
+    }
+    return _respond(payload, etag)
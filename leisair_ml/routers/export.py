@@ -0,0 +1,46 @@
+import logging
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from leisair_ml.utils.datetimes import naive_utc
+from leisair_ml.services.detection_export import resolve_location, stream_export, video_cursor
+
+router = APIRouter()
+logger = logging.getLogger("leisair")
+
+MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+@router.get("/locations/{location_id}/detections/export")
+def export_detections(
+    location_id: str,
+    format: Literal["parquet", "csv"] = "parquet",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[str] = None,
+):
+    """
+    Stream the detections of a location and time window as Parquet or CSV, one row group at a time.
+    Videos are exported in start time order; to resume an interrupted CSV download, pass the videoId
+    of the last video received in full as `after`. An interrupted Parquet download has no footer and
+    cannot be read, so `after` is only accepted for CSV. Videos still processing are left out.
+    """
+    try:
+        location_id, location_name = resolve_location(location_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Location not found")
+    cursor = None
+    if after is not None:
+        if format != "csv":
+            raise HTTPException(status_code=400, detail="after is only supported for CSV exports")
+        cursor = video_cursor(after)
+        if cursor is None:
+            raise HTTPException(status_code=400, detail="Unknown video in after")
+
+    filename = f"detections-{location_name}.{format}"
+    return StreamingResponse(
+        stream_export(location_id, location_name, format, naive_utc(start), naive_utc(end), cursor),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,15 +1,38 @@
+import datetime
 import logging
+import shutil
+import tarfile
+import zipfile
+from typing import List, Tuple
 from fastapi import APIRouter, Response, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 import os
+from nanoid import generate
 from pydantic import BaseModel
-from leisair_ml.celery_worker import process_file
+from leisair_ml.services.storage_lifecycle import storage_manager
+from leisair_ml.services.video_scheduler import schedule_videos
+from leisair_ml.utils.mongo_handler import MongoDBHandler
 from pathlib import Path
 import os
 
 router = APIRouter()
 logger = logging.getLogger("leisair")
 
+mongo_handler = MongoDBHandler()
+
 VIDEOS_PATH = os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos")
+VIDEO_SUFFIXES = (".mp4",)
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+@router.on_event("startup")
+def create_indexes():
+    try:
+        mongo_handler.ensure_video_queue_indexes()
+    except Exception as e:
+        logger.error("Error creating videoQueue indexes: %s", e)
+
 
 @router.post("/upload")
 async def process_video(response: Response, file: UploadFile = File(...)):
@@ -21,35 +44,157 @@ async def process_video(response: Response, file: UploadFile = File(...)):
         # Generate a file path
         file_path = Path(VIDEOS_PATH) / file.filename
         
-        # Check if file already exists to avoid overwriting
-        if file_path.exists():
+        # Save the uploaded file off the event loop, without overwriting an existing one
+        if not await run_in_threadpool(_save_stream, file.file, file_path):
             response.status_code = 201
             return {"message": "File already exists"}
             # raise HTTPException(status_code=400, detail="File already exists")
-
-        # Save the uploaded file
-        with file_path.open("wb") as buffer:
-            while content := await file.read(1024):  # Adjust chunk size as needed
-                buffer.write(content)
-
-        await file.seek(0)
         
-        print("Received request to detect file: ", file.filename)
-        # Send the file to the Celery worker for processing
-        process_file.delay(str(file_path))
+        logger.info("Received request to detect file: %s", file.filename)
+        # Queue the file for the Celery workers, in its location's fair share
+        await run_in_threadpool(schedule_videos, [str(file_path)])
         
         return {"message": "File queued for processing"}
     except Exception as e:
-        logger.error("Error processing file:", e)
+        logger.error("Error processing file: %s", e)
         raise HTTPException(status_code=500, detail="Error processing file")
 
 @router.post("/deleteAll")
-async def delete_video(response: Response):
+def delete_video(response: Response):
+    """
+    Delete every source video that is not being uploaded, queued or processed.
+    """
     try:
-        for file in os.listdir(VIDEOS_PATH):
-            if file.endswith(".mp4"):
-                os.remove(os.path.join(VIDEOS_PATH, file))
-        return {"message": "All files deleted"}
+        report = storage_manager.delete_videos()
+        if report["skippedInFlight"]:
+            message = f"{report['deleted']} files deleted, {report['skippedInFlight']} in flight skipped"
+        else:
+            message = "All files deleted"
+        return {"message": message, **report}
     except Exception as e:
-        logger.error("Error deleting file:", e)
+        logger.error("Error deleting file: %s", e)
         raise HTTPException(status_code=500, detail="Error deleting file")
+
+
+def _save_stream(source, file_path: Path) -> bool:
+    """
+    Copy a file-like object to file_path in chunks. The data is written to a temporary
+    name first so a partially written video is never picked up.
+
+    Returns:
+        bool: False if the file already exists.
+    """
+    if file_path.exists():
+        return False
+    part_path = file_path.with_name(file_path.name + ".part")
+    try:
+        with part_path.open("wb") as buffer:
+            shutil.copyfileobj(source, buffer, COPY_CHUNK_SIZE)
+        os.replace(part_path, file_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def _save_upload(file: UploadFile) -> Tuple[List[Path], List[str]]:
+    """
+    Save an uploaded video, or every video inside an uploaded zip/tar archive, to VIDEOS_PATH.
+    Archive members are streamed one at a time and flattened into VIDEOS_PATH.
+
+    Returns:
+        tuple: The saved file paths and the names that were skipped.
+    """
+    saved, skipped = [], []
+
+    def save(name: str, source):
+        file_path = Path(VIDEOS_PATH) / Path(name).name
+        if _save_stream(source, file_path):
+            saved.append(file_path)
+        else:
+            skipped.append(file_path.name)
+
+    filename = file.filename.lower()
+    if filename.endswith(ZIP_SUFFIXES):
+        with zipfile.ZipFile(file.file) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(VIDEO_SUFFIXES):
+                    continue
+                with archive.open(member) as source:
+                    save(member.filename, source)
+    elif filename.endswith(TAR_SUFFIXES):
+        # "r|*" reads the archive as a stream, member by member, without seeking
+        with tarfile.open(fileobj=file.file, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(VIDEO_SUFFIXES):
+                    continue
+                source = archive.extractfile(member)
+                if source is not None:
+                    save(member.name, source)
+    elif filename.endswith(VIDEO_SUFFIXES):
+        save(file.filename, file.file)
+    else:
+        skipped.append(file.filename)
+    return saved, skipped
+
+
+def _save_batch(files: List[UploadFile]) -> Tuple[List[Path], List[str]]:
+    saved, skipped = [], []
+    for file in files:
+        file_saved, file_skipped = _save_upload(file)
+        saved.extend(file_saved)
+        skipped.extend(file_skipped)
+    return saved, skipped
+
+
+def _fail_batch(batch_id: str) -> None:
+    """
+    Close a batch that could not be queued, so it is not reported as queued forever.
+    """
+    try:
+        mongo_handler.update_video_batch(batch_id, {"status": "failed", "updatedAt": datetime.datetime.now()})
+    except Exception as e:
+        logger.error("Error closing batch %s: %s", batch_id, e)
+
+
+@router.post("/upload/batch")
+async def process_video_batch(files: List[UploadFile] = File(...)):
+    """
+    Save many videos, or zip/tar archives of videos, and queue them as one batch.
+    """
+    files = [file for file in files if file is not None and file.filename]
+    if not files:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    batch_id = None
+    try:
+        saved, skipped = await run_in_threadpool(_save_batch, files)
+        if not saved:
+            return {"batchId": None, "queued": [], "skipped": skipped}
+
+        batch_id = generate()
+        filenames = [file_path.name for file_path in saved]
+        await run_in_threadpool(mongo_handler.create_video_batch, batch_id, filenames)
+
+        await run_in_threadpool(schedule_videos, [str(file_path) for file_path in saved], batch_id)
+
+        logger.info("Queued batch %s with %d files", batch_id, len(saved))
+        return {"batchId": batch_id, "queued": filenames, "skipped": skipped}
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        logger.error("Invalid archive: %s", e)
+        raise HTTPException(status_code=400, detail="Invalid archive")
+    except Exception as e:
+        logger.error("Error processing batch: %s", e)
+        if batch_id is not None:
+            await run_in_threadpool(_fail_batch, batch_id)
+        raise HTTPException(status_code=500, detail="Error processing batch")
+
+
+@router.get("/upload/batch/{batch_id}")
+def get_batch_status(batch_id: str):
+    """
+    Get the status of an uploaded batch and each of its files.
+    """
+    batch = mongo_handler.read_video_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
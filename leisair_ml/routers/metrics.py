@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+from leisair_ml.utils.metrics import metrics_payload
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Expose the API metrics in the Prometheus exposition format.
+    """
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
@@ -1,22 +1,98 @@
 import logging
+from typing import Dict
 from fastapi import APIRouter, Response, UploadFile, File, HTTPException
 import os
 from pydantic import BaseModel
-from leisair_ml.celery_worker import retrain_model
+from leisair_ml.celery_client import enqueue_update_model
+from leisair_ml.utils.mongo_handler import MongoDBHandler
 from pathlib import Path
 import os
 
 router = APIRouter()
 logger = logging.getLogger("leisair")
 
+mongo_handler = MongoDBHandler()
+
 VIDEOS_PATH = os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos")
 
 @router.post("/update-model")
 async def update_model(response: Response):
     try:
-        retrain_model.delay()
+        enqueue_update_model()
         
         return {"message": "Model update started."}
     except Exception as e:
-        logger.error("Error updating model:", e)
-        raise HTTPException(status_code=500, detail="Error updating model.")
\ No newline at end of file
+        logger.error("Error updating model: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating model.")
+
+
+@router.post("/models/{model_id}/shadow")
+def start_shadow(model_id: str):
+    """
+    Run a model in shadow of the selected one on a sample of the frames of new videos.
+    """
+    model = mongo_handler.read_model(model_id)
+    if model is None or not model.get("path"):
+        raise HTTPException(status_code=404, detail="Model not found")
+    if model.get("selected"):
+        raise HTTPException(status_code=400, detail="Model is already selected")
+    mongo_handler.set_shadow_model(model_id)
+    return {"message": f"Model {model_id} is shadowing the selected model."}
+
+
+@router.delete("/models/shadow")
+def stop_shadow():
+    """
+    Stop shadowing the current candidate. Its statistics are kept.
+    """
+    mongo_handler.clear_shadow_model()
+    return {"message": "Shadow inference stopped."}
+
+
+@router.get("/models/{model_id}/shadow")
+def get_shadow_report(model_id: str):
+    """
+    Get how a candidate compared with the selected model on production frames so far.
+    """
+    model = mongo_handler.read_model(model_id)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return {
+        "modelId": model_id,
+        "shadowing": bool(model.get("shadowCandidate")),
+        "startedAt": model.get("shadowStartedAt"),
+        **_shadow_report(model.get("shadowStats") or {}),
+    }
+
+
+@router.post("/models/{model_id}/promote")
+def promote(model_id: str):
+    """
+    Select a model, e.g. a shadow candidate whose report is satisfactory.
+    """
+    model = mongo_handler.read_model(model_id)
+    if model is None or not model.get("path"):
+        raise HTTPException(status_code=404, detail="Model not found")
+    mongo_handler.promote_model(model_id)
+    logger.info("Model %s promoted", model_id)
+    return {"message": f"Model {model_id} promoted."}
+
+
+def _shadow_report(stats: Dict) -> Dict:
+    frames = stats.get("frames", 0)
+    timed = stats.get("timedFrames", 0)
+    primary_seconds = stats.get("primarySeconds", 0.0)
+    candidate_seconds = stats.get("candidateSeconds", 0.0)
+    return {
+        "videos": stats.get("videos", 0),
+        "frames": frames,
+        "meanAgreement": stats["agreementSum"] / frames if frames else None,
+        "agreedFrameRatio": stats["agreedFrames"] / frames if frames else None,
+        "primaryFps": timed / primary_seconds if primary_seconds else None,
+        "candidateFps": timed / candidate_seconds if candidate_seconds else None,
+        "relativeCost": candidate_seconds / primary_seconds if primary_seconds else None,
+        "primaryDetections": stats.get("primaryDetections", 0),
+        "candidateDetections": stats.get("candidateDetections", 0),
+        "confusion": stats.get("confusion", {}),
+        "updatedAt": stats.get("updatedAt"),
+    }
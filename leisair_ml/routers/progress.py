@@ -0,0 +1,67 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+from leisair_ml.utils.progress import broadcaster, publisher
+
+router = APIRouter()
+logger = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+KEEP_ALIVE_SECONDS = 15
+
+
+@router.get("/progress/stream")
+async def stream_progress(request: Request, video_id: Optional[str] = None):
+    """
+    Stream processing progress events as Server-Sent Events, optionally for a single video.
+    """
+    if not broadcaster.enabled:
+        raise HTTPException(status_code=503, detail="Progress streaming is not configured")
+
+    queue = broadcaster.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if video_id is not None and event.get("videoId") != video_id:
+                    continue
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/videos/{video_id}/status")
+async def get_video_status(video_id: str):
+    """
+    Get the latest known progress of a video, from Redis if available, else from its videoStatus checkpoint.
+    """
+    latest = await run_in_threadpool(publisher.latest, video_id)
+    if latest is not None:
+        return latest
+
+    status = await run_in_threadpool(mongo_handler.read_video_status, video_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Video status not found")
+    return {
+        "videoId": video_id,
+        "filename": status.filename,
+        "status": status.status,
+        "progress": status.progress,
+    }
@@ -0,0 +1,33 @@
+import logging
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter
+from leisair_ml.utils.datetimes import naive_utc
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+router = APIRouter()
+logger = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+
+@router.on_event("startup")
+def create_indexes():
+    try:
+        mongo_handler.ensure_traffic_rollup_indexes()
+    except Exception as e:
+        logger.error("Error creating vesselTrafficRollups indexes: %s", e)
+
+
+@router.get("/locations/{location_id}/traffic")
+def get_traffic(
+    location_id: str,
+    granularity: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Get the number of unique vessels per type that passed a location, per hour or day.
+    """
+    rollups = mongo_handler.find_traffic_rollups(location_id, granularity, naive_utc(start), naive_utc(end))
+    return {"locationId": location_id, "granularity": granularity, "buckets": rollups}
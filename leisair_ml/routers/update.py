@@ -1,14 +1,16 @@
+import asyncio
+import logging
 import os
 import subprocess
-import httpx
 import dotenv
-from packaging import version
 from fastapi import APIRouter, BackgroundTasks, Body
 from pydantic import BaseModel
+from leisair_ml.utils.registry_versions import registry_versions
 
 dotenv.load_dotenv()
 
 router = APIRouter()
+logger = logging.getLogger("leisair")
 
 CURRENT_LEISAIR_ML_VERSION = os.getenv("LEISAIR_ML_VERSION", "unknown")
 
@@ -16,65 +18,33 @@ async def get_latest_version(package_name: str) -> str:
     """
     Fetch the latest semantic version tag of a package from GitHub Container Registry.
     """
-    url = f"https://ghcr.io/v2/{os.getenv('GITHUB_USERNAME')}/{package_name}/tags/list"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('ENCODED_GITHUB_TOKEN')}"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        print("RESPONSE: ", response.text)
-        if response.is_error:
-            return "unknown"  # or handle the error as needed
-
-        data = response.json()
-        tags = data.get("tags", [])
-        print("TAGS: ", tags)
-
-        if not tags:
-            return "unknown"
+    return await registry_versions.latest_version(package_name)
 
-        # Filter out non-semantic version tags and sort them
-        semantic_tags = []
-        for tag in tags:
-            try:
-                # This will raise an exception if tag is not a valid semantic version
-                parsed_version = version.parse(tag)
-                if not parsed_version.is_prerelease and not parsed_version.is_devrelease:
-                    semantic_tags.append(tag)
-            except Exception as e:
-                print(f"Skipping non-semantic version tag: {tag} - {e}")
 
-        if not semantic_tags:
-            return "unknown"
+@router.on_event("shutdown")
+async def close_registry_client():
+    await registry_versions.aclose()
 
-        # Sort the versions using packaging.version.parse to ensure semantic versioning order
-        latest_version_tag = sorted(semantic_tags, key=lambda x: version.parse(x), reverse=True)[0]
 
-        return latest_version_tag
+def _update_info(current_version: str, latest_version: str) -> dict:
+    return {
+        "current_version": current_version,
+        "latest_version": latest_version,
+        "update_available": current_version != latest_version
+    }
 
 
 @router.post("/check-updates")
 async def check_updates(current_nextjs_version: str = Body(..., embed=True, title="Current leisair-nextjs version")):
-    updates_info = {}
-
-    # Check update for leisair-nextjs
-    latest_nextjs_version = await get_latest_version("leisair-nextjs")
-    updates_info["leisair-nextjs"] = {
-        "current_version": current_nextjs_version,
-        "latest_version": latest_nextjs_version,
-        "update_available": current_nextjs_version != latest_nextjs_version
-    }
-
-    # Check update for leisair-ml
-    latest_ml_version = await get_latest_version("leisair-ml")
-    updates_info["leisair-ml"] = {
-        "current_version": CURRENT_LEISAIR_ML_VERSION,
-        "latest_version": latest_ml_version,
-        "update_available": CURRENT_LEISAIR_ML_VERSION != latest_ml_version
+    latest_nextjs_version, latest_ml_version = await asyncio.gather(
+        get_latest_version("leisair-nextjs"),
+        get_latest_version("leisair-ml"),
+    )
+    return {
+        "leisair-nextjs": _update_info(current_nextjs_version, latest_nextjs_version),
+        "leisair-ml": _update_info(CURRENT_LEISAIR_ML_VERSION, latest_ml_version),
     }
 
-    return updates_info
 
 def docker_login(username: str, token: str):
     """
@@ -127,7 +97,7 @@ def initiate_update_process(images_with_tags: dict):
     for image, new_tag in images_with_tags.items():
         # Pull the latest image version
         new_image = f"ghcr.io/{github_username}/{image}:{new_tag}"
-        print(f"Pulling the latest image for {image}: {new_image}")
+        logger.info("Pulling the latest image for %s: %s", image, new_image)
         subprocess.run(["docker", "pull", new_image], check=True)
 
         # Determine which services need to be updated based on the image they use
@@ -135,11 +105,11 @@ def initiate_update_process(images_with_tags: dict):
 
         # Recreate each service with the new image version
         for service in services_to_update:
-            print(f"Recreating {service} with the latest image: {new_image}")
+            logger.info("Recreating %s with the latest image: %s", service, new_image)
             # In Docker Compose, use 'docker-compose up -d' to recreate the service
             subprocess.run(["docker-compose", "up", "-d", "--force-recreate", service], check=True)
 
-            print(f"Service {service} has been updated to use the latest image version: {new_image}.")
+            logger.info("Service %s has been updated to use the latest image version: %s", service, new_image)
 
 # def initiate_update_process(services: dict):
 #     """
@@ -190,7 +160,7 @@ class UpdateRequest(BaseModel):
 
 @router.post("/initiate-update")
 async def initiate_update(update_request: UpdateRequest, background_tasks: BackgroundTasks):
-    print("Received update request:", update_request)
+    logger.info("Received update request: %s", update_request)
     # Using background tasks to not block the API response
     background_tasks.add_task(initiate_update_process, update_request.services)
     return {"message": "Update process initiated"}
\ No newline at end of file
@@ -1,13 +1,18 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.concurrency import asynccontextmanager
-from leisair_ml.routers import file_upload, update, model_update
+from leisair_ml.routers import file_upload, update, model_update, detections, traffic, progress, crops, metrics, export
 from leisair_ml.utils.file_watcher import start_watching, stop_watching
 import uvicorn
 from dotenv import load_dotenv
+from leisair_ml.utils.logger import custom_logger
+from leisair_ml.utils.metrics import HTTP_REQUEST_SECONDS, HTTP_RESPONSE_BYTES
 
 load_dotenv()
 
+logger = custom_logger("leisair")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     start_watching()
@@ -24,6 +29,12 @@ app = FastAPI()# (lifespan=lifespan)
 app.include_router(file_upload.router)
 app.include_router(update.router)
 app.include_router(model_update.router)
+app.include_router(detections.router)
+app.include_router(traffic.router)
+app.include_router(progress.router)
+app.include_router(crops.router)
+app.include_router(metrics.router)
+app.include_router(export.router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,5 +44,18 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep label cardinality bounded
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.labels(request.method, route_path, str(response.status_code)).observe(time.perf_counter() - started)
+    content_length = response.headers.get("content-length")
+    if content_length is not None:
+        HTTP_RESPONSE_BYTES.labels(request.method, route_path).observe(int(content_length))
+    return response
+
 def main():
     uvicorn.run("leisair_ml.run_api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
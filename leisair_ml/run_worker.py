@@ -1,6 +1,23 @@
+import glob
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 
+WORKER_POOL = os.getenv("WORKER_POOL", "solo")
+WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY")
+
 def main():
-    os.system("celery -A leisair_ml.celery_worker worker --loglevel=info -E -P solo")
+    command = f"celery -A leisair_ml.celery_worker worker --loglevel=info -E -P {WORKER_POOL}"
+    if WORKER_CONCURRENCY:
+        command += f" --concurrency={WORKER_CONCURRENCY}"
+    if WORKER_POOL == "prefork":
+        # The pool children write their metrics to files that the metrics server of the
+        # parent aggregates; files left by a previous run would be counted again
+        metrics_dir = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "leisair-worker-metrics")
+        )
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)
+    os.system(command)
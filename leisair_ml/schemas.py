@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, AfterValidator, PlainSerializer, WithJsonSchema
-from typing import Dict, List, Literal, Optional, Annotated, Union
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Mapping, Optional, Annotated, Union
 from bson.objectid import ObjectId
 from datetime import datetime
 
@@ -65,6 +65,16 @@ class VesselDetected(BaseModel):
     bbox: BBOX
 
 
+class TrackCrop(BaseModel):
+    cropId: str
+    keyframeId: str
+    frame: int
+    confidence: float
+    bbox: BBOX
+    frameWidth: int
+    frameHeight: int
+
+
 class CameraVideo(BaseModel):
     id: Optional[PyObjectId] = Field(None, alias="_id")
     locationId: str
@@ -72,6 +82,10 @@ class CameraVideo(BaseModel):
     startTime: datetime
     endTime: Optional[datetime]
     vesselsDetected: Optional[Dict[int, List[VesselDetected]]]
+    fps: Optional[float] = None
+    frameCount: Optional[int] = None
+    processingVersion: Optional[int] = None
+    trackCrops: Optional[Dict[str, TrackCrop]] = None
     # metadata: Optional[Dict]
 
     class Config:
@@ -81,13 +95,109 @@ class CameraVideo(BaseModel):
         arbitrary_types_allowed = True
 
 
+def _construct_detection(raw: Dict) -> VesselDetected:
+    # Trusted data written by update_vessels_detected_bulk, so skip validation
+    fields = dict(raw)
+    fields["bbox"] = BBOX.model_construct(**raw["bbox"])
+    return VesselDetected.model_construct(**fields)
+
+
+class DetectionsView(Mapping):
+    """
+    Read-only mapping of frame number to detections over the raw vesselsDetected
+    document. A frame's detections are built on first access and then cached.
+    """
+
+    __slots__ = ("_raw", "_build", "_cache")
+
+    def __init__(self, raw: Dict[str, List[Dict]], validate: bool = False):
+        self._raw = raw
+        self._build = VesselDetected.model_validate if validate else _construct_detection
+        self._cache: Dict[int, List[VesselDetected]] = {}
+
+    def __getitem__(self, frame: int) -> List[VesselDetected]:
+        frame = int(frame)
+        detections = self._cache.get(frame)
+        if detections is None:
+            detections = self._cache[frame] = [self._build(raw) for raw in self._raw[str(frame)]]
+        return detections
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(frame) for frame in self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __contains__(self, frame: object) -> bool:
+        return str(frame) in self._raw
+
+    def raw(self, frame: int) -> List[Dict]:
+        """
+        Get the detections of a frame as stored, without building models.
+        """
+        return self._raw[str(frame)]
+
+
+class CameraVideoView:
+    """
+    Lightweight view of a cameraVideo document, possibly read with a projection.
+
+    Top-level fields are returned as stored. vesselsDetected is wrapped in a
+    DetectionsView so detections are only built for the frames that are accessed.
+    Reading a field that was not loaded raises AttributeError rather than
+    returning None.
+    """
+
+    __slots__ = ("_document", "_fields", "_validate", "_detections")
+
+    def __init__(self, document: Dict, fields: Optional[Iterable[str]] = None, validate: bool = False):
+        self._document = document
+        self._fields = None if fields is None else {field.split(".")[0] for field in fields} | {"_id"}
+        self._validate = validate
+        self._detections: Optional[DetectionsView] = None
+
+    def __getattr__(self, name: str) -> Any:
+        key = "_id" if name == "id" else name
+        if key not in CameraVideo.model_fields and key != "_id":
+            raise AttributeError(name)
+        if self._fields is not None and key not in self._fields:
+            raise AttributeError(f"{name} was not loaded, add it to the projection")
+        if key == "vesselsDetected":
+            return self.vessels_detected
+        return self._document.get(key)
+
+    @property
+    def vessels_detected(self) -> Optional[DetectionsView]:
+        if self._detections is None:
+            if self._fields is not None and "vesselsDetected" not in self._fields:
+                raise AttributeError("vesselsDetected was not loaded, add it to the projection")
+            raw = self._document.get("vesselsDetected")
+            if raw is None:
+                return None
+            self._detections = DetectionsView(raw, self._validate)
+        return self._detections
+
+    @property
+    def document(self) -> Dict:
+        """
+        The document as read from MongoDB.
+        """
+        return self._document
+
+    def to_model(self) -> "CameraVideo":
+        """
+        Validate the whole document into a CameraVideo.
+        """
+        return CameraVideo(**self._document)
+
+
 class VideoStatus(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
     filename: str
     status: str
     progress: float
     createdAt: datetime
-    updatedAt: Optional[datetime]
+    updatedAt: Optional[datetime] = None
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -95,6 +205,15 @@ class VideoStatus(BaseModel):
         populate_by_name = True
         arbitrary_types_allowed = True
 
+class ImageRef(BaseModel):
+    store: str
+    id: str
+    contentType: Optional[str] = None
+    width: int
+    height: int
+    size: int
+
+
 def custom_alias_gen(field_name: str):
     if field_name == "_id":
         return "id"
@@ -115,7 +234,12 @@ class VesselCorrections(BaseModel):
     bbox: BBOX
     speed: Optional[float]
     direction: Optional[str]
-    image: str
+    image: Optional[str] = None
+    imageRef: Optional[ImageRef] = None
+    cropId: Optional[str] = None
+    keyframeId: Optional[str] = None
+    imageWidth: Optional[int] = None
+    imageHeight: Optional[int] = None
     used: Optional[bool] = None
 
     class Config:
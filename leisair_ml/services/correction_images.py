@@ -0,0 +1,13 @@
+"""
+Migrates inline base64 vessel correction images to the blob store.
+"""
+
+import os
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+
+
+def main():
+    migrated = MongoDBHandler().migrate_correction_images(MIGRATION_BATCH_SIZE)
+    print(f"Migrated {migrated} correction images")
@@ -0,0 +1,332 @@
+"""
+Streaming export of the detections of a location and time window to Parquet or CSV.
+
+Videos are read one page of summaries at a time and the detections one video at a
+time, and rows are written out in row groups of EXPORT_ROW_GROUP_ROWS. Memory is
+therefore bounded by one video and one row group, whatever the range. Videos are
+exported in (startTime, _id) order, so an export can resume after the last video it
+completed. Only finished videos are exported: a video still processing, or a live
+segment still recording, is left out rather than exported partially, and an export
+of its range must be run again once it is done.
+
+Usage:
+    poetry run export-detections LOCATION --start 2024-01-01 --end 2024-02-01 --output export/
+    poetry run export-detections LOCATION --output export/ --resume
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "100000"))
+EXPORT_VIDEO_PAGE_SIZE = 50
+# Rows per part file of a CLI export; a resumed export starts a new part
+EXPORT_PART_ROWS = int(os.getenv("EXPORT_PART_ROWS", "5000000"))
+
+COLUMNS = (
+    "timestamp", "location", "locationId", "videoId", "frame",
+    "trackId", "class", "confidence", "x1", "y1", "x2", "y2",
+)
+EXPORT_VIDEO_PROJECTION = {"locationId": 1, "startTime": 1, "fps": 1, "processingVersion": 1}
+CHECKPOINT_FILE = "_checkpoint.json"
+
+# A (startTime, _id) position in the export order, after which videos are exported
+Cursor = Tuple[datetime, ObjectId]
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms")),
+        ("location", pa.string()),
+        ("locationId", pa.string()),
+        ("videoId", pa.string()),
+        ("frame", pa.int32()),
+        ("trackId", pa.string()),
+        ("class", pa.string()),
+        ("confidence", pa.float32()),
+        ("x1", pa.float32()),
+        ("y1", pa.float32()),
+        ("x2", pa.float32()),
+        ("y2", pa.float32()),
+    ])
+
+
+def resolve_location(location: str) -> Tuple[str, str]:
+    """
+    Resolve a location ID or name to its (ID, name).
+    """
+    camera_location = None
+    if ObjectId.is_valid(location):
+        camera_location = mongo_handler.read_camera_location(location)
+    if camera_location is None:
+        camera_location = mongo_handler.read_camera_location_by_name(location)
+    if camera_location is None:
+        raise ValueError(f"Unknown location: {location}")
+    return str(camera_location.id), camera_location.name
+
+
+def video_cursor(video_id: str) -> Optional[Cursor]:
+    """
+    The cursor positioned just after a video, to resume an export from it.
+    """
+    if not ObjectId.is_valid(video_id):
+        return None
+    video = mongo_handler.read_camera_video_fields(video_id, {"startTime": 1})
+    return (video["startTime"], video["_id"]) if video else None
+
+
+def iter_row_groups(
+    location_id: str,
+    location_name: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Cursor] = None,
+    row_group_rows: int = EXPORT_ROW_GROUP_ROWS,
+) -> Iterator[Tuple[Dict[str, list], Cursor]]:
+    """
+    Yield the detections as column lists of about row_group_rows rows.
+
+    A row group only ever ends on a video boundary. Each row group comes with the
+    cursor of its last video, from which the export can resume. Videos that are not
+    finished are skipped.
+    """
+    columns: Dict[str, list] = {column: [] for column in COLUMNS}
+    while True:
+        videos = mongo_handler.find_camera_videos(
+            location_id, start, end, after, EXPORT_VIDEO_PAGE_SIZE, EXPORT_VIDEO_PROJECTION
+        )
+        statuses = mongo_handler.read_video_statuses([str(video["_id"]) for video in videos])
+        for video in videos:
+            after = (video["startTime"], video["_id"])
+            status = statuses.get(str(video["_id"]))
+            # Videos from before status tracking are finished once their detections were written
+            finished = status == "done" if status is not None else "processingVersion" in video
+            if not finished:
+                LOGGER.info("Skipping video %s from the export: %s", video["_id"], status or "not processed")
+                continue
+            document = mongo_handler.read_camera_video_fields(str(video["_id"]), {"vesselsDetected": 1}) or {}
+            _add_rows(columns, video, location_name, document.get("vesselsDetected") or {})
+            if len(columns["frame"]) >= row_group_rows:
+                yield columns, after
+                columns = {column: [] for column in COLUMNS}
+        if len(videos) < EXPORT_VIDEO_PAGE_SIZE:
+            break
+    if columns["frame"]:
+        yield columns, after
+
+
+def _add_rows(columns: Dict[str, list], video: Dict, location_name: str, vessels_detected: Dict) -> None:
+    video_id = str(video["_id"])
+    start_time = video["startTime"]
+    fps = video.get("fps")
+    for frame, vessels in sorted(vessels_detected.items(), key=lambda item: int(item[0])):
+        frame_number = int(frame)
+        timestamp = start_time + timedelta(seconds=frame_number / fps) if fps else start_time
+        for vessel in vessels:
+            bbox = vessel["bbox"]
+            columns["timestamp"].append(timestamp)
+            columns["location"].append(location_name)
+            columns["locationId"].append(video["locationId"])
+            columns["videoId"].append(video_id)
+            columns["frame"].append(frame_number)
+            columns["trackId"].append(vessel["vesselId"])
+            columns["class"].append(vessel["type"])
+            columns["confidence"].append(vessel["confidence"])
+            columns["x1"].append(bbox["x1"])
+            columns["y1"].append(bbox["y1"])
+            columns["x2"].append(bbox["x2"])
+            columns["y2"].append(bbox["y2"])
+
+
+def csv_chunk(columns: Dict[str, list], header: bool = False) -> str:
+    """
+    Format a row group as CSV text.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS)
+    for row in zip(*(columns[column] for column in COLUMNS)):
+        writer.writerow((row[0].isoformat(timespec="milliseconds"),) + row[1:])
+    return buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    A write-only file collecting what the Parquet writer has written since the last drain.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_export(
+    location_id: str,
+    location_name: str,
+    export_format: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Cursor] = None,
+) -> Iterator[bytes]:
+    """
+    Stream an export as bytes, one row group at a time.
+    """
+    row_groups = iter_row_groups(location_id, location_name, start, end, after)
+    if export_format == "csv":
+        header = True
+        for columns, _ in row_groups:
+            yield csv_chunk(columns, header).encode()
+            header = False
+        if header:
+            yield csv_chunk({column: [] for column in COLUMNS}, header=True).encode()
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for columns, _ in row_groups:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_to_directory(
+    location: str,
+    output: str,
+    export_format: str = "parquet",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resume: bool = False,
+) -> Dict:
+    """
+    Export to numbered part files in a directory. A part is written under a temporary
+    name and renamed once complete, then the checkpoint is updated, so an interrupted
+    export resumes after its last complete part.
+
+    Returns:
+        dict: The checkpoint: parts written, rows exported and the cursor.
+    """
+    location_id, location_name = resolve_location(location)
+    os.makedirs(output, exist_ok=True)
+    checkpoint_path = os.path.join(output, CHECKPOINT_FILE)
+    checkpoint = {"parts": 0, "rows": 0, "after": None, "done": False}
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["done"]:
+            return checkpoint
+    after = None
+    if checkpoint["after"]:
+        after_time, after_id = checkpoint["after"]
+        after = (datetime.fromisoformat(after_time), ObjectId(after_id))
+
+    part = _PartWriter(output, export_format)
+    for columns, cursor in iter_row_groups(location_id, location_name, start, end, after):
+        part.write(checkpoint["parts"], columns)
+        checkpoint["rows"] += len(columns["frame"])
+        if part.rows >= EXPORT_PART_ROWS:
+            part.close()
+            checkpoint["parts"] += 1
+            checkpoint["after"] = [cursor[0].isoformat(), str(cursor[1])]
+            _write_checkpoint(checkpoint_path, checkpoint)
+            LOGGER.info("Exported part %d, %d rows so far", checkpoint["parts"], checkpoint["rows"])
+    if part.rows:
+        part.close()
+        checkpoint["parts"] += 1
+    checkpoint["done"] = True
+    checkpoint["after"] = None
+    _write_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+def _write_checkpoint(path: str, checkpoint: Dict) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+class _PartWriter:
+    """
+    Writes row groups to the current part file, under a temporary name until closed.
+    """
+
+    def __init__(self, output: str, export_format: str):
+        self.output = output
+        self.export_format = export_format
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._path = None
+
+    def write(self, part: int, columns: Dict[str, list]) -> None:
+        if self._file is None:
+            self._path = os.path.join(self.output, f"part-{part:05d}.{self.export_format}")
+            self._file = open(self._path + ".tmp", "w" if self.export_format == "csv" else "wb")
+            if self.export_format == "parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self._file, parquet_schema())
+        if self.export_format == "csv":
+            self._file.write(csv_chunk(columns, header=self.rows == 0))
+        else:
+            import pyarrow as pa
+
+            self._writer.write_table(pa.Table.from_pydict(columns, schema=self._writer.schema))
+        self.rows += len(columns["frame"])
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._file.close()
+        os.replace(self._path + ".tmp", self._path)
+        self._file = self._writer = None
+        self.rows = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the detections of a location to Parquet or CSV.")
+    parser.add_argument("location", help="camera location ID or name")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--output", required=True, help="directory for the part files")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted export in the same directory")
+    args = parser.parse_args()
+    checkpoint = export_to_directory(args.location, args.output, args.format, args.start, args.end, args.resume)
+    print(f"Exported {checkpoint['rows']} detections to {checkpoint['parts']} part files in {args.output}")
@@ -0,0 +1,291 @@
+"""
+Real-time detection on a live stream.
+
+A reader thread pulls frames from an RTSP/HTTP URL, a named pipe or a local file and
+keeps only the newest one, so frames that arrive while the model is busy are dropped
+instead of queueing up. A frame that is already older than the latency bound when the
+model is free is dropped as well. Detections are written every LIVE_FLUSH_INTERVAL_S to
+a cameraVideo document that is rolled over every LIVE_SEGMENT_S, so each segment looks
+like an uploaded clip to the API, the rollups and the exports.
+
+Usage:
+    poetry run live-stream rtsp://camera/stream --location Bridge
+    poetry run live-stream clip.mp4 --location Bridge --realtime
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import supervision as sv
+from dotenv import load_dotenv
+from ultralytics import YOLO
+from leisair_ml.schemas import VesselDetected
+from leisair_ml.services.traffic_rollups import update_video_rollups
+from leisair_ml.services.vessel_detection import (
+    check_and_create_location,
+    create_camera_video_entry,
+    run_supervision,
+    selected_weights,
+    to_vessels_detected,
+)
+from leisair_ml.utils.logger import custom_logger
+from leisair_ml.utils.metrics import DETECTIONS_PER_FRAME, LIVE_FRAMES, LIVE_LATENCY_SECONDS, start_metrics_server
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+from leisair_ml.utils.progress import publisher
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+LIVE_MAX_LATENCY_MS = float(os.getenv("LIVE_MAX_LATENCY_MS", "1000"))
+LIVE_SEGMENT_S = float(os.getenv("LIVE_SEGMENT_S", "300"))
+LIVE_FLUSH_INTERVAL_S = float(os.getenv("LIVE_FLUSH_INTERVAL_S", "2"))
+LIVE_METRICS_PORT = int(os.getenv("LIVE_METRICS_PORT", "9101"))
+LIVE_RECONNECT_S = float(os.getenv("LIVE_RECONNECT_S", "5"))
+# Latency percentiles in the run report cover this many of the most recent frames
+LIVE_LATENCY_WINDOW = 10000
+
+FILENAME_TIME_FORMAT = "%Y-%m-%d_%H_%M_%S_%f"
+
+# (source frame index, capture wall-clock time, BGR frame)
+Frame = Tuple[int, float, object]
+
+
+class FrameGrabber:
+    """
+    Reads a stream on a background thread and keeps only the newest frame.
+
+    Args:
+        source (str): An RTSP/HTTP URL, a named pipe or a video file.
+        realtime (bool, optional): Pace reading at the source frame rate, to replay a file like a camera.
+    """
+
+    def __init__(self, source: str, realtime: bool = False):
+        self.source = source
+        self.realtime = realtime
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Could not open stream {source}")
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if 0 < fps < 240 else 25.0
+        self.frames_read = 0
+        self.frames_overwritten = 0
+        self.ended = False
+        self._frame: Optional[Frame] = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._read, name="frame-grabber", daemon=True)
+
+    def start(self) -> "FrameGrabber":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._thread.join(timeout=5)
+        self.capture.release()
+
+    def _read(self) -> None:
+        started = time.monotonic()
+        while not self._stopped:
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            if self.realtime:
+                delay = started + self.frames_read / self.fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            captured_at = time.time()
+            with self._condition:
+                if self._frame is not None:
+                    self.frames_overwritten += 1
+                self._frame = (self.frames_read, captured_at, frame)
+                self.frames_read += 1
+                self._condition.notify()
+        with self._condition:
+            self.ended = True
+            self._condition.notify_all()
+
+    def latest(self, timeout: float = 1.0) -> Optional[Frame]:
+        """
+        Take the newest frame, waiting up to timeout for one. Returns None at the end of the stream or on timeout.
+        """
+        with self._condition:
+            if self._frame is None and not self.ended:
+                self._condition.wait(timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+
+class LiveSegment:
+    """
+    A rolling cameraVideo document receiving the detections of a live stream.
+    """
+
+    def __init__(self, location: str, location_id: str, first_index: int):
+        self.started_at = datetime.now()
+        self.filename = f"{location} {self.started_at.strftime(FILENAME_TIME_FORMAT)}"
+        self.video_id = create_camera_video_entry(self.filename, location_id)
+        if not self.video_id:
+            raise RuntimeError(f"Could not create a cameraVideo for {self.filename}")
+        mongo_handler.update_video_status(self.video_id, "live", 0.0)
+        self.first_index = first_index
+        self.last_index = first_index
+        self.opened_at = time.monotonic()
+        self.pending: Dict[str, List[VesselDetected]] = {}
+        self.detections = 0
+
+    def add(self, index: int, vessels: List[VesselDetected]) -> None:
+        self.last_index = index
+        if vessels:
+            # Frames are numbered from the start of the segment, so frame / fps is the offset from startTime
+            self.pending[str(index - self.first_index)] = vessels
+            self.detections += len(vessels)
+
+    def _video_info(self) -> Dict:
+        elapsed = time.monotonic() - self.opened_at
+        frame_count = self.last_index - self.first_index + 1
+        info = {"frameCount": frame_count, "endTime": datetime.now()}
+        if elapsed > 0:
+            # Measured against the wall clock, as stream frame rates are often misreported
+            info["fps"] = frame_count / elapsed
+        return info
+
+    def flush(self) -> None:
+        mongo_handler.append_vessels_detected(self.video_id, self.pending, self._video_info())
+        publisher.publish({
+            "videoId": self.video_id,
+            "filename": self.filename,
+            "status": "live",
+            "progress": 0.0,
+            "frame": self.last_index - self.first_index,
+            "timestamp": time.time(),
+        })
+        self.pending = {}
+
+    def close(self) -> None:
+        self.flush()
+        mongo_handler.update_video_status(self.video_id, "done", 100.0)
+        update_video_rollups(self.video_id)
+        LOGGER.info("Closed live segment %s with %d detections", self.filename, self.detections)
+
+
+def run_live(
+    weights: Path,
+    source: str,
+    location: str,
+    max_latency_ms: float = LIVE_MAX_LATENCY_MS,
+    segment_seconds: float = LIVE_SEGMENT_S,
+    realtime: bool = False,
+) -> Dict:
+    """
+    Detect vessels on a stream until it ends.
+
+    Returns:
+        dict: Frame counts, the dropped-frame ratio and the video IDs of the segments.
+    """
+    model = YOLO(weights)
+    class_name_dict = model.names
+    byte_tracker = sv.ByteTrack()
+    location_id = check_and_create_location(location)
+    max_latency = max_latency_ms / 1000.0
+    observe_latency = LIVE_LATENCY_SECONDS.labels(location).observe
+    processed_frames = LIVE_FRAMES.labels(location, "processed")
+    dropped_frames = LIVE_FRAMES.labels(location, "dropped")
+
+    grabber = FrameGrabber(source, realtime).start()
+    segment: Optional[LiveSegment] = None
+    segments: List[str] = []
+    processed = stale = overwritten = 0
+    latencies = deque(maxlen=LIVE_LATENCY_WINDOW)
+    last_flush = time.monotonic()
+    try:
+        while True:
+            frame = grabber.latest()
+            if frame is None:
+                if grabber.ended:
+                    break
+                continue
+            index, captured_at, image = frame
+            dropped_frames.inc(grabber.frames_overwritten - overwritten)
+            overwritten = grabber.frames_overwritten
+            if time.time() - captured_at > max_latency:
+                stale += 1
+                dropped_frames.inc()
+                continue
+
+            if segment is None:
+                segment = LiveSegment(location, location_id, index)
+                segments.append(segment.video_id)
+
+            detections = run_supervision(image, model, byte_tracker)
+            DETECTIONS_PER_FRAME.observe(len(detections))
+            segment.add(index, to_vessels_detected(detections, class_name_dict))
+            processed += 1
+            processed_frames.inc()
+            latency = time.time() - captured_at
+            observe_latency(latency)
+            latencies.append(latency)
+
+            now = time.monotonic()
+            if now - segment.opened_at >= segment_seconds:
+                segment.close()
+                segment = None
+                last_flush = now
+            elif now - last_flush >= LIVE_FLUSH_INTERVAL_S:
+                segment.flush()
+                last_flush = now
+    finally:
+        grabber.stop()
+        if segment is not None:
+            segment.close()
+
+    dropped = grabber.frames_overwritten + stale
+    ordered = sorted(latencies)
+    report = {
+        "framesRead": grabber.frames_read,
+        "framesProcessed": processed,
+        "framesDropped": dropped,
+        "droppedRatio": dropped / grabber.frames_read if grabber.frames_read else 0.0,
+        "latencyP50Ms": ordered[len(ordered) // 2] * 1000.0 if ordered else None,
+        "latencyP95Ms": ordered[int(len(ordered) * 0.95)] * 1000.0 if ordered else None,
+        "latencyMaxMs": ordered[-1] * 1000.0 if ordered else None,
+        "segments": segments,
+    }
+    LOGGER.info("Live stream %s ended: %s", source, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect vessels on a live stream.")
+    parser.add_argument("source", help="RTSP/HTTP URL, named pipe or video file")
+    parser.add_argument("--location", required=True, help="camera location name, without spaces")
+    parser.add_argument("--weights", type=Path, default=None, help="defaults to the selected model")
+    parser.add_argument("--max-latency-ms", type=float, default=LIVE_MAX_LATENCY_MS)
+    parser.add_argument("--segment-seconds", type=float, default=LIVE_SEGMENT_S)
+    parser.add_argument("--realtime", action="store_true", help="replay a file at its frame rate")
+    parser.add_argument("--reconnect", action="store_true", help="reopen the stream when it ends")
+    args = parser.parse_args()
+    if " " in args.location:
+        parser.error("--location must not contain spaces")
+
+    custom_logger("leisair")
+    start_metrics_server(LIVE_METRICS_PORT)
+    weights = args.weights or selected_weights(Path(__file__).resolve().parent.parent)
+    while True:
+        try:
+            print(run_live(weights, args.source, args.location, args.max_latency_ms, args.segment_seconds, args.realtime))
+        except RuntimeError as e:
+            LOGGER.error("Live stream failed: %s", e)
+        if not args.reconnect:
+            break
+        time.sleep(LIVE_RECONNECT_S)
@@ -0,0 +1,153 @@
+# evaluate
+import os
+import shutil
+import tempfile
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.data.loaders import LoadImages
+
+LOGGER = logging.getLogger("leisair")
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv"}
+
+# Holdout layout: images/ + labels/ (YOLO format) for mAP, clips/ for throughput
+HOLDOUT_PATH = os.getenv("HOLDOUT_PATH", os.path.join(os.getenv("DATASET_PATH", "."), "holdout"))
+EVAL_MAX_CLIP_FRAMES = int(os.getenv("EVAL_MAX_CLIP_FRAMES", "300"))
+EVAL_WARMUP_FRAMES = int(os.getenv("EVAL_WARMUP_FRAMES", "3"))
+# Absolute p95 per-frame budget in milliseconds; when unset the candidate is
+# compared against the current model with EVAL_LATENCY_TOLERANCE headroom.
+EVAL_LATENCY_BUDGET_MS = os.getenv("EVAL_LATENCY_BUDGET_MS")
+EVAL_LATENCY_TOLERANCE = float(os.getenv("EVAL_LATENCY_TOLERANCE", "0.10"))
+# Largest allowed drop in mAP50-95 before a candidate is rejected
+EVAL_MAP_TOLERANCE = float(os.getenv("EVAL_MAP_TOLERANCE", "0.0"))
+
+
+def holdout_available(holdout_path: str = HOLDOUT_PATH) -> bool:
+    """
+    Check whether a holdout set with at least one image or clip exists.
+    """
+    root = Path(holdout_path)
+    return any(_list_files(root / "images", IMAGE_SUFFIXES)) or any(_list_files(root / "clips", VIDEO_SUFFIXES))
+
+
+def _list_files(directory: Path, suffixes: set) -> List[Path]:
+    if not directory.is_dir():
+        return []
+    return sorted(path for path in directory.iterdir() if path.suffix.lower() in suffixes)
+
+
+def _holdout_frames(holdout_path: str):
+    """
+    Yield the fixed sequence of frames used for latency measurements: every holdout
+    image followed by up to EVAL_MAX_CLIP_FRAMES frames of each holdout clip.
+    """
+    root = Path(holdout_path)
+    for image_path in _list_files(root / "images", IMAGE_SUFFIXES):
+        yield str(image_path)
+    for clip_path in _list_files(root / "clips", VIDEO_SUFFIXES):
+        dataset = LoadImages(str(clip_path), imgsz=640, vid_stride=1)
+        for idx, (_, img, _, _) in enumerate(dataset):
+            if idx >= EVAL_MAX_CLIP_FRAMES:
+                break
+            yield img
+
+
+def measure_latency(model: YOLO, holdout_path: str) -> Dict:
+    """
+    Run the model on CPU over the holdout frames and measure throughput and latency.
+
+    Returns:
+        dict: frames processed, fps and p50/p95 per-frame latency in milliseconds.
+    """
+    latencies = []
+    for idx, frame in enumerate(_holdout_frames(holdout_path)):
+        start = time.perf_counter()
+        model.predict(frame, device="cpu", verbose=False)
+        elapsed = time.perf_counter() - start
+        if idx >= EVAL_WARMUP_FRAMES:
+            latencies.append(elapsed)
+
+    if not latencies:
+        return {"frames": 0, "fps": None, "p50LatencyMs": None, "p95LatencyMs": None}
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "frames": len(latencies),
+        "fps": float(len(latencies) / sum(latencies)),
+        "p50LatencyMs": float(np.percentile(latencies_ms, 50)),
+        "p95LatencyMs": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def measure_accuracy(model: YOLO, holdout_path: str, class_names: List[str]) -> Dict:
+    """
+    Validate the model on the labelled holdout images and return mAP50 and mAP50-95.
+    """
+    root = Path(holdout_path)
+    if not _list_files(root / "images", IMAGE_SUFFIXES) or not (root / "labels").is_dir():
+        return {"map50": None, "map50_95": None}
+
+    work_dir = tempfile.mkdtemp(prefix="leisair_eval_")
+    try:
+        yaml_file = os.path.join(work_dir, "holdout.yaml")
+        with open(yaml_file, "w") as file:
+            file.write(f"path: {root}\ntrain: {root / 'images'}\nval: {root / 'images'}\nnc: {len(class_names)}\nnames: {class_names}")
+        metrics = model.val(data=yaml_file, device="cpu", project=work_dir, name="val", plots=False, verbose=False)
+        return {"map50": float(metrics.box.map50), "map50_95": float(metrics.box.map)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def evaluate_model(weights: str, class_names: List[str], holdout_path: str = HOLDOUT_PATH) -> Dict:
+    """
+    Benchmark a set of weights on the holdout set.
+
+    Args:
+        weights (str): The path to the model weights.
+        class_names (list): The class names the holdout labels refer to.
+        holdout_path (str, optional): The holdout directory. Defaults to HOLDOUT_PATH.
+
+    Returns:
+        dict: Latency and accuracy metrics, ready to be stored on an mlModels document.
+    """
+    LOGGER.info("Evaluating model %s on holdout set %s", weights, holdout_path)
+    model = YOLO(weights)
+    result = {"weights": str(weights), "device": "cpu"}
+    result.update(measure_latency(model, holdout_path))
+    result.update(measure_accuracy(model, holdout_path, class_names))
+    return result
+
+
+def passes_gate(candidate: Dict, current: Optional[Dict]) -> Tuple[bool, str]:
+    """
+    Decide whether a candidate may be promoted over the current model.
+
+    Returns:
+        tuple: (passed, reason)
+    """
+    candidate_p95 = candidate.get("p95LatencyMs")
+    if EVAL_LATENCY_BUDGET_MS is not None and candidate_p95 is not None:
+        budget = float(EVAL_LATENCY_BUDGET_MS)
+        if candidate_p95 > budget:
+            return False, f"p95 latency {candidate_p95:.1f}ms exceeds budget {budget:.1f}ms"
+
+    if current is None:
+        return True, "no current model to compare against"
+
+    current_p95 = current.get("p95LatencyMs")
+    if EVAL_LATENCY_BUDGET_MS is None and candidate_p95 is not None and current_p95 is not None:
+        budget = current_p95 * (1.0 + EVAL_LATENCY_TOLERANCE)
+        if candidate_p95 > budget:
+            return False, f"p95 latency {candidate_p95:.1f}ms exceeds {budget:.1f}ms (current {current_p95:.1f}ms)"
+
+    candidate_map = candidate.get("map50_95")
+    current_map = current.get("map50_95")
+    if candidate_map is not None and current_map is not None and candidate_map < current_map - EVAL_MAP_TOLERANCE:
+        return False, f"mAP50-95 regressed from {current_map:.4f} to {candidate_map:.4f}"
+
+    return True, "within latency budget and no accuracy regression"
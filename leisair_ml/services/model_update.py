@@ -1,20 +1,23 @@
 # train
-import base64
 from io import BytesIO
+import logging
 import os
 import shutil
-import re
 import torch
 from ultralytics import YOLO
 from datetime import datetime
 from leisair_ml.schemas import BBOX, VesselCorrections
 from PIL import Image
 from leisair_ml.utils.mongo_handler import MongoDBHandler
+from leisair_ml.utils.crop_cache import crop_store
+from leisair_ml.services.model_evaluation import evaluate_model, holdout_available, passes_gate
 
 #weights=r"F:\uni_work\nash\Weights\yolov8x.pt"
 #weights_file = r"F:\uni_work\nash\Weights\yolov8n.pt"
 #data=r"F:\uni_work\nash\Dataset\Final yolo.yaml"
 
+LOGGER = logging.getLogger("leisair")
+
 mongo_handler = MongoDBHandler()
 
 vessel_classes = ['SUP','Kayak Or Canoe','Rowing Boat','Yacht','Sailing Dinghy','Narrow Boat','Uber Boat',' Class V Passenger','RIB','RNLI','Pleasure Boat', 'Small Powered','Workboat','Tug','Tug - Towing', 'Tug - Pushing','Large Shipping','Fire','Police']
@@ -23,7 +26,9 @@ vessel_class_map = {vessel_class: index for index, vessel_class in enumerate(ves
 
 DATASET_PATH = os.getenv("DATASET_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/dataset")
 MODEL_PATH = os.getenv("MODEL_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/model")
-print(DATASET_PATH)
+LOGGER.debug("DATASET_PATH: %s", DATASET_PATH)
+# Shadow a model that passed the holdout gate on production videos instead of promoting it
+SHADOW_BEFORE_PROMOTE = os.getenv("SHADOW_BEFORE_PROMOTE", "false").lower() in ("1", "true", "yes")
 
 def generate_yaml_config(path, train_path, val_path, num_classes, class_names):
     """
@@ -78,12 +83,23 @@ def save_training_image(correction: VesselCorrections):
     """
     Calculate the label for a vessel correction and save it to the training dataset.
     """ 
-    # Load the image from the base64-encoded string
-    print("saving image to dataset", correction.filename)
-    image_data = re.sub('^data:image/.+;base64,', '',correction.image)
-    image_data = base64.b64decode(image_data)
+    LOGGER.info("Saving image to dataset: %s", correction.filename)
+    if correction.image or correction.imageRef:
+        # Load the image from the inline base64 string or the blob store
+        image_data = mongo_handler.read_correction_image(correction)
+        if image_data is None:
+            raise ValueError(f"Image {correction.imageRef.id} is missing from the blob store")
+    elif correction.keyframeId:
+        # Load the keyframe cached at detection time
+        image_data = crop_store.get(correction.keyframeId)
+        if image_data is None:
+            raise ValueError(f"Keyframe {correction.keyframeId} is no longer cached")
+    else:
+        raise ValueError("Vessel correction has no image")
     image = Image.open(BytesIO(image_data))
-    img_width, img_height = image.size
+    # The bbox is in original frame coordinates, which differ from a downscaled keyframe
+    img_width = correction.imageWidth or image.size[0]
+    img_height = correction.imageHeight or image.size[1]
     image_name = f"{correction.filename}_{correction.frame}"
     # Convert the bounding box to YOLOv8 format
     bbox = convert_bbox(correction.bbox.x1, correction.bbox.y1, correction.bbox.x2, correction.bbox.y2, img_width, img_height)
@@ -104,8 +120,12 @@ def save_training_image(correction: VesselCorrections):
     return label
 
 def compile_training_data():
-    vessel_corrections = mongo_handler.get_all_vessel_corrections()
-    [save_training_image(correction) for correction in vessel_corrections if correction.used == False or correction.used == None]
+    vessel_corrections = mongo_handler.get_all_vessel_corrections(unused_only=True)
+    for correction in vessel_corrections:
+        try:
+            save_training_image(correction)
+        except ValueError as e:
+            LOGGER.warning("Skipping correction %s: %s", correction.id, e)
 
 
 def run_training(weights, data, epochs=100, save_dir=None, weights_name=None):
@@ -156,9 +176,58 @@ def update():
     save_weights_dir = f"{MODEL_PATH}"
     try:
         final_weights_path = run_training(f"{MODEL_PATH}/best.pt", yaml_file, epochs=100, save_dir=save_weights_dir, weights_name=str(training_start))
-        mongo_handler.upsert_model(model_id, final_weights_path, "trained")
-        print("Training complete")
+        mongo_handler.upsert_model(model_id, final_weights_path, "evaluating", selected=False)
+        LOGGER.info("Training complete")
     except Exception as e:
-        print(f"Error training model: {e}")
+        LOGGER.error("Error training model: %s", e)
         mongo_handler.update_model_status(model_id, "failed")
-        print("Training failed")
\ No newline at end of file
+        LOGGER.error("Training failed")
+        return
+
+    if gate_model(model_id, final_weights_path):
+        if SHADOW_BEFORE_PROMOTE:
+            mongo_handler.update_model_status(model_id, "shadow")
+            mongo_handler.set_shadow_model(model_id)
+            LOGGER.info("Model %s is shadowing the selected model", model_id)
+        else:
+            mongo_handler.promote_model(model_id)
+            LOGGER.info("Model %s promoted", model_id)
+    else:
+        mongo_handler.update_model_status(model_id, "rejected")
+        LOGGER.info("Model %s rejected", model_id)
+
+def gate_model(model_id, weights_path):
+    """
+    Benchmark a newly trained model and the current model on the holdout set and decide
+    whether the new model may be promoted.
+
+    Args:
+        model_id (str): The mlModels id of the candidate.
+        weights_path (str): The path to the candidate weights.
+
+    Returns:
+        bool: True if the candidate stays within the latency budget and does not regress accuracy.
+    """
+    if not holdout_available():
+        LOGGER.warning("No holdout set found, skipping evaluation")
+        mongo_handler.update_model_evaluation(model_id, {"skipped": True, "reason": "no holdout set"})
+        return True
+
+    selected_model = mongo_handler.get_selected_model()
+    current_weights = selected_model["path"] if selected_model else f"{MODEL_PATH}/best.pt"
+
+    try:
+        candidate = evaluate_model(weights_path, vessel_classes)
+        current = evaluate_model(current_weights, vessel_classes) if os.path.exists(current_weights) else None
+    except Exception as e:
+        LOGGER.error("Error evaluating model: %s", e)
+        mongo_handler.update_model_evaluation(model_id, {"error": str(e)})
+        return False
+
+    passed, reason = passes_gate(candidate, current)
+    LOGGER.info("Evaluation gate %s: %s", "passed" if passed else "failed", reason)
+    candidate.update({"baseline": current, "passed": passed, "reason": reason, "evaluatedAt": datetime.now()})
+    mongo_handler.update_model_evaluation(model_id, candidate)
+    if selected_model and current:
+        mongo_handler.update_model_evaluation(selected_model["_id"], current)
+    return passed
\ No newline at end of file
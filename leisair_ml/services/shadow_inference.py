@@ -0,0 +1,261 @@
+"""
+Shadow inference of a candidate model on a sample of the frames of production videos.
+
+While a video is processed, a ShadowSampler keeps about SHADOW_SAMPLE_RATE of the
+decoded frames, at most SHADOW_MAX_FRAMES per video, as JPEGs in the shadow frame
+store, and queues a low-priority shadow task for them once the video is done. The
+task never decodes the video again. It runs the primary and the candidate model on
+each sampled frame and compares their raw detections, so both models see the same
+pixels, neither is filtered by the tracker, and both are timed in the same process.
+
+Each video's comparison is stored in shadowEvaluations and summed into the
+shadowStats of the candidate's mlModels document:
+
+- agreement: boxes both models found with the same class, as 2 * agreed / (primary + candidate)
+- the seconds each model spent per frame, from which the fps follow
+- the class confusion of boxes matched at SHADOW_IOU, with "none" for boxes only one model found
+"""
+
+import functools
+import logging
+import os
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+from ultralytics import YOLO
+from leisair_ml.celery_client import enqueue_shadow_inference
+from leisair_ml.utils.content_store import ContentStore
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.02"))
+SHADOW_MAX_FRAMES = int(os.getenv("SHADOW_MAX_FRAMES", "200"))
+SHADOW_IOU = float(os.getenv("SHADOW_IOU", "0.5"))
+SHADOW_JPEG_QUALITY = int(os.getenv("SHADOW_JPEG_QUALITY", "95"))
+SHADOW_FRAMES_PATH = os.getenv(
+    "SHADOW_FRAMES_PATH",
+    os.path.join(os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos"), ".shadow"),
+)
+SHADOW_FRAMES_MAX_BYTES = int(os.getenv("SHADOW_FRAMES_MAX_BYTES", str(1024 ** 3)))
+# Frames at the start of a task that are not timed, while the models warm up
+SHADOW_WARMUP_FRAMES = 1
+
+NO_DETECTION = "none"
+
+shadow_store = ContentStore(SHADOW_FRAMES_PATH, SHADOW_FRAMES_MAX_BYTES, suffix=".jpg")
+
+# Boxes (N x 4, xyxy) and their class names
+Detections = Tuple[np.ndarray, List[str]]
+
+
+class ShadowSampler:
+    """
+    Keeps a random sample of the decoded frames of a video for the shadow candidate.
+
+    Args:
+        video_id (str): The cameraVideo being processed; it also seeds the sample.
+        model_id (str): The mlModels ID of the candidate.
+        primary_weights (str): The weights of the model processing the video.
+        rate (float): The fraction of frames to keep.
+    """
+
+    def __init__(self, video_id: str, model_id: str, primary_weights: str, rate: float):
+        self.video_id = video_id
+        self.model_id = model_id
+        self.primary_weights = primary_weights
+        self.rate = rate
+        self.frames: List[Tuple[int, str]] = []
+        self._random = random.Random(video_id)
+
+    @classmethod
+    def for_video(cls, video_id: str, primary_weights: Path, expected_frames: int) -> Optional["ShadowSampler"]:
+        """
+        A sampler for a video, or None when there is no shadow candidate.
+        """
+        if SHADOW_SAMPLE_RATE <= 0 or SHADOW_MAX_FRAMES <= 0:
+            return None
+        candidate = mongo_handler.get_shadow_model()
+        if candidate is None or Path(candidate["path"]) == Path(primary_weights):
+            return None
+        # Spread the sample over the whole video rather than stopping at SHADOW_MAX_FRAMES
+        rate = min(SHADOW_SAMPLE_RATE, SHADOW_MAX_FRAMES / expected_frames) if expected_frames else SHADOW_SAMPLE_RATE
+        return cls(video_id, candidate["_id"], str(primary_weights), rate)
+
+    def observe(self, idx: int, frame) -> None:
+        if len(self.frames) >= SHADOW_MAX_FRAMES or self._random.random() >= self.rate:
+            return
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, SHADOW_JPEG_QUALITY])
+        if ok:
+            self.frames.append((idx, shadow_store.put(buffer.tobytes())))
+
+    def submit(self) -> None:
+        if self.frames:
+            enqueue_shadow_inference(self.video_id, self.model_id, self.primary_weights, self.frames)
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    The IoU of every pair of xyxy boxes, as an len(boxes_a) x len(boxes_b) matrix.
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def compare_frame(primary: Detections, candidate: Detections, iou_threshold: float = SHADOW_IOU) -> Tuple[float, Counter]:
+    """
+    Match the boxes of two models on one frame, greedily by IoU regardless of class.
+
+    Returns:
+        tuple: The agreement of the frame, 1.0 when neither model found anything, and
+            the (primary class, candidate class) counts.
+    """
+    primary_boxes, primary_classes = primary
+    candidate_boxes, candidate_classes = candidate
+    confusion = Counter()
+    matched_primary, matched_candidate = set(), set()
+    if len(primary_classes) and len(candidate_classes):
+        iou = box_iou(primary_boxes, candidate_boxes)
+        for flat_index in np.argsort(-iou, axis=None):
+            i, j = divmod(int(flat_index), iou.shape[1])
+            if iou[i, j] < iou_threshold:
+                break
+            if i in matched_primary or j in matched_candidate:
+                continue
+            matched_primary.add(i)
+            matched_candidate.add(j)
+            confusion[(primary_classes[i], candidate_classes[j])] += 1
+    for i, class_name in enumerate(primary_classes):
+        if i not in matched_primary:
+            confusion[(class_name, NO_DETECTION)] += 1
+    for j, class_name in enumerate(candidate_classes):
+        if j not in matched_candidate:
+            confusion[(NO_DETECTION, class_name)] += 1
+
+    total = len(primary_classes) + len(candidate_classes)
+    if not total:
+        return 1.0, confusion
+    agreed = sum(count for (primary_class, candidate_class), count in confusion.items()
+                 if primary_class == candidate_class)
+    return 2.0 * agreed / total, confusion
+
+
+@functools.lru_cache(maxsize=2)
+def _load_model(weights: str) -> YOLO:
+    return YOLO(weights)
+
+
+def _detect(model: YOLO, image) -> Tuple[Detections, float]:
+    started = time.perf_counter()
+    result = model(image, verbose=False)[0]
+    elapsed = time.perf_counter() - started
+    boxes = result.boxes.xyxy.cpu().numpy()
+    classes = [result.names[int(class_id)] for class_id in result.boxes.cls.tolist()]
+    return (boxes, classes), elapsed
+
+
+def _stats_key(class_name: str) -> str:
+    # Field names cannot contain dots
+    return class_name.replace(".", "_")
+
+
+def run_shadow(video_id: str, model_id: str, primary_weights: str, frames: List[Tuple[int, str]]) -> Optional[Dict]:
+    """
+    Compare the candidate with the primary model on the sampled frames of a video.
+
+    Args:
+        video_id (str): The cameraVideo the frames were sampled from.
+        model_id (str): The mlModels ID of the candidate.
+        primary_weights (str): The weights that processed the video.
+        frames (list): (frame index, shadow store ID) pairs.
+
+    Returns:
+        dict: The summary of the comparison, or None if the candidate no longer exists.
+    """
+    candidate_model = mongo_handler.read_model(model_id)
+    if candidate_model is None:
+        LOGGER.warning("Shadow candidate %s no longer exists", model_id)
+        return None
+    primary = _load_model(primary_weights)
+    candidate = _load_model(candidate_model["path"])
+
+    per_frame = []
+    confusion = Counter()
+    seconds = {"primary": 0.0, "candidate": 0.0}
+    detections = {"primary": 0, "candidate": 0}
+    timed = 0
+    for idx, content_id in frames:
+        data = shadow_store.get(content_id)
+        if data is None:
+            # Evicted from the store before the task ran
+            continue
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        primary_detections, primary_seconds = _detect(primary, image)
+        candidate_detections, candidate_seconds = _detect(candidate, image)
+        if len(per_frame) >= SHADOW_WARMUP_FRAMES:
+            seconds["primary"] += primary_seconds
+            seconds["candidate"] += candidate_seconds
+            timed += 1
+        agreement, frame_confusion = compare_frame(primary_detections, candidate_detections)
+        confusion.update(frame_confusion)
+        detections["primary"] += len(primary_detections[1])
+        detections["candidate"] += len(candidate_detections[1])
+        per_frame.append({
+            "frame": idx,
+            "agreement": agreement,
+            "primary": len(primary_detections[1]),
+            "candidate": len(candidate_detections[1]),
+        })
+    if not per_frame:
+        LOGGER.warning("No shadow frames left for video %s", video_id)
+        return None
+
+    summary = {
+        "frames": len(per_frame),
+        "meanAgreement": sum(frame["agreement"] for frame in per_frame) / len(per_frame),
+        "primaryFps": timed / seconds["primary"] if seconds["primary"] else None,
+        "candidateFps": timed / seconds["candidate"] if seconds["candidate"] else None,
+        "primaryDetections": detections["primary"],
+        "candidateDetections": detections["candidate"],
+    }
+    increments = {
+        "videos": 1,
+        "frames": len(per_frame),
+        "agreedFrames": sum(1 for frame in per_frame if frame["agreement"] == 1.0),
+        "agreementSum": sum(frame["agreement"] for frame in per_frame),
+        "timedFrames": timed,
+        "primarySeconds": seconds["primary"],
+        "candidateSeconds": seconds["candidate"],
+        "primaryDetections": detections["primary"],
+        "candidateDetections": detections["candidate"],
+    }
+    for (primary_class, candidate_class), count in confusion.items():
+        increments[f"confusion.{_stats_key(primary_class)}.{_stats_key(candidate_class)}"] = count
+    evaluation = {
+        "videoId": video_id,
+        "primaryWeights": primary_weights,
+        "candidateWeights": candidate_model["path"],
+        "summary": summary,
+        "frames": per_frame,
+        "confusion": [
+            {"primary": primary_class, "candidate": candidate_class, "count": count}
+            for (primary_class, candidate_class), count in confusion.most_common()
+        ],
+    }
+    mongo_handler.record_shadow_evaluation(model_id, evaluation, increments)
+    LOGGER.info("Shadow evaluation of %s on video %s: %s", model_id, video_id, summary)
+    return summary
@@ -0,0 +1,315 @@
+"""
+Storage lifecycle of source videos and training runs.
+
+A sweep applies, in order:
+- retention: source videos whose videoStatus has been "done" for RETENTION_DONE_DAYS are
+  deleted, or re-encoded with ffmpeg when RETENTION_ACTION is "compress";
+- training runs in TRAINING_RESULTS_PATH older than TRAINING_RESULTS_RETENTION_DAYS are deleted;
+- high-water mark: while the disk holding VIDEOS_PATH is fuller than STORAGE_HIGH_WATER_PERCENT,
+  the oldest done videos are deleted until it is below STORAGE_LOW_WATER_PERCENT.
+
+In-flight files are never touched: partial uploads, videos with a non-terminal status,
+and videos modified within STORAGE_IN_FLIGHT_GRACE_S. Retention and the high-water mark
+only consider videos with a done status. DATASET_PATH holds the training set built from
+corrections and is reported but never pruned.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from leisair_ml.utils.metrics import STORAGE_FILES, STORAGE_RECLAIMED_BYTES
+from leisair_ml.utils.mongo_handler import TERMINAL_VIDEO_STATUSES, MongoDBHandler
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+VIDEOS_PATH = os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos")
+DATASET_PATH = os.getenv("DATASET_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/dataset")
+TRAINING_RESULTS_PATH = os.getenv("TRAINING_RESULTS_PATH", "TrainingResults")
+
+# Days after a video is done before its source file is deleted or compressed; 0 disables
+RETENTION_DONE_DAYS = float(os.getenv("RETENTION_DONE_DAYS", "30"))
+RETENTION_ACTION = os.getenv("RETENTION_ACTION", "delete")
+TRAINING_RESULTS_RETENTION_DAYS = float(os.getenv("TRAINING_RESULTS_RETENTION_DAYS", "14"))
+STORAGE_HIGH_WATER_PERCENT = float(os.getenv("STORAGE_HIGH_WATER_PERCENT", "90"))
+STORAGE_LOW_WATER_PERCENT = float(os.getenv("STORAGE_LOW_WATER_PERCENT", "80"))
+STORAGE_IN_FLIGHT_GRACE_S = float(os.getenv("STORAGE_IN_FLIGHT_GRACE_S", "600"))
+# Videos with no status at all are treated as queued until they are this old
+STORAGE_UNTRACKED_GRACE_S = float(os.getenv("STORAGE_UNTRACKED_GRACE_S", "86400"))
+STORAGE_SWEEP_INTERVAL_S = float(os.getenv("STORAGE_SWEEP_INTERVAL_S", "3600"))
+COMPRESS_CRF = os.getenv("COMPRESS_CRF", "32")
+
+VIDEO_SUFFIX = ".mp4"
+PART_SUFFIX = ".part"
+
+
+class VideoFile:
+    """
+    A source video in VIDEOS_PATH with the state of its processing.
+    """
+
+    __slots__ = ("path", "size", "mtime", "statuses")
+
+    def __init__(self, path: str, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.statuses: List[Dict] = []
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)[: -len(VIDEO_SUFFIX)]
+
+    @property
+    def done_at(self) -> Optional[datetime.datetime]:
+        """
+        When the video was last done, or None unless every status is terminal and one is done.
+        """
+        if not self.statuses or any(status.get("status") not in TERMINAL_VIDEO_STATUSES for status in self.statuses):
+            return None
+        done = [status.get("updatedAt") or status.get("createdAt") for status in self.statuses if status.get("status") == "done"]
+        return max(done) if done else None
+
+    @property
+    def retention(self) -> Optional[str]:
+        return next((status["retention"] for status in self.statuses if status.get("retention")), None)
+
+    def in_flight(self, now: float) -> bool:
+        if now - self.mtime < STORAGE_IN_FLIGHT_GRACE_S:
+            return True
+        if not self.statuses:
+            return now - self.mtime < STORAGE_UNTRACKED_GRACE_S
+        return any(status.get("status") not in TERMINAL_VIDEO_STATUSES for status in self.statuses)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def disk_used_percent(path: str) -> float:
+    usage = shutil.disk_usage(path)
+    return usage.used / usage.total * 100.0
+
+
+class StorageLifecycleManager:
+    """
+    Applies the retention and high-water policies to VIDEOS_PATH and TRAINING_RESULTS_PATH.
+
+    Args:
+        videos_path (str, optional): The directory of source videos.
+        dry_run (bool, optional): Report what would be reclaimed without changing anything.
+    """
+
+    def __init__(self, videos_path: str = VIDEOS_PATH, dry_run: bool = False):
+        self.videos_path = videos_path
+        self.dry_run = dry_run
+        self._lock = threading.Lock()
+
+    def list_videos(self) -> List[VideoFile]:
+        """
+        List the source videos with their statuses. Partial uploads are not listed.
+        """
+        videos = []
+        with os.scandir(self.videos_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(VIDEO_SUFFIX):
+                    continue
+                stat = entry.stat()
+                videos.append(VideoFile(entry.path, stat.st_size, stat.st_mtime))
+        by_filename = {video.filename: video for video in videos}
+        for start in range(0, len(videos), 500):
+            filenames = [video.filename for video in videos[start:start + 500]]
+            for status in mongo_handler.find_video_statuses_by_filename(filenames):
+                by_filename[status["filename"]].statuses.append(status)
+        return videos
+
+    def sweep(self) -> Dict:
+        """
+        Apply all policies once.
+
+        Returns:
+            dict: What was deleted, compressed and skipped, and the bytes reclaimed.
+        """
+        with self._lock:
+            report = {"deleted": 0, "compressed": 0, "skippedInFlight": 0, "bytesReclaimed": 0, "dryRun": self.dry_run}
+            now = time.time()
+            videos = self.list_videos()
+            done = []
+            for video in videos:
+                if video.in_flight(now):
+                    report["skippedInFlight"] += 1
+                elif video.done_at is not None:
+                    done.append(video)
+            done.sort(key=lambda video: video.done_at)
+
+            remaining = self._apply_retention(done, report)
+            self._prune_training_results(now, report)
+            self._apply_high_water(remaining, report)
+
+            report["diskUsedPercent"] = disk_used_percent(self.videos_path)
+            report["datasetBytes"] = directory_size(DATASET_PATH) if os.path.isdir(DATASET_PATH) else 0
+            LOGGER.info(
+                "Storage sweep reclaimed %d bytes: %d deleted, %d compressed, %d in flight skipped",
+                report["bytesReclaimed"], report["deleted"], report["compressed"], report["skippedInFlight"],
+            )
+            return report
+
+    def delete_videos(self) -> Dict:
+        """
+        Delete every source video that is not in flight, e.g. for /deleteAll.
+        """
+        with self._lock:
+            report = {"deleted": 0, "skippedInFlight": 0, "bytesReclaimed": 0, "dryRun": self.dry_run}
+            now = time.time()
+            for video in self.list_videos():
+                if video.in_flight(now):
+                    report["skippedInFlight"] += 1
+                else:
+                    self._delete(video, report)
+            return report
+
+    def _apply_retention(self, done: List[VideoFile], report: Dict) -> List[VideoFile]:
+        if RETENTION_DONE_DAYS <= 0:
+            return done
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=RETENTION_DONE_DAYS)
+        remaining = []
+        for video in done:
+            if video.done_at >= cutoff:
+                remaining.append(video)
+            elif RETENTION_ACTION == "compress":
+                if video.retention != "compressed":
+                    self._compress(video, report)
+                remaining.append(video)
+            else:
+                self._delete(video, report)
+        return remaining
+
+    def _apply_high_water(self, done: List[VideoFile], report: Dict) -> None:
+        usage = shutil.disk_usage(self.videos_path)
+        used = usage.used
+        if used / usage.total * 100.0 <= STORAGE_HIGH_WATER_PERCENT:
+            return
+        target = usage.total * STORAGE_LOW_WATER_PERCENT / 100.0
+        LOGGER.warning("Disk above the %.0f%% high-water mark, deleting the oldest done videos", STORAGE_HIGH_WATER_PERCENT)
+        for video in done:
+            if used <= target:
+                break
+            if os.path.exists(video.path):
+                used -= self._delete(video, report)
+        if used > target:
+            LOGGER.warning("Disk still above the %.0f%% low-water mark after deleting done videos", STORAGE_LOW_WATER_PERCENT)
+
+    def _prune_training_results(self, now: float, report: Dict) -> None:
+        if TRAINING_RESULTS_RETENTION_DAYS <= 0 or not os.path.isdir(TRAINING_RESULTS_PATH):
+            return
+        cutoff = now - TRAINING_RESULTS_RETENTION_DAYS * 86400
+        with os.scandir(TRAINING_RESULTS_PATH) as entries:
+            runs = [entry.path for entry in entries if entry.is_dir() and entry.stat().st_mtime < cutoff]
+        for run_path in runs:
+            size = directory_size(run_path)
+            if not self.dry_run:
+                shutil.rmtree(run_path, ignore_errors=True)
+            self._reclaimed("training_run", size, report)
+            LOGGER.info("Deleted training run %s (%d bytes)", run_path, size)
+
+    def _delete(self, video: VideoFile, report: Dict) -> int:
+        # Stat again, the file may have been compressed since it was listed
+        try:
+            size = os.path.getsize(video.path)
+        except FileNotFoundError:
+            return 0
+        if not self.dry_run:
+            try:
+                os.remove(video.path)
+            except FileNotFoundError:
+                return 0
+            mongo_handler.mark_video_retention(video.filename, "deleted", size)
+        report["deleted"] += 1
+        self._reclaimed("delete", size, report)
+        LOGGER.info("Deleted source video %s (%d bytes)", video.path, size)
+        return size
+
+    def _compress(self, video: VideoFile, report: Dict) -> int:
+        if shutil.which("ffmpeg") is None:
+            LOGGER.error("RETENTION_ACTION is compress but ffmpeg is not installed")
+            return 0
+        if self.dry_run:
+            return 0
+        # Not an .mp4 name until it is complete, so the file watcher never picks it up
+        part_path = video.path + PART_SUFFIX
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error", "-i", video.path,
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", COMPRESS_CRF, "-an", "-f", "mp4", part_path,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            LOGGER.error("Could not compress %s: %s", video.path, result.stderr.strip())
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return 0
+        reclaimed = video.size - os.path.getsize(part_path)
+        if reclaimed <= 0:
+            os.remove(part_path)
+            reclaimed = 0
+        else:
+            os.replace(part_path, video.path)
+            video.size -= reclaimed
+        mongo_handler.mark_video_retention(video.filename, "compressed", reclaimed)
+        report["compressed"] += 1
+        self._reclaimed("compress", reclaimed, report)
+        LOGGER.info("Compressed source video %s, reclaimed %d bytes", video.path, reclaimed)
+        return reclaimed
+
+    def _reclaimed(self, action: str, size: int, report: Dict) -> None:
+        report["bytesReclaimed"] += size
+        if not self.dry_run:
+            STORAGE_RECLAIMED_BYTES.labels(action).inc(size)
+            STORAGE_FILES.labels(action).inc()
+
+
+storage_manager = StorageLifecycleManager()
+
+
+def start_storage_lifecycle(interval: float = STORAGE_SWEEP_INTERVAL_S) -> Optional[threading.Thread]:
+    """
+    Run a sweep every interval seconds on a daemon thread; 0 disables it.
+    """
+    if interval <= 0:
+        return None
+
+    def sweep_forever():
+        while True:
+            try:
+                storage_manager.sweep()
+            except Exception as e:
+                LOGGER.error("Storage sweep failed: %s", e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=sweep_forever, name="storage-lifecycle", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the storage lifecycle policies once.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be reclaimed without changing anything")
+    args = parser.parse_args()
+    report = StorageLifecycleManager(dry_run=args.dry_run).sweep()
+    print(report)
@@ -0,0 +1,94 @@
+"""
+Collects the best-confidence crop and keyframe of every track during detection.
+"""
+
+from typing import Dict, List
+import cv2
+from leisair_ml.utils.content_store import ContentStore
+from leisair_ml.utils.crop_cache import CROP_JPEG_QUALITY, CROP_MAX_SIZE, CROP_PADDING, KEYFRAME_MAX_SIZE, crop_store
+
+
+def _downscale(image, max_size: int):
+    height, width = image.shape[:2]
+    scale = max_size / max(height, width)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def _encode_jpeg(image) -> bytes:
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, CROP_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return buffer.tobytes()
+
+
+class TrackCropCollector:
+    """
+    Keeps the best-confidence crop and a downscaled keyframe of every track while the video
+    is decoded. Images are JPEG-encoded as soon as a track improves, so only small
+    encoded buffers are held until the video is finished.
+    """
+
+    def __init__(self):
+        self._best: Dict[str, dict] = {}
+
+    def observe(self, frame_idx: int, frame, detections: List[dict], scale_x: float = 1.0, scale_y: float = 1.0) -> None:
+        """
+        Update the best crop of each track detected in a BGR frame.
+
+        Args:
+            scale_x, scale_y (float, optional): The width and height of the frame relative to the
+                source video, when it was decoded downscaled. Detections are in source coordinates.
+        """
+        keyframe = None
+        scaled_height, scaled_width = frame.shape[:2]
+        frame_width, frame_height = round(scaled_width / scale_x), round(scaled_height / scale_y)
+        for detection in detections:
+            vessel_id = str(detection["tracker_id"])
+            confidence = float(detection["confidence"])
+            best = self._best.get(vessel_id)
+            if best is not None and best["confidence"] >= confidence:
+                continue
+
+            bbox = detection["bbox"]
+            pad_x = (bbox["x2"] - bbox["x1"]) * CROP_PADDING
+            pad_y = (bbox["y2"] - bbox["y1"]) * CROP_PADDING
+            x1, y1 = max(0, int((bbox["x1"] - pad_x) * scale_x)), max(0, int((bbox["y1"] - pad_y) * scale_y))
+            x2 = min(scaled_width, int((bbox["x2"] + pad_x) * scale_x))
+            y2 = min(scaled_height, int((bbox["y2"] + pad_y) * scale_y))
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            if keyframe is None:
+                keyframe = _encode_jpeg(_downscale(frame, KEYFRAME_MAX_SIZE))
+            self._best[vessel_id] = {
+                "confidence": confidence,
+                "frame": frame_idx,
+                "bbox": bbox,
+                "frameWidth": frame_width,
+                "frameHeight": frame_height,
+                "crop": _encode_jpeg(_downscale(frame[y1:y2, x1:x2], CROP_MAX_SIZE)),
+                "keyframe": keyframe,
+            }
+
+    def save(self, store: ContentStore = crop_store) -> Dict[str, dict]:
+        """
+        Write the collected images to the store.
+
+        Returns:
+            dict: Per track, the crop and keyframe ids with the frame they were taken from.
+        """
+        track_crops = {}
+        for vessel_id, best in self._best.items():
+            track_crops[vessel_id] = {
+                "cropId": store.put(best["crop"]),
+                "keyframeId": store.put(best["keyframe"]),
+                "frame": best["frame"],
+                "confidence": best["confidence"],
+                "bbox": best["bbox"],
+                "frameWidth": best["frameWidth"],
+                "frameHeight": best["frameHeight"],
+            }
+        self._best.clear()
+        return track_crops
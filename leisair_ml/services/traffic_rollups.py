@@ -0,0 +1,122 @@
+"""
+Materialized vessel-traffic rollups: unique vessel tracks per location, time bucket and vessel type.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+GRANULARITIES = ("hour", "day")
+
+ROLLUP_VIDEO_PROJECTION = {
+    "locationId": 1,
+    "startTime": 1,
+    "fps": 1,
+    "vesselsDetected": 1,
+}
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """
+    Truncate a timestamp to the start of its hour or day bucket.
+    """
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def compute_video_rollups(video: Dict) -> Dict[Tuple[str, datetime, str], int]:
+    """
+    Count the unique tracks of a video per (granularity, bucket start, vessel type).
+
+    A track is counted once, in the bucket of the frame where it first appears, with the
+    vessel type it was most often classified as.
+    """
+    first_frames: Dict[str, int] = {}
+    track_types: Dict[str, Counter] = defaultdict(Counter)
+    for frame_key, detections in (video.get("vesselsDetected") or {}).items():
+        frame = int(frame_key)
+        for detection in detections:
+            vessel_id = detection["vesselId"]
+            if vessel_id not in first_frames or frame < first_frames[vessel_id]:
+                first_frames[vessel_id] = frame
+            track_types[vessel_id][detection["type"]] += 1
+
+    fps = video.get("fps")
+    counts: Dict[Tuple[str, datetime, str], int] = Counter()
+    for vessel_id, first_frame in first_frames.items():
+        vessel_type = track_types[vessel_id].most_common(1)[0][0]
+        seen_at = video["startTime"]
+        if fps:
+            seen_at += timedelta(seconds=first_frame / fps)
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(seen_at, granularity), vessel_type)] += 1
+    return counts
+
+
+def update_video_rollups(video_id: str) -> bool:
+    """
+    Add a finished video's tracks to the rollups. Each video is only counted once.
+
+    Returns:
+        bool: True if the rollups were updated.
+    """
+    if not mongo_handler.mark_video_rolled_up(video_id):
+        LOGGER.info("Rollups already applied for video %s", video_id)
+        return False
+    try:
+        video = mongo_handler.read_camera_video_fields(video_id, ROLLUP_VIDEO_PROJECTION)
+        if video is None:
+            return False
+        counts = compute_video_rollups(video)
+        mongo_handler.apply_traffic_rollups(video["locationId"], counts)
+        LOGGER.info("Updated %d traffic rollups for video %s", len(counts), video_id)
+        return True
+    except Exception:
+        mongo_handler.mark_video_rolled_up(video_id, applied=False)
+        raise
+
+
+def rebuild_rollups() -> int:
+    """
+    Drop all rollups and rebuild them from the finished camera videos. Videos still
+    processing, or live segments still recording, are left unflagged so that
+    update_video_rollups counts them when they finish.
+
+    Returns:
+        int: The number of videos processed.
+    """
+    mongo_handler.clear_traffic_rollups()
+    statuses = mongo_handler.read_video_statuses()
+    processed = 0
+    for video in mongo_handler.iter_camera_videos({**ROLLUP_VIDEO_PROJECTION, "processingVersion": 1}):
+        status = statuses.get(str(video["_id"]))
+        # Videos from before status tracking only count once their detections were written
+        finished = status == "done" if status is not None else "processingVersion" in video
+        # A worker finishing the video may have counted it since the flags were reset
+        if not finished or not mongo_handler.mark_video_rolled_up(str(video["_id"])):
+            continue
+        try:
+            counts = compute_video_rollups(video)
+            mongo_handler.apply_traffic_rollups(video["locationId"], counts)
+        except Exception:
+            mongo_handler.mark_video_rolled_up(str(video["_id"]), applied=False)
+            raise
+        processed += 1
+        if processed % 100 == 0:
+            LOGGER.info("Rebuilt rollups for %d videos", processed)
+    return processed
+
+
+def main():
+    processed = rebuild_rollups()
+    LOGGER.info("Rebuilt traffic rollups from %d videos", processed)
+    print(f"Rebuilt traffic rollups from {processed} videos")
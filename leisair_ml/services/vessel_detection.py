@@ -1,15 +1,23 @@
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from datetime import datetime
+from typing import List, Optional
 import logging
+import os
+import threading
+import time
 import supervision as sv
 from supervision import ByteTrack
-from ultralytics.data.loaders import LoadImages
 from ultralytics import YOLO
 
-from leisair_ml.utils.logger import custom_logger
+from leisair_ml.utils.logger import PER_FRAME
+from leisair_ml.utils.metrics import DETECTIONS_PER_FRAME, VIDEO_FPS, observe_stage, stage_timer, timed_iter
 from leisair_ml.utils.mongo_handler import MongoDBHandler
+from leisair_ml.utils.progress import ProgressReporter
+from leisair_ml.utils.crop_cache import KEYFRAME_MAX_SIZE, SAVE_CROPS
+from leisair_ml.services.track_crops import TrackCropCollector
+from leisair_ml.services.shadow_inference import ShadowSampler
+from leisair_ml.services.video_decoder import VIDEO_DECODE_MAX_SIZE, VIDEO_FRAME_STRIDE, open_decoder
 from leisair_ml.schemas import CameraLocation, CameraVideo, VesselDetected
 # Initialize logger
 LOGGER = logging.getLogger("leisair")
@@ -31,37 +39,105 @@ def check_and_create_location(filename: str) -> str:
         LOGGER.info("LOCATION ID: %s", location_id)
         return str(location_id)
 
-def create_camera_video_entry(filename: str, location_id: str):
+def parse_start_time(filename: str) -> datetime:
     datetime_format = "%Y-%m-%d_%H_%M_%S_%f"
-    time = datetime.strptime(filename.split(" ")[1], datetime_format)
-    LOGGER.info(f"TIME: {time}, LOCATION ID:{location_id}, FILENAME:{filename}")
+    return datetime.strptime(filename.split(" ")[1], datetime_format)
+
+def create_camera_video_entry(filename: str, location_id: str):
+    time = parse_start_time(filename)
+    LOGGER.info("TIME: %s, LOCATION ID: %s, FILENAME: %s", time, location_id, filename)
     try:
         new_video = CameraVideo(_id=None, locationId=location_id, filename=filename, startTime=time, endTime=None, vesselsDetected={})
         video_id = mongo_handler.create_camera_video(new_video)
         mongo_handler.create_video_status(video_id, filename, "processing", 0.0)
         return video_id
     except ValueError as e:
-        LOGGER.error(f"Error creating CameraVideo: {e}")
-        print(f"Error details: {e}")
+        LOGGER.error("Error creating CameraVideo: %s", e)
         return None
 
-def run_supervision(video_frame, model, byte_tracker:ByteTrack):
+class RunCancelled(Exception):
+    """
+    Raised when a run is asked to stop before the end of the video.
+    """
+
+
+def run_supervision(video_frame, model, byte_tracker:ByteTrack, scale_x: float = 1.0, scale_y: float = 1.0):
+    """
+    Detect and track vessels in a frame. With a frame decoded at a fraction `scale_x` of the
+    source width and `scale_y` of its height, boxes are mapped back to source coordinates.
+    """
     results = model(video_frame)[0]
+    # ultralytics already times its own stages, in milliseconds
+    for stage, milliseconds in results.speed.items():
+        if milliseconds is not None:
+            observe_stage(stage, milliseconds / 1000.0)
     results.obb = None
-    detections = sv.Detections.from_ultralytics(results)
-    detections = byte_tracker.update_with_detections(detections)
+    with stage_timer("tracking"):
+        detections = sv.Detections.from_ultralytics(results)
+        detections = byte_tracker.update_with_detections(detections)
     bboxes_this_frame = [
         {
             "tracker_id": tracker_id,
             "class_id": class_id,
             "confidence": confidence,
-            "bbox": {"x1": float(xyxy[0]), "y1": float(xyxy[1]), "x2": float(xyxy[2]), "y2": float(xyxy[3])}
+            "bbox": {
+                "x1": float(xyxy[0]) / scale_x, "y1": float(xyxy[1]) / scale_y,
+                "x2": float(xyxy[2]) / scale_x, "y2": float(xyxy[3]) / scale_y,
+            }
         }
         for xyxy, _, confidence, class_id, tracker_id, _ in detections
     ]
     return bboxes_this_frame
 
-def run(weights: Path, source: Path):
+def to_vessels_detected(detections: List[dict], class_name_dict: dict) -> List[VesselDetected]:
+    vessels_detected = []
+    for detection in detections:
+        vessel_detected = VesselDetected(
+            vesselId=str(detection["tracker_id"]),
+            type=class_name_dict[detection["class_id"]],
+            confidence=float(detection["confidence"]),
+            speed=None,
+            direction=None,
+            bbox=detection["bbox"]
+        )
+        LOGGER.debug("Vessel detected: %s", vessel_detected, extra=PER_FRAME)
+        vessels_detected.append(vessel_detected)
+    return vessels_detected
+
+def selected_weights(default_dir: Path) -> Path:
+    """
+    Get the weights of the selected model, falling back to best.pt in MODEL_PATH or default_dir.
+    """
+    selected_model = mongo_handler.get_selected_model()
+    if selected_model:
+        return Path(selected_model["path"])
+    return Path(os.environ.get("MODEL_PATH", default_dir)) / "best.pt"
+
+def run(
+    weights: Path,
+    source: Path,
+    save_crops: bool = SAVE_CROPS,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    stride: int = VIDEO_FRAME_STRIDE,
+    stop: Optional[threading.Event] = None,
+    video_id: Optional[str] = None,
+):
+    """
+    Detect and track the vessels of a video file and store them on its cameraVideo document.
+
+    Args:
+        start_frame, end_frame (int, optional): The frames to process, to resume a video or
+            process one segment of it.
+        stop (threading.Event, optional): Stops the run with RunCancelled once set.
+        video_id (str, optional): The cameraVideo document of a video already started, for
+            resume and segment runs. Their detections are added to the frames already stored
+            instead of replacing them. Track ids restart with each run, so a segment's tracks
+            are not linked to the tracks of earlier segments.
+
+    Returns:
+        str: The cameraVideo id, or None if the run could not start.
+    """
     # Initialize model, byte_tracker, and annotator
     model = YOLO(weights)
     class_name_dict = model.names
@@ -71,34 +147,75 @@ def run(weights: Path, source: Path):
     byte_tracker = sv.ByteTrack()
     
     video_filename = source.stem
-    location_id = check_and_create_location(video_filename)
-    video_id = create_camera_video_entry(video_filename, location_id)
+    resumed = video_id is not None
+    if resumed:
+        mongo_handler.update_video_status(video_id, "processing", 0.0)
+    else:
+        location_id = check_and_create_location(video_filename)
+        video_id = create_camera_video_entry(video_filename, location_id)
     if not video_id:
         LOGGER.error("Error creating CameraVideo entry")
         return
 
     vesselsDetected = {}
 
-    dataset = LoadImages(source, imgsz=640, vid_stride=1)
-    for idx, (_, img, _, _) in enumerate(dataset):
-        print(f"\n---------Processing frame {idx+1}/{dataset.frames}---------")
-        video_frame = img 
-        detections = run_supervision(video_frame, model, byte_tracker)
-        for detection in detections:
-            vessel_detected = VesselDetected(
-                vesselId=str(detection["tracker_id"]),
-                type=class_name_dict[detection["class_id"]],
-                confidence=float(detection["confidence"]),
-                speed=None,
-                direction=None,
-                bbox=detection["bbox"]
-            )
-            print(f"Vessel detected: {vessel_detected}")
-            if str(idx) not in vesselsDetected:
-                vesselsDetected[str(idx)] = []
-            vesselsDetected[str(idx)].append(vessel_detected)
-        progress = (idx / dataset.frames) * 100.0
-        mongo_handler.update_video_status(video_id, "processing", progress)
-
-    mongo_handler.update_vessels_detected_bulk(video_id, vesselsDetected)
-    mongo_handler.update_video_status(video_id, "done", 100.0)
\ No newline at end of file
+    max_size = VIDEO_DECODE_MAX_SIZE
+    if save_crops and max_size:
+        # Crops and keyframes are cut from the decoded frames, not from the source
+        max_size = max(max_size, KEYFRAME_MAX_SIZE)
+    decoder = open_decoder(source, max_size=max_size)
+    fps = decoder.fps
+    frame_count = decoder.frame_count
+    video_info = {"frameCount": frame_count}
+    if fps:
+        video_info["fps"] = fps
+        video_info["endTime"] = parse_start_time(video_filename) + timedelta(seconds=frame_count / fps)
+    mongo_handler.update_camera_video(video_id, video_info)
+    progress = ProgressReporter(video_id, video_filename)
+    crops = TrackCropCollector() if save_crops else None
+    last_frame = min(end_frame, frame_count) if end_frame is not None else frame_count
+    frames_to_process = max(1, last_frame - start_frame)
+    shadow = ShadowSampler.for_video(video_id, weights, frames_to_process // max(1, stride))
+
+    started = time.perf_counter()
+    frames_processed = 0
+    with decoder:
+        for idx, frame in timed_iter(decoder.frames(start_frame, end_frame, stride), "decode"):
+            if stop is not None and stop.is_set():
+                progress.finish("failed", ((idx - start_frame) / frames_to_process) * 100.0)
+                raise RunCancelled(f"Stopped processing {video_filename} at frame {idx}")
+            frame_started = time.perf_counter()
+            LOGGER.debug("Processing frame %d/%d", idx + 1, frame_count, extra=PER_FRAME)
+            detections = run_supervision(frame, model, byte_tracker, decoder.scale_x, decoder.scale_y)
+            DETECTIONS_PER_FRAME.observe(len(detections))
+            if crops is not None and detections:
+                with stage_timer("crops"):
+                    crops.observe(idx, frame, detections, decoder.scale_x, decoder.scale_y)
+            if shadow is not None:
+                with stage_timer("shadow_sample"):
+                    shadow.observe(idx, frame)
+            with stage_timer("serialization"):
+                if detections:
+                    vesselsDetected[str(idx)] = to_vessels_detected(detections, class_name_dict)
+            with stage_timer("progress"):
+                progress.update(((idx - start_frame) / frames_to_process) * 100.0)
+            frames_processed += 1
+            observe_stage("frame", time.perf_counter() - frame_started)
+
+    elapsed = time.perf_counter() - started
+    if frames_processed and elapsed > 0:
+        VIDEO_FPS.observe(frames_processed / elapsed)
+
+    with stage_timer("db_write"):
+        if resumed:
+            track_crops = crops.save() if crops is not None else {}
+            update_data = {f"trackCrops.{vessel_id}": crop for vessel_id, crop in track_crops.items()}
+            mongo_handler.append_vessels_detected(video_id, vesselsDetected, update_data)
+        else:
+            mongo_handler.update_vessels_detected_bulk(video_id, vesselsDetected)
+            if crops is not None:
+                mongo_handler.update_camera_video(video_id, {"trackCrops": crops.save()})
+        progress.finish("done")
+    if shadow is not None:
+        shadow.submit()
+    return video_id
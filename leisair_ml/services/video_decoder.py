@@ -0,0 +1,203 @@
+"""
+Video decoder backends for detection.
+
+Both backends yield (frame index, BGR frame) pairs and can start at a frame, stop
+before a frame, keep one frame in every stride, and downscale frames so their long
+side is at most max_size:
+
+- pyav: FFmpeg through PyAV. Decodes with frame and slice threads, scales in libswscale
+  as part of the colour conversion, seeks to the keyframe before the start frame, and
+  with a stride above 1 skips decoding non-reference frames altogether.
+- opencv: cv2.VideoCapture. Skipped frames are grabbed without being converted.
+
+open_decoder picks pyav when it is installed, unless VIDEO_DECODER says otherwise.
+"""
+
+import logging
+import os
+from typing import Iterator, Optional, Tuple
+import cv2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+VIDEO_DECODER = os.getenv("VIDEO_DECODER", "auto")
+VIDEO_DECODE_THREADS = int(os.getenv("VIDEO_DECODE_THREADS", "0"))
+# Long side of decoded frames, 0 keeps the source resolution. Detection raises it to
+# KEYFRAME_MAX_SIZE when crops are saved, so they are not cut from a smaller frame
+VIDEO_DECODE_MAX_SIZE = int(os.getenv("VIDEO_DECODE_MAX_SIZE", "640"))
+VIDEO_FRAME_STRIDE = int(os.getenv("VIDEO_FRAME_STRIDE", "1"))
+
+
+def _scaled_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    if not max_size or max(width, height) <= max_size:
+        return width, height
+    scale = max_size / max(width, height)
+    # Even sizes keep the chroma planes aligned for swscale
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+class VideoDecoder:
+    """
+    Base class of the decoder backends.
+
+    Attributes:
+        fps (float): The source frame rate, 0 if unknown.
+        frame_count (int): The number of frames in the source, 0 if unknown.
+        width, height (int): The source resolution.
+        output_width, output_height (int): The resolution of the decoded frames.
+    """
+
+    name = "base"
+
+    def __init__(self, source: str, max_size: int = VIDEO_DECODE_MAX_SIZE, threads: int = VIDEO_DECODE_THREADS):
+        self.source = str(source)
+        self.max_size = max_size
+        self.threads = threads
+        self.fps = 0.0
+        self.frame_count = 0
+        self.width = self.height = 0
+        self.output_width = self.output_height = 0
+
+    @property
+    def scale_x(self) -> float:
+        """
+        The ratio of decoded to source frame width, to map detections back to source coordinates.
+        Each side is rounded on its own, so it can differ slightly from scale_y.
+        """
+        return self.output_width / self.width if self.width else 1.0
+
+    @property
+    def scale_y(self) -> float:
+        """
+        The ratio of decoded to source frame height.
+        """
+        return self.output_height / self.height if self.height else 1.0
+
+    def frames(self, start_frame: int = 0, end_frame: Optional[int] = None, stride: int = 1) -> Iterator[Tuple[int, object]]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class PyAVDecoder(VideoDecoder):
+    name = "pyav"
+
+    def __init__(self, source: str, max_size: int = VIDEO_DECODE_MAX_SIZE, threads: int = VIDEO_DECODE_THREADS):
+        super().__init__(source, max_size, threads)
+        import av
+
+        self.container = av.open(self.source)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self.stream.thread_count = threads
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 0.0
+        self.frame_count = self.stream.frames
+        if not self.frame_count and self.stream.duration and self.fps:
+            self.frame_count = int(self.stream.duration * self.stream.time_base * self.fps)
+        self.width, self.height = self.stream.codec_context.width, self.stream.codec_context.height
+        self.output_width, self.output_height = _scaled_size(self.width, self.height, max_size)
+
+    def _frame_index(self, pts: Optional[int], fallback: int) -> int:
+        if pts is None or not self.fps:
+            return fallback
+        return round((pts - (self.stream.start_time or 0)) * self.stream.time_base * self.fps)
+
+    def frames(self, start_frame: int = 0, end_frame: Optional[int] = None, stride: int = 1) -> Iterator[Tuple[int, object]]:
+        if stride > 1:
+            # Non-reference frames are never needed to decode the frames we keep
+            self.stream.codec_context.skip_frame = "NONREF"
+        if start_frame > 0 and self.fps:
+            # Seeks to the keyframe at or before the start, then decodes forward to it
+            offset = int(start_frame / self.fps / self.stream.time_base) + (self.stream.start_time or 0)
+            self.container.seek(offset, stream=self.stream, backward=True, any_frame=False)
+        next_index = counter = start_frame
+        for frame in self.container.decode(self.stream):
+            index = self._frame_index(frame.pts, counter)
+            counter = index + 1
+            if index < next_index:
+                continue
+            if end_frame is not None and index >= end_frame:
+                break
+            next_index = index + stride
+            image = frame.reformat(width=self.output_width, height=self.output_height, format="bgr24").to_ndarray()
+            yield index, image
+
+    def close(self) -> None:
+        self.container.close()
+
+
+class OpenCVDecoder(VideoDecoder):
+    name = "opencv"
+
+    def __init__(self, source: str, max_size: int = VIDEO_DECODE_MAX_SIZE, threads: int = VIDEO_DECODE_THREADS):
+        super().__init__(source, max_size, threads)
+        self.capture = cv2.VideoCapture(self.source)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Could not open video {self.source}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.output_width, self.output_height = _scaled_size(self.width, self.height, max_size)
+
+    def frames(self, start_frame: int = 0, end_frame: Optional[int] = None, stride: int = 1) -> Iterator[Tuple[int, object]]:
+        if start_frame > 0:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        index = start_frame
+        resize = (self.output_width, self.output_height) != (self.width, self.height)
+        while end_frame is None or index < end_frame:
+            if (index - start_frame) % stride:
+                if not self.capture.grab():
+                    return
+                index += 1
+                continue
+            ok, image = self.capture.read()
+            if not ok:
+                return
+            if resize:
+                image = cv2.resize(image, (self.output_width, self.output_height), interpolation=cv2.INTER_AREA)
+            yield index, image
+            index += 1
+
+    def close(self) -> None:
+        self.capture.release()
+
+
+DECODERS = {decoder.name: decoder for decoder in (PyAVDecoder, OpenCVDecoder)}
+
+
+def open_decoder(
+    source: str,
+    backend: str = VIDEO_DECODER,
+    max_size: int = VIDEO_DECODE_MAX_SIZE,
+    threads: int = VIDEO_DECODE_THREADS,
+) -> VideoDecoder:
+    """
+    Open a video with the given backend; "auto" uses PyAV when it is installed and OpenCV otherwise.
+    """
+    if backend == "auto":
+        try:
+            import av  # noqa: F401
+            backend = PyAVDecoder.name
+        except ImportError:
+            backend = OpenCVDecoder.name
+    if backend not in DECODERS:
+        raise ValueError(f"Unknown video decoder: {backend}")
+    decoder = DECODERS[backend](source, max_size, threads)
+    LOGGER.debug(
+        "Decoding %s with %s at %dx%d (source %dx%d)",
+        source, backend, decoder.output_width, decoder.output_height, decoder.width, decoder.height,
+    )
+    return decoder
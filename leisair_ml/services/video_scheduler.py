@@ -0,0 +1,411 @@
+"""
+Fair-share, freshness-aware scheduling of uploaded videos across camera locations.
+
+Uploaded videos are not sent to the broker straight away. Each one waits in the
+queue of its location (the first word of the filename) and at most
+SCHEDULER_MAX_IN_FLIGHT videos are handed to Celery at a time. When a slot frees
+up, the next video is picked by stride scheduling:
+
+- Every location has a pass value that grows by 1 / weight each time one of its
+  videos is dispatched, and the location with the lowest pass goes next. A camera
+  dumping a backlog therefore gets its weighted share of the workers, not all of them.
+- A location that had nothing queued joins at the current virtual time instead of
+  its old pass, so it cannot bank credit while idle and then monopolise the workers.
+- Footage that started less than SCHEDULER_FRESH_S ago is fresh. Within a location
+  fresh videos go before backfill, and a location whose next video is fresh is
+  treated as SCHEDULER_FRESH_BOOST dispatches ahead of its pass.
+
+As passes only grow, a location with queued videos is served within a bounded
+number of dispatches whatever the others upload; see benchmarks/scheduler_simulation.py.
+
+The queues live in the videoQueue collection so that the API and every worker
+process can dispatch: the API after queueing uploads, a worker after finishing a
+video, and every worker each SCHEDULER_DISPATCH_INTERVAL_S. A lease on the
+schedulerState document serialises dispatching.
+
+A worker running a video sends a heartbeat every SCHEDULER_HEARTBEAT_S. A video
+whose worker was killed stops holding its slot once the heartbeat is
+SCHEDULER_HEARTBEAT_TIMEOUT_S old, or straight away when that worker restarts, and
+is queued again, or failed after SCHEDULER_MAX_ATTEMPTS dispatches. Heartbeats and
+completion only apply to the worker and attempt holding the video, so a run that was
+presumed lost stops at its next frame and cannot release the slot of the new attempt.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from leisair_ml.celery_client import enqueue_process_file
+from leisair_ml.utils.metrics import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+load_dotenv()
+
+LOGGER = logging.getLogger("leisair")
+
+mongo_handler = MongoDBHandler()
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+# Videos handed to the broker at once, about the total concurrency of the workers
+SCHEDULER_MAX_IN_FLIGHT = int(os.getenv("SCHEDULER_MAX_IN_FLIGHT", "4"))
+# Location weights, e.g. "Bridge=2,Harbour=1"; unlisted locations weigh 1
+SCHEDULER_WEIGHTS = os.getenv("SCHEDULER_WEIGHTS", "")
+SCHEDULER_FRESH_S = float(os.getenv("SCHEDULER_FRESH_S", "3600"))
+SCHEDULER_FRESH_BOOST = float(os.getenv("SCHEDULER_FRESH_BOOST", "2"))
+# A dispatched video that no worker has started stops holding a slot after this
+SCHEDULER_DISPATCH_TIMEOUT_S = float(os.getenv("SCHEDULER_DISPATCH_TIMEOUT_S", "3600"))
+SCHEDULER_HEARTBEAT_S = float(os.getenv("SCHEDULER_HEARTBEAT_S", "30"))
+# A running video whose worker has not sent a heartbeat for this long is lost
+SCHEDULER_HEARTBEAT_TIMEOUT_S = float(os.getenv("SCHEDULER_HEARTBEAT_TIMEOUT_S", "180"))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "2"))
+# Dispatches run by each worker on a timer, 0 disables them
+SCHEDULER_DISPATCH_INTERVAL_S = float(os.getenv("SCHEDULER_DISPATCH_INTERVAL_S", "60"))
+SCHEDULER_LOCK_LEASE_S = 30.0
+
+# Celery message priorities, higher first; other tasks use the default of 5
+PRIORITY_FRESH = 8
+PRIORITY_BACKFILL = 3
+
+FILENAME_TIME_FORMAT = "%Y-%m-%d_%H_%M_%S_%f"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """
+    Parse location weights given as "Location=weight,...".
+    """
+    weights = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        location, _, weight = item.partition("=")
+        weights[location.strip()] = float(weight)
+    return weights
+
+
+def video_location(file_path: str) -> str:
+    return Path(file_path).stem.split(" ")[0]
+
+
+def footage_time(file_path: str) -> Optional[datetime]:
+    """
+    The start time of the footage from the filename, or None if it does not have one.
+    """
+    parts = Path(file_path).stem.split(" ")
+    try:
+        return datetime.strptime(parts[1], FILENAME_TIME_FORMAT)
+    except (IndexError, ValueError):
+        return None
+
+
+@dataclass
+class QueuedVideo:
+    file_path: str
+    location: str
+    submitted_at: float
+    footage_time: Optional[datetime] = None
+    batch_id: Optional[str] = None
+    job_id: Optional[str] = None
+    fresh: bool = field(default=False, compare=False)
+
+    def sort_key(self) -> Tuple:
+        # Fresh footage in footage order first, then backfill in arrival order
+        if self.fresh:
+            return (0, self.footage_time, self.submitted_at)
+        return (1, self.submitted_at, self.footage_time or datetime.min)
+
+
+@dataclass
+class RunningVideo:
+    """
+    A dispatch attempt of a video running on a worker. lost is set once the video is no
+    longer this attempt's, e.g. it was requeued after missed heartbeats, and the run should stop.
+    """
+
+    job_id: str
+    worker: str
+    attempt: Optional[int]
+    lost: threading.Event = field(default_factory=threading.Event)
+
+
+class FairShareScheduler:
+    """
+    In-memory per-location queues with weighted stride scheduling and a freshness boost.
+
+    Args:
+        weights (dict, optional): Location weights; unlisted locations weigh 1.
+        fresh_seconds (float, optional): Footage younger than this is fresh.
+        fresh_boost (float, optional): Dispatches by which a fresh video may run ahead of its location's share.
+        passes (dict, optional): Pass values carried over from a previous scheduler.
+        virtual_time (float, optional): Virtual time carried over from a previous scheduler.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        fresh_seconds: float = SCHEDULER_FRESH_S,
+        fresh_boost: float = SCHEDULER_FRESH_BOOST,
+        passes: Optional[Dict[str, float]] = None,
+        virtual_time: float = 0.0,
+    ):
+        self.weights = weights or {}
+        self.fresh_seconds = fresh_seconds
+        self.fresh_boost = fresh_boost
+        self.passes: Dict[str, float] = dict(passes or {})
+        self.virtual_time = virtual_time
+        self.queues: Dict[str, List[Tuple[Tuple, int, QueuedVideo]]] = {}
+        self._sequence = itertools.count()
+
+    def weight(self, location: str) -> float:
+        return self.weights.get(location, 1.0)
+
+    def submit(self, video: QueuedVideo, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        video.fresh = (
+            video.footage_time is not None
+            and now - video.footage_time <= timedelta(seconds=self.fresh_seconds)
+        )
+        queue = self.queues.setdefault(video.location, [])
+        if not queue:
+            # An idle location joins at the current virtual time
+            self.passes[video.location] = max(self.passes.get(video.location, 0.0), self.virtual_time)
+        heapq.heappush(queue, (video.sort_key(), next(self._sequence), video))
+
+    def head(self, location: str) -> Optional[QueuedVideo]:
+        """
+        The video of a location that will be dispatched next.
+        """
+        queue = self.queues.get(location)
+        return queue[0][2] if queue else None
+
+    def depths(self) -> Dict[str, int]:
+        return {location: len(queue) for location, queue in self.queues.items()}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def next(self) -> Optional[QueuedVideo]:
+        """
+        Take the next video to dispatch, or None if every queue is empty.
+        """
+        best_key, best_location = None, None
+        for location, queue in self.queues.items():
+            if not queue:
+                continue
+            stride = 1.0 / self.weight(location)
+            key = self.passes[location]
+            if queue[0][2].fresh:
+                key -= self.fresh_boost * stride
+            if best_key is None or key < best_key:
+                best_key, best_location = key, location
+        if best_location is None:
+            return None
+        _, _, video = heapq.heappop(self.queues[best_location])
+        self.passes[best_location] += 1.0 / self.weight(best_location)
+        self.virtual_time = min(
+            (self.passes[location] for location, queue in self.queues.items() if queue),
+            default=self.virtual_time,
+        )
+        return video
+
+    @staticmethod
+    def priority(video: QueuedVideo) -> int:
+        return PRIORITY_FRESH if video.fresh else PRIORITY_BACKFILL
+
+
+class VideoScheduler:
+    """
+    Dispatches the videos queued in MongoDB to Celery with a FairShareScheduler.
+    """
+
+    def __init__(self, max_in_flight: int = SCHEDULER_MAX_IN_FLIGHT, weights: Optional[Dict[str, float]] = None):
+        self.max_in_flight = max_in_flight
+        self.weights = parse_weights(SCHEDULER_WEIGHTS) if weights is None else weights
+        self._instance = uuid.uuid4().hex
+        self._locations_seen = set()
+
+    @property
+    def _owner(self) -> str:
+        # Forked processes, e.g. Celery pool children, each hold the lease as themselves
+        return f"{self._instance}-{os.getpid()}"
+
+    def submit(self, file_paths: Iterable[str], batch_id: Optional[str] = None) -> List[str]:
+        """
+        Queue videos for detection and dispatch as many as there are free slots.
+
+        Returns:
+            list: The IDs of the queued videos.
+        """
+        now = datetime.now()
+        jobs = [
+            {
+                "filePath": str(file_path),
+                "location": video_location(file_path),
+                "footageTime": footage_time(file_path),
+                "batchId": batch_id,
+                "status": "queued",
+                "submittedAt": now,
+            }
+            for file_path in file_paths
+        ]
+        if not jobs:
+            return []
+        job_ids = mongo_handler.create_queued_videos(jobs)
+        self.dispatch()
+        return job_ids
+
+    @contextmanager
+    def running(self, job_id: str, worker: str):
+        """
+        Mark a dispatched video as running on a worker, and send heartbeats until the block exits.
+
+        Yields:
+            RunningVideo: The attempt, already lost if the video was not dispatched.
+        """
+        video = RunningVideo(job_id, worker, mongo_handler.start_queued_video(job_id, worker))
+        if video.attempt is None:
+            video.lost.set()
+            yield video
+            return
+        stopped = threading.Event()
+
+        def send_heartbeats():
+            while not stopped.wait(SCHEDULER_HEARTBEAT_S):
+                try:
+                    if not mongo_handler.heartbeat_queued_video(job_id, worker, video.attempt):
+                        LOGGER.warning("Video %s was taken from worker %s", job_id, worker)
+                        video.lost.set()
+                        return
+                except Exception as e:
+                    LOGGER.error("Could not send the heartbeat of video %s: %s", job_id, e)
+
+        thread = threading.Thread(target=send_heartbeats, name=f"heartbeat-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield video
+        finally:
+            stopped.set()
+
+    def recover(self, worker: str) -> None:
+        """
+        Requeue the videos that were running on a worker that is starting, then dispatch.
+        """
+        requeued, failed = mongo_handler.requeue_lost_videos(SCHEDULER_MAX_ATTEMPTS, worker=worker)
+        if requeued or failed:
+            LOGGER.warning("Worker %s restarted: %d videos requeued, %d failed", worker, requeued, failed)
+        self.dispatch()
+
+    def complete(self, video: RunningVideo, status: str = "done") -> None:
+        """
+        Release the slot of a finished video, unless it was lost to another attempt, and
+        dispatch the next ones.
+        """
+        if not video.lost.is_set():
+            mongo_handler.finish_queued_video(video.job_id, status, video.worker, video.attempt)
+        self.dispatch()
+
+    def dispatch(self) -> int:
+        """
+        Hand queued videos to Celery until SCHEDULER_MAX_IN_FLIGHT are in flight.
+        Another process already dispatching is asked to run again instead.
+
+        Returns:
+            int: The number of videos dispatched.
+        """
+        dispatched = 0
+        while True:
+            state = mongo_handler.acquire_scheduler_lock(self._owner, SCHEDULER_LOCK_LEASE_S)
+            if state is None:
+                return dispatched
+            scheduler = FairShareScheduler(
+                self.weights, passes=state.get("passes"), virtual_time=state.get("virtualTime", 0.0)
+            )
+            try:
+                dispatched += self._dispatch(scheduler)
+            finally:
+                rerun = mongo_handler.release_scheduler_lock(self._owner, scheduler.passes, scheduler.virtual_time)
+            if not rerun:
+                return dispatched
+
+    def _dispatch(self, scheduler: FairShareScheduler) -> int:
+        now = datetime.now()
+        heartbeat_since = now - timedelta(seconds=SCHEDULER_HEARTBEAT_TIMEOUT_S)
+        requeued, failed = mongo_handler.requeue_lost_videos(SCHEDULER_MAX_ATTEMPTS, heartbeat_before=heartbeat_since)
+        if requeued or failed:
+            LOGGER.warning("Lost the workers of %d videos: %d requeued, %d failed", requeued + failed, requeued, failed)
+        for job in mongo_handler.find_queued_videos():
+            scheduler.submit(
+                QueuedVideo(
+                    file_path=job["filePath"],
+                    location=job["location"],
+                    submitted_at=job["submittedAt"].timestamp(),
+                    footage_time=job.get("footageTime"),
+                    batch_id=job.get("batchId"),
+                    job_id=str(job["_id"]),
+                ),
+                now,
+            )
+        in_flight = mongo_handler.count_in_flight_videos(
+            now - timedelta(seconds=SCHEDULER_DISPATCH_TIMEOUT_S), heartbeat_since
+        )
+        dispatched = 0
+        while in_flight + dispatched < self.max_in_flight:
+            video = scheduler.next()
+            if video is None:
+                break
+            priority = scheduler.priority(video)
+            if not mongo_handler.claim_queued_video(video.job_id, priority):
+                continue
+            enqueue_process_file(video.file_path, video.batch_id, job_id=video.job_id, priority=priority)
+            SCHEDULER_WAIT_SECONDS.labels(video.location).observe(max(0.0, time.time() - video.submitted_at))
+            dispatched += 1
+        depths = scheduler.depths()
+        self._locations_seen.update(depths)
+        for location in self._locations_seen:
+            SCHEDULER_QUEUE_DEPTH.labels(location).set(depths.get(location, 0))
+        if dispatched:
+            LOGGER.info("Dispatched %d videos, %d still queued", dispatched, len(scheduler))
+        return dispatched
+
+
+video_scheduler = VideoScheduler()
+
+
+def start_periodic_dispatch(interval: float = SCHEDULER_DISPATCH_INTERVAL_S) -> Optional[threading.Thread]:
+    """
+    Dispatch every interval seconds on a daemon thread, so slots freed by lost workers
+    are reused without waiting for an upload or a finished video; 0 disables it.
+    """
+    if not SCHEDULER_ENABLED or interval <= 0:
+        return None
+
+    def dispatch_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                video_scheduler.dispatch()
+            except Exception as e:
+                LOGGER.error("Periodic dispatch failed: %s", e)
+
+    thread = threading.Thread(target=dispatch_forever, name="video-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+def schedule_videos(file_paths: Iterable[str], batch_id: Optional[str] = None) -> None:
+    """
+    Queue videos for detection, through the scheduler unless SCHEDULER_ENABLED is false.
+    """
+    if SCHEDULER_ENABLED:
+        video_scheduler.submit(file_paths, batch_id)
+        return
+    for file_path in file_paths:
+        enqueue_process_file(str(file_path), batch_id)
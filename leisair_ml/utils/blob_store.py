@@ -0,0 +1,60 @@
+"""
+Contains the binary blob stores used to keep image bytes out of MongoDB documents.
+"""
+
+import hashlib
+import os
+from typing import Optional
+import gridfs
+from dotenv import load_dotenv
+from pymongo.database import Database
+from leisair_ml.utils.content_store import ContentStore
+
+load_dotenv()
+
+# "gridfs" keeps blobs in the same database, "local" in a content-addressed directory
+BLOB_STORE = os.getenv("BLOB_STORE", "gridfs")
+BLOB_STORE_PATH = os.getenv(
+    "BLOB_STORE_PATH",
+    os.path.join(os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos"), ".blobs"),
+)
+
+
+class GridFSBlobStore:
+    """
+    Stores blobs in a GridFS bucket, keyed by the SHA-256 of their content.
+    """
+
+    name = "gridfs"
+
+    def __init__(self, db: Database, bucket: str = "correctionImages"):
+        self.fs = gridfs.GridFS(db, collection=bucket)
+
+    def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        blob_id = hashlib.sha256(data).hexdigest()
+        if not self.fs.exists(blob_id):
+            self.fs.put(data, _id=blob_id, contentType=content_type)
+        return blob_id
+
+    def get(self, blob_id: str) -> Optional[bytes]:
+        try:
+            return self.fs.get(blob_id).read()
+        except gridfs.NoFile:
+            return None
+
+
+class LocalBlobStore:
+    """
+    Stores blobs in a content-addressed directory without eviction.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = BLOB_STORE_PATH):
+        self.store = ContentStore(root)
+
+    def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        return self.store.put(data)
+
+    def get(self, blob_id: str) -> Optional[bytes]:
+        return self.store.get(blob_id)
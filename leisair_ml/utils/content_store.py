@@ -0,0 +1,129 @@
+"""
+Contains a content-addressed on-disk store with optional size-based eviction.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Set, Union
+
+custom_logger = logging.getLogger("leisair")
+
+CONTENT_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ContentStore:
+    """
+    Stores blobs on disk under the SHA-256 of their content, so identical blobs are stored once.
+
+    When max_bytes is set, the least recently used blobs are evicted once the store grows past it.
+    Reads refresh a blob's modification time, which is used as its last-use time. Blobs whose
+    ids are returned by pinned, e.g. because a document still needs them, are never evicted.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: Optional[int] = None,
+        suffix: str = "",
+        pinned: Optional[Callable[[], Set[str]]] = None,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.pinned = pinned
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, content_id: str) -> Path:
+        return self.root / content_id[:2] / f"{content_id}{self.suffix}"
+
+    def _scan(self) -> list:
+        if not self.root.is_dir():
+            return []
+        return [path for path in self.root.glob(f"*/*{self.suffix}") if path.is_file()]
+
+    def put(self, data: bytes) -> str:
+        """
+        Store a blob and return its content id.
+        """
+        content_id = hashlib.sha256(data).hexdigest()
+        path = self._path(content_id)
+        if path.exists():
+            os.utime(path)
+            return content_id
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+        part_path.write_bytes(data)
+        os.replace(part_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._scan())
+            else:
+                self._size += len(data)
+            if self.max_bytes is not None and self._size > self.max_bytes:
+                self._evict()
+        return content_id
+
+    def path(self, content_id: str) -> Optional[Path]:
+        """
+        Get the path of a stored blob, or None if it is unknown.
+        """
+        if not CONTENT_ID_PATTERN.match(content_id):
+            return None
+        path = self._path(content_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, content_id: str) -> Optional[bytes]:
+        """
+        Read a stored blob, or None if it is unknown.
+        """
+        path = self.path(content_id)
+        return path.read_bytes() if path is not None else None
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used blobs until the store is below 90% of max_bytes.
+        """
+        pinned = set()
+        if self.pinned is not None:
+            try:
+                pinned = self.pinned()
+            except Exception as e:
+                # Evicting a blob that is still needed cannot be undone, so evict nothing
+                custom_logger.error(f"Not evicting from {self.root}, could not get the pinned blobs: {e}")
+                return
+        entries = []
+        for path in self._scan():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if path.name[: -len(self.suffix) or None] in pinned:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._size = total
+        custom_logger.info(f"Evicted {evicted} blobs from {self.root}, {total} bytes remaining")
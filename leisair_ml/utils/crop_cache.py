@@ -0,0 +1,30 @@
+"""
+Contains the configuration and store of the detection-time crop and keyframe cache.
+"""
+
+import os
+from dotenv import load_dotenv
+from leisair_ml.utils.content_store import ContentStore
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+load_dotenv()
+
+SAVE_CROPS = os.getenv("SAVE_CROPS", "false").lower() in ("1", "true", "yes")
+CROP_CACHE_PATH = os.getenv(
+    "CROP_CACHE_PATH",
+    os.path.join(os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/mount-dir/cctv-videos"), ".crops"),
+)
+CROP_CACHE_MAX_BYTES = int(os.getenv("CROP_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CROP_MAX_SIZE = int(os.getenv("CROP_MAX_SIZE", "256"))
+KEYFRAME_MAX_SIZE = int(os.getenv("KEYFRAME_MAX_SIZE", "960"))
+CROP_JPEG_QUALITY = int(os.getenv("CROP_JPEG_QUALITY", "85"))
+CROP_PADDING = 0.1
+
+
+def _correction_keyframes() -> set:
+    # A correction made on a keyframe has no other copy of its image, and is trained on later
+    return MongoDBHandler().find_correction_keyframe_ids()
+
+
+crop_store = ContentStore(CROP_CACHE_PATH, CROP_CACHE_MAX_BYTES, suffix=".jpg", pinned=_correction_keyframes)
+
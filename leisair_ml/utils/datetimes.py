@@ -0,0 +1,15 @@
+"""
+Contains helpers for the naive datetimes stored in MongoDB.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Video times are stored as naive datetimes, so drop any timezone from query values.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -1,4 +1,5 @@
 import asyncio
+import logging
 import os
 import queue
 import httpx
@@ -9,6 +10,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger("leisair")
+
 class NewFileHandler(FileSystemEventHandler):
     def __init__(self, queue):
         self.queue = queue
@@ -43,7 +46,7 @@ class FileWatcher:
 
 
 async def process_file(file_path):
-    print("Starting detection on file: ", file_path)
+    logger.info("Starting detection on file: %s", file_path)
     abs_file_path = os.path.abspath(file_path)
     try:
         async with httpx.AsyncClient() as client:
@@ -53,13 +56,11 @@ async def process_file(file_path):
                 timeout=10,
             )
             response.raise_for_status()
-            print(response.json())
+            logger.info("Detection response: %s", response.json())
     except httpx.HTTPStatusError as e:
-        print(
-            f"Error response {e.response.status_code} while requesting {e.request.url}."
-        )
+        logger.error("Error response %s while requesting %s.", e.response.status_code, e.request.url)
     except httpx.RequestError as e:
-        print(f"An error occurred while requesting {e.request.url}.")
+        logger.error("An error occurred while requesting %s.", e.request.url)
 
 file_watcher = FileWatcher(os.environ.get("VIDEOS_PATH", "C:/Users/ayman/OneDrive - Brunel University London/PhD/NASH Project/file-drop"), process_file)
 
@@ -1,8 +1,80 @@
 """
 Contains a function that creates a custom logger with the given name.
+
+Records are put on a queue by a QueueHandler and formatted and written by a
+QueueListener thread, so logging never blocks the caller on I/O. A forked process,
+e.g. a prefork Celery child, does not inherit the thread and starts its own listener
+on a new queue. Per-frame records,
+logged with `extra=PER_FRAME`, are sampled at LOG_FRAME_SAMPLE_RATE.
 """
 
+import atexit
+import itertools
+import json
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_FRAME_SAMPLE_RATE = float(os.getenv("LOG_FRAME_SAMPLE_RATE", "0.01"))
+
+# Pass as `extra` to mark a record as per-frame, e.g. logger.debug("...", extra=PER_FRAME)
+PER_FRAME = {"per_frame": True}
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "per_frame"}
+
+# Per logger name, the listener and the handler feeding it
+_listeners = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line, including any `extra` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class FrameSampleFilter(logging.Filter):
+    """
+    Let through one in every 1/rate per-frame records; other records always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.interval = round(1 / rate) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "per_frame", False):
+            return True
+        if self.interval == 0:
+            return False
+        return next(self._counter) % self.interval == 0
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records unformatted; the listener thread does the formatting.
+    """
+
+    def prepare(self, record):
+        return record
 
 
 def custom_logger(name):
@@ -10,33 +82,67 @@ def custom_logger(name):
     Create a custom logger with the given name.
     """
     # Define the format for the logs
-    formatter = logging.Formatter(
-        fmt="%(asctime)s %(levelname)-8s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s %(levelname)-8s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+        )
 
-    # Create a stream handler (logs to console)
+    # Create a stream handler (logs to console), driven by a background listener
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(FrameSampleFilter(LOG_FRAME_SAMPLE_RATE))
 
-    # Create a logger with the given name and set its level to DEBUG
+    # Create a logger with the given name
     logger = logging.getLogger(name)
 
     # Remove any existing handlers
     if logger.hasHandlers():
         logger.handlers.clear()
+    if name in _listeners:
+        _listeners.pop(name)[0].stop()
 
     # Set the level of the logger
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(LOG_LEVEL)
 
     # stop logger from propagating to parent
     logger.propagate = False
 
-    # Add the stream handler to the logger
-    logger.addHandler(handler)
+    # Add the queue handler to the logger and start writing records in the background
+    logger.addHandler(queue_handler)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = (listener, queue_handler)
 
     # for when we want to log to a file
     # file_handler = logging.FileHandler('logs.log')
     # file_handler.setFormatter(formatter)
-    # logger.addHandler(file_handler)
+    # listener.handlers += (file_handler,)
 
     return logger
+
+
+def _restart_listeners():
+    # Threads do not survive a fork: the records of a child would pile up in a queue
+    # that nothing drains. Records the parent had not written yet are its own to write.
+    for name, (listener, queue_handler) in list(_listeners.items()):
+        log_queue = queue.SimpleQueue()
+        queue_handler.queue = log_queue
+        child_listener = QueueListener(log_queue, *listener.handlers, respect_handler_level=True)
+        child_listener.start()
+        _listeners[name] = (child_listener, queue_handler)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners)
+
+
+@atexit.register
+def _stop_listeners():
+    # Flush any queued records before the process exits
+    for listener, _ in _listeners.values():
+        listener.stop()
+    _listeners.clear()
@@ -0,0 +1,229 @@
+"""
+Contains the Prometheus metrics and the low-overhead timers used to record them.
+
+Timers only take two perf_counter readings and one histogram observation, a few
+microseconds against tens of milliseconds of inference per frame. With
+PROMETHEUS_MULTIPROC_DIR set, metrics of forked worker processes are aggregated.
+"""
+
+import functools
+import logging
+import os
+import time
+from typing import Callable, Dict
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+custom_logger = logging.getLogger("leisair")
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 21600)
+
+STAGE_SECONDS = Histogram(
+    "leisair_stage_seconds", "Time spent in each video processing stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+VIDEO_FPS = Histogram(
+    "leisair_video_fps", "Frames processed per second, per video",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 240),
+)
+DETECTIONS_PER_FRAME = Histogram(
+    "leisair_detections_per_frame", "Tracked detections per frame", buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "leisair_queue_wait_seconds", "Time between enqueueing a task and a worker starting it", ["task"],
+    buckets=WAIT_BUCKETS,
+)
+MONGO_OP_SECONDS = Histogram(
+    "leisair_mongo_op_seconds", "Time spent in MongoDBHandler operations", ["operation"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "leisair_http_request_seconds", "API request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "leisair_http_response_bytes", "API response body size", ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+LIVE_LATENCY_SECONDS = Histogram(
+    "leisair_live_latency_seconds", "Time from capturing a live frame to emitting its detections",
+    ["location"], buckets=LATENCY_BUCKETS,
+)
+LIVE_FRAMES = Counter("leisair_live_frames", "Live stream frames by outcome", ["location", "outcome"])
+STORAGE_RECLAIMED_BYTES = Counter(
+    "leisair_storage_reclaimed_bytes", "Disk space reclaimed by the storage lifecycle", ["action"]
+)
+STORAGE_FILES = Counter(
+    "leisair_storage_files", "Files deleted or compressed by the storage lifecycle", ["action"]
+)
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "leisair_scheduler_queue_depth", "Videos waiting in the scheduler queue of each location", ["location"],
+    multiprocess_mode="mostrecent",
+)
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "leisair_scheduler_wait_seconds", "Time a video waited in the scheduler queue before being dispatched",
+    ["location"], buckets=WAIT_BUCKETS,
+)
+
+
+class StageTimer:
+    """
+    Context manager recording the time spent in a block under a histogram child.
+    """
+
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+
+_stage_observers: Dict[str, Callable[[float], None]] = {}
+
+
+def _stage_observer(stage: str) -> Callable[[float], None]:
+    observe = _stage_observers.get(stage)
+    if observe is None:
+        observe = _stage_observers[stage] = STAGE_SECONDS.labels(stage).observe
+    return observe
+
+
+def stage_timer(stage: str) -> StageTimer:
+    """
+    Time a block of code as a processing stage, e.g. `with stage_timer("tracking"):`.
+    """
+    return StageTimer(_stage_observer(stage))
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record a stage duration measured elsewhere.
+    """
+    _stage_observer(stage)(seconds)
+
+
+def add_stage_listener(stage: str, listener: Callable[[float], None]) -> None:
+    """
+    Also pass every observation of a stage to a listener, e.g. to compute exact percentiles in benchmarks.
+    Timers that are already running keep their previous observer.
+    """
+    observe = _stage_observer(stage)
+
+    def observe_and_notify(seconds: float) -> None:
+        observe(seconds)
+        listener(seconds)
+
+    _stage_observers[stage] = observe_and_notify
+
+
+def timed_iter(iterable, stage: str):
+    """
+    Iterate over an iterable, recording the time each item took to produce as a stage.
+    """
+    observe = _stage_observer(stage)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(time.perf_counter() - start)
+        yield item
+
+
+def instrument_methods(histogram: Histogram, exclude: tuple = ()):
+    """
+    Class decorator timing every public method under the histogram, labelled by method name.
+    """
+
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not callable(method):
+                continue
+            setattr(cls, name, _timed(method, histogram.labels(name).observe))
+        return cls
+
+    return decorate
+
+
+def _timed(method, observe):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def register_pool_gauges(get_pool_metrics: Callable[[], Dict]) -> None:
+    """
+    Export connection pool usage as gauges read at scrape time.
+    """
+    if MULTIPROCESS:
+        # Callback gauges cannot be aggregated across processes
+        return
+    for key, name, description in (
+        ("checkedOut", "checked_out", "MongoDB connections currently checked out"),
+        ("openConnections", "open_connections", "Open MongoDB connections"),
+        ("avgWaitMs", "avg_wait_ms", "Average MongoDB connection check-out wait in milliseconds"),
+        ("maxWaitMs", "max_wait_ms", "Longest MongoDB connection check-out wait in milliseconds"),
+    ):
+        gauge = Gauge(f"leisair_mongo_pool_{name}", description)
+        gauge.set_function(functools.partial(lambda key: get_pool_metrics()[key], key))
+
+
+def _registry() -> CollectorRegistry:
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    Serve the Prometheus exposition format on the given port, e.g. from a Celery worker.
+    """
+    try:
+        start_http_server(port, registry=_registry())
+        custom_logger.info("Serving metrics on port %d", port)
+    except OSError as e:
+        custom_logger.error("Could not start metrics server on port %d: %s", port, e)
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Drop the live gauges of a forked process that exited; its counters and histograms are kept.
+    """
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+
+def metrics_payload() -> tuple:
+    """
+    Render the current metrics.
+
+    Returns:
+        tuple: The payload and its content type.
+    """
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
@@ -1,20 +1,30 @@
+import base64
 import datetime
 import logging
 import os
 import re
 import threading
+from io import BytesIO
+from PIL import Image
 from leisair_ml.schemas import (
     CameraLocation,
     CameraVideo,
+    CameraVideoView,
+    ImageRef,
     PyObjectId,
     VesselCorrections,
     VesselDetected,
     VideoStatus,
 )
+from leisair_ml.utils.blob_store import BLOB_STORE, GridFSBlobStore, LocalBlobStore
+from leisair_ml.utils.mongo_pool import PoolMetricsListener, pool_options_from_env
+from leisair_ml.utils.write_behind import WriteBehindBuffer
+from leisair_ml.utils.metrics import MONGO_OP_SECONDS, instrument_methods, register_pool_gauges
 from bson.objectid import ObjectId
-from typing import Optional, List, Dict, Union
+from typing import Iterable, Optional, List, Dict, Tuple, Union
 from pymongo.database import Database
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from pymongo.collection import Collection
 from dotenv import load_dotenv
 from nanoid import generate
@@ -23,11 +33,21 @@ load_dotenv()
 
 custom_logger = logging.getLogger("leisair")
 
+STATUS_WRITE_BEHIND = os.getenv("STATUS_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+STATUS_FLUSH_INTERVAL_S = float(os.getenv("STATUS_FLUSH_INTERVAL_S", "2.0"))
+STATUS_FLUSH_MAX_PENDING = int(os.getenv("STATUS_FLUSH_MAX_PENDING", "100"))
+TERMINAL_VIDEO_STATUSES = ("done", "failed")
 
+
+@instrument_methods(MONGO_OP_SECONDS, exclude=("client", "db", "pool_metrics"))
 class MongoDBHandler:
     """
     Singleton class for handling MongoDB operations.
 
+    The MongoClient is created lazily on first use, and again in a child process after a
+    fork, so handlers instantiated at import time are safe under Celery's prefork pool.
+    Pool size, timeouts and write concern are read from MONGODB_* environment variables.
+
     Attributes:
     ----------
         _instance (MongoDBHandler): The singleton instance of the class.
@@ -36,10 +56,13 @@ class MongoDBHandler:
 
     _instance: Optional['MongoDBHandler'] = None
     _lock: threading.Lock = threading.Lock()
-    
+
     # Explicitly type attributes that will be set after __new__
-    client: MongoClient
-    db: Database
+    _client: Optional[MongoClient]
+    _db: Optional[Database]
+    _client_pid: Optional[int]
+    _pool_listener: PoolMetricsListener
+    _status_buffer: WriteBehindBuffer
 
     def __new__(cls) -> 'MongoDBHandler':
         """
@@ -48,19 +71,81 @@ class MongoDBHandler:
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/nash")
-                    try:
-                        instance = super(MongoDBHandler, cls).__new__(cls)
-                        instance.client = MongoClient(connection_string)
-                        instance.db = instance.client.get_database()
-                        cls._instance = instance
-                    except Exception as e:
-                        custom_logger.critical(f"Could not connect to MongoDB: {e}")
-                        raise
+                    instance = super(MongoDBHandler, cls).__new__(cls)
+                    instance._client = None
+                    instance._db = None
+                    instance._client_pid = None
+                    instance._pool_listener = PoolMetricsListener()
+                    instance._status_buffer = WriteBehindBuffer(
+                        lambda: instance._get_collection("videoStatus"),
+                        interval=STATUS_FLUSH_INTERVAL_S,
+                        max_pending=STATUS_FLUSH_MAX_PENDING,
+                    )
+                    cls._instance = instance
         if cls._instance is None:
             raise Exception("Failed to create MongoDBHandler instance")
         return cls._instance
 
+    def _connect(self) -> None:
+        """
+        Create the MongoClient for the current process.
+        """
+        connection_string = os.getenv("MONGODB_URI", "mongodb://localhost:27017/nash")
+        options = pool_options_from_env()
+        try:
+            # A client inherited through fork must not be used or closed by the child
+            self._pool_listener.reset()
+            self._client = MongoClient(connection_string, event_listeners=[self._pool_listener], **options)
+            self._db = self._client.get_database()
+            self._client_pid = os.getpid()
+            custom_logger.info(f"Created MongoDB client for process {self._client_pid} with options {options}")
+        except Exception as e:
+            custom_logger.critical(f"Could not connect to MongoDB: {e}")
+            raise
+
+    @property
+    def client(self) -> MongoClient:
+        """
+        The MongoClient of the current process, created on first use.
+        """
+        self._ensure_connected()
+        return self._client
+
+    @property
+    def db(self) -> Database:
+        """
+        The default database of the connection string.
+        """
+        self._ensure_connected()
+        return self._db
+
+    def _ensure_connected(self) -> None:
+        """
+        Connect on first use, and again in a child process after a fork.
+        """
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    self._connect()
+
+    def use_client(self, client: MongoClient) -> None:
+        """
+        Use an existing client for the current process, e.g. a local stand-in in benchmarks.
+        """
+        with self._lock:
+            self._client = client
+            self._db = client.get_database("nash")
+            self._client_pid = os.getpid()
+
+    def pool_metrics(self) -> Dict:
+        """
+        Get connection pool usage of the current process.
+        """
+        metrics = self._pool_listener.snapshot()
+        metrics["connected"] = self._client is not None and self._client_pid == os.getpid()
+        metrics["maxPoolSize"] = self.client.options.pool_options.max_pool_size if metrics["connected"] else None
+        return metrics
+
     def _get_collection(self, collection_name: str) -> Collection:
         """
         Get a MongoDB collection.
@@ -73,15 +158,15 @@ class MongoDBHandler:
         Create a new camera location.
         """
         collection = self._get_collection("cameraLocation")
-        print("Inserting:", location.model_dump(by_alias=True))
+        custom_logger.debug("Inserting camera location: %s", location.model_dump(by_alias=True))
         try:
             result = collection.insert_one(
                 location.model_dump(by_alias=True, exclude_none=True)
             )
-            print(f"Created camera location: {result.inserted_id}")
+            custom_logger.info("Created camera location: %s", result.inserted_id)
             return str(result.inserted_id)
         except Exception as e:
-            print("Error while inserting:", e)
+            custom_logger.error("Error while inserting camera location: %s", e)
             return None
 
     def read_camera_location(self, location_id: str) -> Union[CameraLocation, None]:
@@ -137,6 +222,103 @@ class MongoDBHandler:
         document = collection.find_one({"_id": ObjectId(video_id)})
         return CameraVideo(**document) if document is not None else None
 
+    def read_camera_video_view(
+        self, video_id: str, fields: Optional[Iterable[str]] = None, validate: bool = False
+    ) -> Union[CameraVideoView, None]:
+        """
+        Read a camera video by ID as a lightweight view, loading only the given fields.
+
+        Args:
+            video_id (str): The camera video ID.
+            fields (iterable, optional): The fields to load, e.g. ["filename", "startTime"] or
+                ["vesselsDetected.120"]. All fields are loaded if omitted.
+            validate (bool, optional): Validate detections when they are accessed instead of
+                trusting the stored data.
+        """
+        fields = None if fields is None else list(fields)
+        projection = None if fields is None else {field: 1 for field in fields}
+        document = self.read_camera_video_fields(video_id, projection)
+        return CameraVideoView(document, fields, validate) if document is not None else None
+
+    def read_camera_video_fields(self, video_id: str, projection: Dict) -> Union[Dict, None]:
+        """
+        Read selected fields of a camera video by ID without validating the document.
+        """
+        collection = self._get_collection("cameraVideo")
+        return collection.find_one({"_id": ObjectId(video_id)}, projection)
+
+    def find_camera_videos(
+        self,
+        location_id: str,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        after: Optional[tuple] = None,
+        limit: int = 50,
+        projection: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        Find camera videos of a location ordered by start time.
+
+        Args:
+            location_id (str): The camera location ID.
+            start (datetime, optional): Only videos starting at or after this time.
+            end (datetime, optional): Only videos starting before this time.
+            after (tuple, optional): A (startTime, _id) cursor; only videos after it are returned.
+            limit (int, optional): The maximum number of videos to return.
+            projection (dict, optional): The fields to return.
+        """
+        collection = self._get_collection("cameraVideo")
+        query: Dict = {"locationId": location_id}
+        time_range = {}
+        if start is not None:
+            time_range["$gte"] = start
+        if end is not None:
+            time_range["$lt"] = end
+        if time_range:
+            query["startTime"] = time_range
+        if after is not None:
+            after_time, after_id = after
+            query["$or"] = [
+                {"startTime": {"$gt": after_time}},
+                {"startTime": after_time, "_id": {"$gt": after_id}},
+            ]
+        documents = (
+            collection.find(query, projection)
+            .sort([("startTime", 1), ("_id", 1)])
+            .limit(limit)
+        )
+        return list(documents)
+
+    def get_last_detected_frame(self, video_id: str) -> Union[int, None]:
+        """
+        Get the highest frame number in vesselsDetected, computed on the server.
+        """
+        collection = self._get_collection("cameraVideo")
+        pipeline = [
+            {"$match": {"_id": ObjectId(video_id)}},
+            {
+                "$project": {
+                    "lastFrame": {
+                        "$max": {
+                            "$map": {
+                                "input": {"$objectToArray": {"$ifNull": ["$vesselsDetected", {}]}},
+                                "in": {"$toInt": "$$this.k"},
+                            }
+                        }
+                    }
+                }
+            },
+        ]
+        result = list(collection.aggregate(pipeline))
+        return result[0].get("lastFrame") if result else None
+
+    def ensure_camera_video_indexes(self) -> None:
+        """
+        Create the indexes used by the camera video queries.
+        """
+        collection = self._get_collection("cameraVideo")
+        collection.create_index([("locationId", 1), ("startTime", 1), ("_id", 1)])
+
     def update_camera_video(self, video_id: str, update_data: Dict) -> bool:
         """
         Update a camera video.
@@ -163,11 +345,32 @@ class MongoDBHandler:
         # Prepare the update data
         update_data = {"vesselsDetected": vessels_detected_dict}
 
-        # Update the document
+        # Update the document, bumping the version clients use for caching
         result = collection.update_one(
-            {"_id": ObjectId(video_id)}, {"$set": update_data}
+            {"_id": ObjectId(video_id)},
+            {"$set": update_data, "$inc": {"processingVersion": 1}},
+        )
+        custom_logger.debug("Modified count: %s", result.modified_count)
+        return result.modified_count > 0
+
+    def append_vessels_detected(
+        self, video_id: str, vessels_detected: Dict[str, List[VesselDetected]], update_data: Optional[Dict] = None
+    ) -> bool:
+        """
+        Add the detections of new frames to a cameraVideo document without rewriting earlier frames.
+        """
+        collection = self._get_collection("cameraVideo")
+        set_data = {
+            f"vesselsDetected.{frame}": [vessel.model_dump() for vessel in vessels]
+            for frame, vessels in vessels_detected.items()
+        }
+        set_data.update(update_data or {})
+        if not set_data:
+            return False
+        result = collection.update_one(
+            {"_id": ObjectId(video_id)},
+            {"$set": set_data, "$inc": {"processingVersion": 1}},
         )
-        print("Modified count:", result.modified_count)
         return result.modified_count > 0
 
     def delete_camera_video(self, video_id: str) -> bool:
@@ -178,6 +381,95 @@ class MongoDBHandler:
         result = collection.delete_one({"_id": ObjectId(video_id)})
         return result.deleted_count > 0
 
+    def iter_camera_videos(self, projection: Optional[Dict] = None, batch_size: int = 50):
+        """
+        Iterate over all camera videos with a batched cursor.
+        """
+        collection = self._get_collection("cameraVideo")
+        return collection.find({}, projection, batch_size=batch_size)
+
+    # Traffic rollups
+    def mark_video_rolled_up(self, video_id: str, applied: bool = True) -> bool:
+        """
+        Flag whether a video has been added to the traffic rollups.
+
+        Returns:
+            bool: True if the flag changed, so a video is only ever claimed once.
+        """
+        collection = self._get_collection("cameraVideo")
+        result = collection.update_one(
+            {"_id": ObjectId(video_id), "rollupApplied": {"$ne": applied}},
+            {"$set": {"rollupApplied": applied}},
+        )
+        return result.modified_count > 0
+
+    def apply_traffic_rollups(self, location_id: str, counts: Dict[tuple, int]) -> None:
+        """
+        Increment the unique track counts of the traffic rollup documents.
+
+        Args:
+            location_id (str): The camera location ID.
+            counts (dict): Counts keyed by (granularity, bucket start, vessel type).
+        """
+        if not counts:
+            return
+        collection = self._get_collection("vesselTrafficRollups")
+        operations = [
+            UpdateOne(
+                {"_id": f"{location_id}|{granularity}|{bucket.isoformat()}|{vessel_type}"},
+                {
+                    "$inc": {"count": count},
+                    "$setOnInsert": {
+                        "locationId": location_id,
+                        "granularity": granularity,
+                        "bucketStart": bucket,
+                        "type": vessel_type,
+                    },
+                },
+                upsert=True,
+            )
+            for (granularity, bucket, vessel_type), count in counts.items()
+        ]
+        collection.bulk_write(operations, ordered=False)
+
+    def find_traffic_rollups(
+        self,
+        location_id: str,
+        granularity: str,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> List[Dict]:
+        """
+        Get the traffic rollups of a location ordered by bucket.
+        """
+        collection = self._get_collection("vesselTrafficRollups")
+        query: Dict = {"locationId": location_id, "granularity": granularity}
+        time_range = {}
+        if start is not None:
+            time_range["$gte"] = start
+        if end is not None:
+            time_range["$lt"] = end
+        if time_range:
+            query["bucketStart"] = time_range
+        documents = collection.find(query, {"_id": 0}).sort([("bucketStart", 1), ("type", 1)])
+        return list(documents)
+
+    def clear_traffic_rollups(self) -> None:
+        """
+        Delete all traffic rollups and reset the per-video flags.
+        """
+        self._get_collection("vesselTrafficRollups").delete_many({})
+        self._get_collection("cameraVideo").update_many(
+            {"rollupApplied": True}, {"$set": {"rollupApplied": False}}
+        )
+
+    def ensure_traffic_rollup_indexes(self) -> None:
+        """
+        Create the index used by the traffic rollup queries.
+        """
+        collection = self._get_collection("vesselTrafficRollups")
+        collection.create_index([("locationId", 1), ("granularity", 1), ("bucketStart", 1)])
+
     # CRUD operations for VideoStatus
     def create_video_status(
         self, video_id: str, filename: str, status: str, progress: float
@@ -204,25 +496,43 @@ class MongoDBHandler:
         Read a video status by ID.
         """
         collection = self._get_collection("videoStatus")
-        document = collection.find_one({"_id": ObjectId(status_id)})
+        document = collection.find_one({"_id": status_id})
         return VideoStatus(**document) if document else None
 
     def update_video_status(self, id: str, status: str, progress: float) -> bool:
         """
         Update an existing video status entry.
+
+        Updates are buffered and coalesced per video and written by a background thread;
+        terminal statuses are written immediately together with anything still pending.
         """
-        collection = self._get_collection("videoStatus")
         update_data = {
             "status": status,
             "progress": progress,
             "updatedAt": datetime.datetime.now(),
         }
+        if STATUS_WRITE_BEHIND:
+            self._status_buffer.set(id, update_data)
+            if status in TERMINAL_VIDEO_STATUSES:
+                self.flush_video_status()
+            return True
+
+        collection = self._get_collection("videoStatus")
         result = collection.update_one(
             {"_id": id},  # Assuming video_id is the filename
             {"$set": update_data},
         )
         return result.modified_count > 0
 
+    def flush_video_status(self) -> int:
+        """
+        Write all buffered video status updates now.
+
+        Returns:
+            int: The number of status documents written.
+        """
+        return self._status_buffer.flush()
+
     def delete_video_status(self, status_id: str) -> bool:
         """
         Delete a video status.
@@ -231,6 +541,249 @@ class MongoDBHandler:
         result = collection.delete_one({"_id": ObjectId(status_id)})
         return result.deleted_count > 0
 
+    def read_video_statuses(self, video_ids: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Get the status of every video, or of the given videos, by video ID.
+        """
+        collection = self._get_collection("videoStatus")
+        query = {"_id": {"$in": video_ids}} if video_ids is not None else {}
+        return {document["_id"]: document["status"] for document in collection.find(query, {"status": 1})}
+
+    def find_video_statuses_by_filename(self, filenames: List[str]) -> List[Dict]:
+        """
+        Find the status documents of videos by filename (without extension).
+        """
+        collection = self._get_collection("videoStatus")
+        projection = {"filename": 1, "status": 1, "updatedAt": 1, "createdAt": 1, "retention": 1}
+        return list(collection.find({"filename": {"$in": filenames}}, projection))
+
+    def mark_video_retention(self, filename: str, action: str, bytes_reclaimed: int) -> bool:
+        """
+        Record that the source file of a video was deleted or compressed by the storage lifecycle.
+        """
+        collection = self._get_collection("videoStatus")
+        result = collection.update_many(
+            {"filename": filename},
+            {"$set": {
+                "retention": action,
+                "retainedAt": datetime.datetime.now(),
+                "bytesReclaimed": bytes_reclaimed,
+            }},
+        )
+        return result.modified_count > 0
+
+    # CRUD operations for video batches
+    def create_video_batch(self, batch_id: str, filenames: List[str]) -> str:
+        """
+        Create a batch status document for a set of uploaded files.
+        """
+        collection = self._get_collection("videoBatches")
+        result = collection.insert_one(
+            {
+                "_id": batch_id,
+                "status": "queued",
+                "total": len(filenames),
+                "completed": 0,
+                "failed": 0,
+                "files": [{"filename": filename, "status": "queued"} for filename in filenames],
+                "createdAt": datetime.datetime.now(),
+            }
+        )
+        return str(result.inserted_id)
+
+    def read_video_batch(self, batch_id: str) -> Union[Dict, None]:
+        """
+        Read a batch status document by ID.
+        """
+        collection = self._get_collection("videoBatches")
+        return collection.find_one({"_id": batch_id})
+
+    def update_video_batch(self, batch_id: str, update_data: Dict) -> bool:
+        """
+        Update a batch status document.
+        """
+        collection = self._get_collection("videoBatches")
+        result = collection.update_one({"_id": batch_id}, {"$set": update_data})
+        return result.modified_count > 0
+
+    def mark_video_batch_file(
+        self, batch_id: str, filename: str, status: str, video_id: Optional[str] = None
+    ) -> bool:
+        """
+        Record the outcome of one file of a batch and close the batch once every file is finished.
+        """
+        collection = self._get_collection("videoBatches")
+        update_data: Dict = {"files.$[file].status": status, "updatedAt": datetime.datetime.now()}
+        if video_id:
+            update_data["files.$[file].videoId"] = video_id
+        result = collection.update_one(
+            {"_id": batch_id},
+            {"$set": update_data, "$inc": {"failed" if status == "failed" else "completed": 1}},
+            array_filters=[{"file.filename": filename}],
+        )
+        collection.update_one(
+            {"_id": batch_id, "$expr": {"$gte": [{"$add": ["$completed", "$failed"]}, "$total"]}},
+            {"$set": {"status": "done"}},
+        )
+        return result.modified_count > 0
+
+    # CRUD operations for the video scheduler queue
+    def create_queued_videos(self, jobs: List[Dict]) -> List[str]:
+        """
+        Add videos to the scheduler queue.
+        """
+        collection = self._get_collection("videoQueue")
+        result = collection.insert_many(jobs)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    def find_queued_videos(self) -> List[Dict]:
+        """
+        Find the videos waiting in the scheduler queue.
+        """
+        collection = self._get_collection("videoQueue")
+        projection = {"filePath": 1, "location": 1, "footageTime": 1, "batchId": 1, "submittedAt": 1}
+        return list(collection.find({"status": "queued"}, projection))
+
+    def count_in_flight_videos(self, dispatched_since: datetime.datetime, heartbeat_since: datetime.datetime) -> int:
+        """
+        Count the videos waiting in the broker since a time, and the videos running on a
+        worker that sent a heartbeat since a time.
+        """
+        collection = self._get_collection("videoQueue")
+        return collection.count_documents({"$or": [
+            {"status": "dispatched", "dispatchedAt": {"$gte": dispatched_since}},
+            {"status": "running", "heartbeatAt": {"$gte": heartbeat_since}},
+        ]})
+
+    def claim_queued_video(self, job_id: str, priority: int) -> bool:
+        """
+        Mark a queued video as dispatched. Returns False if it was no longer queued.
+        """
+        collection = self._get_collection("videoQueue")
+        result = collection.update_one(
+            {"_id": ObjectId(job_id), "status": "queued"},
+            {
+                "$set": {"status": "dispatched", "priority": priority, "dispatchedAt": datetime.datetime.now()},
+                "$inc": {"attempts": 1},
+            },
+        )
+        return result.modified_count > 0
+
+    def start_queued_video(self, job_id: str, worker: str) -> Union[int, None]:
+        """
+        Mark a dispatched video as running on a worker.
+
+        Returns:
+            int: The dispatch attempt that is running, None if the video was not dispatched.
+        """
+        collection = self._get_collection("videoQueue")
+        now = datetime.datetime.now()
+        document = collection.find_one_and_update(
+            {"_id": ObjectId(job_id), "status": "dispatched"},
+            {"$set": {"status": "running", "worker": worker, "startedAt": now, "heartbeatAt": now}},
+            projection={"attempts": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return document.get("attempts", 0) if document else None
+
+    def heartbeat_queued_video(self, job_id: str, worker: str, attempt: int) -> bool:
+        """
+        Record that the worker of a running video is still alive. Returns False if the video
+        is no longer running as that attempt on that worker, e.g. it was requeued.
+        """
+        collection = self._get_collection("videoQueue")
+        result = collection.update_one(
+            {"_id": ObjectId(job_id), "status": "running", "worker": worker, "attempts": attempt},
+            {"$set": {"heartbeatAt": datetime.datetime.now()}},
+        )
+        return result.matched_count > 0
+
+    def requeue_lost_videos(
+        self, max_attempts: int, heartbeat_before: Optional[datetime.datetime] = None, worker: Optional[str] = None
+    ) -> Tuple[int, int]:
+        """
+        Put the running videos whose worker is gone back in the queue, or fail them once
+        they have been dispatched max_attempts times. A worker is gone when its last
+        heartbeat is before heartbeat_before, or when it is the given worker, e.g. restarting.
+
+        Returns:
+            tuple: The numbers of videos requeued and failed.
+        """
+        collection = self._get_collection("videoQueue")
+        lost = {"status": "running"}
+        if worker is not None:
+            lost["worker"] = worker
+        else:
+            lost["heartbeatAt"] = {"$lt": heartbeat_before}
+        requeued = collection.update_many(
+            {**lost, "attempts": {"$lt": max_attempts}},
+            {"$set": {"status": "queued"}, "$unset": {"worker": "", "startedAt": "", "heartbeatAt": ""}},
+        )
+        failed = collection.update_many(lost, {"$set": {"status": "failed", "finishedAt": datetime.datetime.now()}})
+        return requeued.modified_count, failed.modified_count
+
+    def finish_queued_video(self, job_id: str, status: str, worker: str, attempt: int) -> bool:
+        """
+        Mark a video running as an attempt on a worker as done or failed, releasing its slot.
+        Returns False if the video is no longer that attempt's.
+        """
+        collection = self._get_collection("videoQueue")
+        result = collection.update_one(
+            {"_id": ObjectId(job_id), "status": "running", "worker": worker, "attempts": attempt},
+            {"$set": {"status": status, "finishedAt": datetime.datetime.now()}},
+        )
+        return result.modified_count > 0
+
+    def acquire_scheduler_lock(self, owner: str, lease_s: float) -> Union[Dict, None]:
+        """
+        Take the lease on the scheduler state. When another process holds it, ask that
+        process to dispatch once more and return None.
+
+        Returns:
+            dict: The scheduler state, with the passes and virtual time of the last dispatch.
+        """
+        collection = self._get_collection("schedulerState")
+        for _ in range(2):
+            now = datetime.datetime.now()
+            try:
+                return collection.find_one_and_update(
+                    {"_id": "videoQueue", "$or": [{"lockedUntil": None}, {"lockedUntil": {"$lt": now}}]},
+                    {"$set": {
+                        "lockedBy": owner,
+                        "lockedUntil": now + datetime.timedelta(seconds=lease_s),
+                        "rerun": False,
+                    }},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # The holder may have released it in the meantime, hence the second attempt
+                collection.update_one({"_id": "videoQueue"}, {"$set": {"rerun": True}})
+        return None
+
+    def release_scheduler_lock(self, owner: str, passes: Dict[str, float], virtual_time: float) -> bool:
+        """
+        Save the scheduler state and release the lease.
+
+        Returns:
+            bool: True if another process asked for a dispatch while the lease was held.
+        """
+        collection = self._get_collection("schedulerState")
+        previous = collection.find_one_and_update(
+            {"_id": "videoQueue", "lockedBy": owner},
+            {"$set": {"passes": passes, "virtualTime": virtual_time, "lockedUntil": None, "rerun": False}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        return bool(previous and previous.get("rerun"))
+
+    def ensure_video_queue_indexes(self) -> None:
+        """
+        Create the indexes of the scheduler queue lookups.
+        """
+        collection = self._get_collection("videoQueue")
+        collection.create_index([("status", 1), ("dispatchedAt", 1)])
+        collection.create_index([("status", 1), ("heartbeatAt", 1)])
+
     # Other operations
 
     def get_all_camera_locations(self) -> List[CameraLocation]:
@@ -241,13 +794,97 @@ class MongoDBHandler:
         documents = collection.find()
         return [CameraLocation(**document) for document in documents]
     
-    def get_all_vessel_corrections(self) -> List[VesselCorrections]:
+    def get_all_vessel_corrections(self, unused_only: bool = False) -> List[VesselCorrections]:
         """
-        Get all vessel corrections.
+        Get all vessel corrections, or only those not yet used for training.
         """
         collection = self._get_collection("vesselCorrections")
-        documents = collection.find()
+        query = {"used": {"$ne": True}} if unused_only else {}
+        documents = collection.find(query)
         return [VesselCorrections(**document) for document in documents]
+
+    def find_correction_keyframe_ids(self) -> set:
+        """
+        Get the ids of the cached keyframes that corrections use as their only image.
+        """
+        collection = self._get_collection("vesselCorrections")
+        query = {"keyframeId": {"$type": "string"}, "imageRef": None, "image": {"$in": [None, ""]}}
+        return set(collection.distinct("keyframeId", query))
+
+    # Correction images
+    def _get_blob_store(self, name: str = BLOB_STORE):
+        """
+        Get the blob store with the given name.
+        """
+        if name == GridFSBlobStore.name:
+            return GridFSBlobStore(self.db)
+        if name == LocalBlobStore.name:
+            return LocalBlobStore()
+        raise ValueError(f"Unknown blob store: {name}")
+
+    def store_correction_image(self, data: bytes, content_type: Optional[str] = None) -> ImageRef:
+        """
+        Save image bytes to the blob store and return the reference kept in the document.
+        """
+        width, height = Image.open(BytesIO(data)).size
+        blob_store = self._get_blob_store()
+        blob_id = blob_store.put(data, content_type)
+        return ImageRef(
+            store=blob_store.name,
+            id=blob_id,
+            contentType=content_type,
+            width=width,
+            height=height,
+            size=len(data),
+        )
+
+    def read_correction_image(self, correction: VesselCorrections) -> Union[bytes, None]:
+        """
+        Get the image bytes of a correction, whether stored inline or in the blob store.
+        """
+        if correction.imageRef is not None:
+            return self._get_blob_store(correction.imageRef.store).get(correction.imageRef.id)
+        if correction.image:
+            return base64.b64decode(re.sub("^data:image/.+;base64,", "", correction.image))
+        return None
+
+    def migrate_correction_images(self, batch_size: int = 100) -> int:
+        """
+        Move inline base64 correction images to the blob store, one batch at a time.
+
+        Returns:
+            int: The number of corrections migrated.
+        """
+        collection = self._get_collection("vesselCorrections")
+        query = {"image": {"$type": "string"}, "imageRef": {"$exists": False}}
+        migrated = 0
+        failed_ids = []
+        while True:
+            batch = list(
+                collection.find({**query, "_id": {"$nin": failed_ids}}, {"image": 1}).limit(batch_size)
+            )
+            if not batch:
+                return migrated
+            operations = []
+            for document in batch:
+                match = re.match("^data:(image/[^;]+);base64,", document["image"])
+                try:
+                    data = base64.b64decode(document["image"][match.end():] if match else document["image"])
+                    image_ref = self.store_correction_image(data, match.group(1) if match else None)
+                except Exception as e:
+                    custom_logger.error(f"Could not migrate correction image {document['_id']}: {e}")
+                    failed_ids.append(document["_id"])
+                    continue
+                operations.append(
+                    UpdateOne(
+                        {"_id": document["_id"]},
+                        {"$set": {"imageRef": image_ref.model_dump()}, "$unset": {"image": ""}},
+                    )
+                )
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+                migrated += len(operations)
+                custom_logger.info(f"Migrated {migrated} correction images")
     
     def update_vessel_correction_to_used(self, correction_id: PyObjectId) -> bool:
         """
@@ -285,17 +922,43 @@ class MongoDBHandler:
         )
         return result.modified_count > 0
     
-    def upsert_model(self, model_id:str, weights_path: str, status:str) -> bool:
+    def upsert_model(self, model_id:str, weights_path: str, status:str, selected: bool = True) -> bool:
         """
         Upsert a new model to the database.
         """
         collection = self._get_collection("mlModels")
         result = collection.update_one(
             {"_id": model_id},
-            {"$set": {"path": weights_path, "status": status, "selected": True}},
+            {"$set": {"path": weights_path, "status": status, "selected": selected}},
             upsert=True,
         )
         return result.modified_count > 0
+
+    def update_model_evaluation(self, model_id: str, evaluation: Dict) -> bool:
+        """
+        Store the holdout evaluation results of a model.
+        """
+        collection = self._get_collection("mlModels")
+        result = collection.update_one(
+            {"_id": model_id}, {"$set": {"evaluation": evaluation}}
+        )
+        return result.modified_count > 0
+
+    def promote_model(self, model_id: str) -> bool:
+        """
+        Select a model and deselect every other model.
+        """
+        collection = self._get_collection("mlModels")
+        # Select first, so there is always a selected model for process_file to load
+        result = collection.update_one(
+            {"_id": model_id}, {"$set": {"status": "trained", "selected": True, "shadowCandidate": False}}
+        )
+        if result.matched_count == 0:
+            return False
+        collection.update_many(
+            {"_id": {"$ne": model_id}, "selected": True}, {"$set": {"selected": False}}
+        )
+        return result.modified_count > 0
     
     def get_selected_model(self):
         """
@@ -303,4 +966,59 @@ class MongoDBHandler:
         """
         collection = self._get_collection("mlModels")
         document = collection.find_one({"selected": True})
-        return document
\ No newline at end of file
+        return document
+
+    def read_model(self, model_id: str) -> Union[Dict, None]:
+        """
+        Read a model by ID.
+        """
+        collection = self._get_collection("mlModels")
+        return collection.find_one({"_id": model_id})
+
+    def set_shadow_model(self, model_id: str) -> bool:
+        """
+        Make a model the shadow candidate, replacing any other, and reset its shadow statistics.
+        """
+        collection = self._get_collection("mlModels")
+        collection.update_many(
+            {"_id": {"$ne": model_id}, "shadowCandidate": True}, {"$set": {"shadowCandidate": False}}
+        )
+        result = collection.update_one(
+            {"_id": model_id},
+            {"$set": {"shadowCandidate": True, "shadowStartedAt": datetime.datetime.now()}, "$unset": {"shadowStats": ""}},
+        )
+        return result.matched_count > 0
+
+    def clear_shadow_model(self) -> bool:
+        """
+        Stop shadowing the current candidate.
+        """
+        collection = self._get_collection("mlModels")
+        result = collection.update_many({"shadowCandidate": True}, {"$set": {"shadowCandidate": False}})
+        return result.modified_count > 0
+
+    def get_shadow_model(self) -> Union[Dict, None]:
+        """
+        Get the shadow candidate model.
+        """
+        collection = self._get_collection("mlModels")
+        return collection.find_one({"shadowCandidate": True}, {"path": 1, "status": 1})
+
+    def record_shadow_evaluation(self, model_id: str, evaluation: Dict, increments: Dict) -> str:
+        """
+        Store the shadow comparison of one video and add its totals to the model's shadow statistics.
+        """
+        result = self._get_collection("shadowEvaluations").insert_one(
+            {"modelId": model_id, **evaluation, "createdAt": datetime.datetime.now()}
+        )
+        self._get_collection("mlModels").update_one(
+            {"_id": model_id},
+            {
+                "$inc": {f"shadowStats.{key}": value for key, value in increments.items()},
+                "$set": {"shadowStats.updatedAt": datetime.datetime.now()},
+            },
+        )
+        return str(result.inserted_id)
+
+
+register_pool_gauges(lambda: MongoDBHandler().pool_metrics())
@@ -0,0 +1,119 @@
+"""
+Contains the MongoDB connection pool configuration and a pool metrics listener.
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+from pymongo import monitoring
+
+
+def _int_env(name: str):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+
+def pool_options_from_env() -> Dict:
+    """
+    Build MongoClient pool, timeout and write concern options from environment variables.
+    Unset variables keep the pymongo defaults.
+    """
+    options = {
+        "maxPoolSize": _int_env("MONGODB_MAX_POOL_SIZE"),
+        "minPoolSize": _int_env("MONGODB_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _int_env("MONGODB_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _int_env("MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+        "connectTimeoutMS": _int_env("MONGODB_CONNECT_TIMEOUT_MS"),
+        "socketTimeoutMS": _int_env("MONGODB_SOCKET_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _int_env("MONGODB_SERVER_SELECTION_TIMEOUT_MS"),
+    }
+    write_concern = os.getenv("MONGODB_WRITE_CONCERN_W")
+    if write_concern:
+        options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    journal = os.getenv("MONGODB_WRITE_CONCERN_J")
+    if journal:
+        options["journal"] = journal.lower() in ("1", "true", "yes")
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks connection pool usage: open and checked-out connections and check-out wait times.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.open_connections = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.total_wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "openConnections": self.open_connections,
+                "checkedOut": self.checked_out,
+                "maxCheckedOut": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkoutFailures": self.checkout_failures,
+                "avgWaitMs": (self.total_wait_seconds / self.checkouts * 1000.0) if self.checkouts else 0.0,
+                "maxWaitMs": self.max_wait_seconds * 1000.0,
+            }
+
+    def _wait_time(self) -> float:
+        started = getattr(self._local, "checkout_started", None)
+        self._local.checkout_started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._wait_time()
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_check_out_failed(self, event):
+        self._wait_time()
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
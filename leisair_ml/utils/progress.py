@@ -0,0 +1,182 @@
+"""
+Video processing progress events: throttled publishing from workers through Redis pub/sub,
+coalesced videoStatus checkpoints in MongoDB, and fan-out to API subscribers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional, Set
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+from leisair_ml.utils.mongo_handler import MongoDBHandler
+
+load_dotenv()
+
+custom_logger = logging.getLogger("leisair")
+
+REDIS_URL = os.getenv("REDIS_URL")
+PROGRESS_CHANNEL = os.getenv("PROGRESS_CHANNEL", "leisair:progress")
+# Publish at most once per interval (seconds) unless progress moved by PROGRESS_STEP percent; 0 disables either rule
+PROGRESS_INTERVAL_S = float(os.getenv("PROGRESS_INTERVAL_S", "1.0"))
+PROGRESS_STEP = float(os.getenv("PROGRESS_STEP", "0"))
+# How often the videoStatus document is checkpointed while processing
+PROGRESS_CHECKPOINT_S = float(os.getenv("PROGRESS_CHECKPOINT_S", "10.0"))
+# How long the latest event of a video is kept in Redis for status polls
+PROGRESS_LATEST_TTL_S = int(os.getenv("PROGRESS_LATEST_TTL_S", "3600"))
+
+
+def latest_progress_key(video_id: str) -> str:
+    return f"{PROGRESS_CHANNEL}:{video_id}"
+
+
+class ProgressPublisher:
+    """
+    Publishes progress events to Redis. Publishing never raises: when Redis is not
+    configured or unreachable the events are dropped and MongoDB checkpoints remain.
+    """
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, channel: str = PROGRESS_CHANNEL):
+        self.redis_url = redis_url
+        self.channel = channel
+        self._client: Optional[redis.Redis] = None
+        self._failed = False
+
+    def _get_client(self) -> Optional[redis.Redis]:
+        if self._client is None and self.redis_url:
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def publish(self, event: dict) -> None:
+        client = self._get_client()
+        if client is None:
+            return
+        payload = json.dumps(event)
+        try:
+            pipeline = client.pipeline(transaction=False)
+            pipeline.publish(self.channel, payload)
+            pipeline.set(latest_progress_key(event["videoId"]), payload, ex=PROGRESS_LATEST_TTL_S)
+            pipeline.execute()
+            self._failed = False
+        except redis.RedisError as e:
+            if not self._failed:
+                custom_logger.warning(f"Could not publish progress: {e}")
+            self._failed = True
+
+    def latest(self, video_id: str) -> Optional[dict]:
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            payload = client.get(latest_progress_key(video_id))
+        except redis.RedisError as e:
+            custom_logger.warning(f"Could not read progress: {e}")
+            return None
+        return json.loads(payload) if payload else None
+
+
+publisher = ProgressPublisher()
+
+
+class ProgressReporter:
+    """
+    Tracks the progress of one video. Every update is cheap; events are published when
+    the throttle allows and videoStatus is only written every PROGRESS_CHECKPOINT_S.
+    """
+
+    def __init__(self, video_id: str, filename: str, progress_publisher: ProgressPublisher = publisher):
+        self.video_id = video_id
+        self.filename = filename
+        self.publisher = progress_publisher
+        self.mongo_handler = MongoDBHandler()
+        self._last_published_at = 0.0
+        self._last_published_progress = -1.0
+        self._last_checkpoint_at = time.monotonic()
+
+    def _event(self, status: str, progress: float) -> dict:
+        return {
+            "videoId": self.video_id,
+            "filename": self.filename,
+            "status": status,
+            "progress": progress,
+            "timestamp": time.time(),
+        }
+
+    def update(self, progress: float, status: str = "processing") -> None:
+        now = time.monotonic()
+        due_by_time = PROGRESS_INTERVAL_S > 0 and now - self._last_published_at >= PROGRESS_INTERVAL_S
+        due_by_step = PROGRESS_STEP > 0 and progress - self._last_published_progress >= PROGRESS_STEP
+        if due_by_time or due_by_step:
+            self.publisher.publish(self._event(status, progress))
+            self._last_published_at = now
+            self._last_published_progress = progress
+
+        if now - self._last_checkpoint_at >= PROGRESS_CHECKPOINT_S:
+            self.mongo_handler.update_video_status(self.video_id, status, progress)
+            self._last_checkpoint_at = now
+
+    def finish(self, status: str = "done", progress: float = 100.0) -> None:
+        self.publisher.publish(self._event(status, progress))
+        self.mongo_handler.update_video_status(self.video_id, status, progress)
+
+
+class ProgressBroadcaster:
+    """
+    Holds a single Redis subscription per API process and fans events out to
+    per-subscriber queues. Slow subscribers lose their oldest events.
+    """
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, channel: str = PROGRESS_CHANNEL, queue_size: int = 100):
+        self.redis_url = redis_url
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.redis_url)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _dispatch(self, event: dict) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while self._subscribers:
+            client = aioredis.Redis.from_url(self.redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._dispatch(json.loads(message["data"]))
+            except redis.RedisError as e:
+                custom_logger.warning(f"Progress subscription lost: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                await pubsub.close()
+                await client.close()
+
+
+broadcaster = ProgressBroadcaster()
@@ -0,0 +1,152 @@
+"""
+Latest released versions of our images on the container registry, cached in-process.
+
+One pooled httpx client is shared by all lookups. A parsed version is fresh for
+REGISTRY_CACHE_TTL_S; after that it is still served for up to REGISTRY_STALE_TTL_S
+while a single background request revalidates it with If-None-Match, so a 304 costs
+no download or parsing. Concurrent lookups of the same package share one request.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+import httpx
+from dotenv import load_dotenv
+from packaging import version
+
+load_dotenv()
+
+custom_logger = logging.getLogger("leisair")
+
+REGISTRY_URL = os.getenv("REGISTRY_URL", "https://ghcr.io")
+REGISTRY_CACHE_TTL_S = float(os.getenv("REGISTRY_CACHE_TTL_S", "300"))
+REGISTRY_STALE_TTL_S = float(os.getenv("REGISTRY_STALE_TTL_S", "86400"))
+REGISTRY_TIMEOUT_S = float(os.getenv("REGISTRY_TIMEOUT_S", "10"))
+
+UNKNOWN_VERSION = "unknown"
+
+
+def latest_semantic_tag(tags: Iterable[str]) -> str:
+    """
+    Get the highest released semantic version among the tags, skipping pre-releases,
+    dev releases and tags that are not versions.
+    """
+    latest_tag, latest_version = UNKNOWN_VERSION, None
+    for tag in tags:
+        try:
+            parsed_version = version.parse(tag)
+        except version.InvalidVersion:
+            custom_logger.debug("Skipping non-semantic version tag: %s", tag)
+            continue
+        if parsed_version.is_prerelease or parsed_version.is_devrelease:
+            continue
+        if latest_version is None or parsed_version > latest_version:
+            latest_tag, latest_version = tag, parsed_version
+    return latest_tag
+
+
+class _CachedVersion:
+    __slots__ = ("version", "etag", "fetched_at")
+
+    def __init__(self, version: str, etag: Optional[str], fetched_at: float):
+        self.version = version
+        self.etag = etag
+        self.fetched_at = fetched_at
+
+
+class RegistryVersions:
+    """
+    Looks up the latest version of a package on the registry.
+
+    Args:
+        base_url (str, optional): The registry URL.
+        ttl (float, optional): Seconds a version is served without revalidating.
+        stale_ttl (float, optional): Seconds a version may be served while it is revalidated.
+        transport (httpx.AsyncBaseTransport, optional): The transport of the shared client,
+            e.g. an httpx.MockTransport to run without network.
+    """
+
+    def __init__(
+        self,
+        base_url: str = REGISTRY_URL,
+        ttl: float = REGISTRY_CACHE_TTL_S,
+        stale_ttl: float = REGISTRY_STALE_TTL_S,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: Dict[str, _CachedVersion] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {os.getenv('ENCODED_GITHUB_TOKEN')}"},
+                timeout=REGISTRY_TIMEOUT_S,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def latest_version(self, package_name: str) -> str:
+        """
+        Get the latest released version of a package, or "unknown" if it cannot be determined.
+        """
+        cached = self._cache.get(package_name)
+        if cached is not None:
+            age = time.monotonic() - cached.fetched_at
+            if age < self.ttl:
+                return cached.version
+            if age < self.stale_ttl:
+                self._fetch(package_name)
+                return cached.version
+        # Shield the shared request from the cancellation of any one caller
+        return await asyncio.shield(self._fetch(package_name))
+
+    def _fetch(self, package_name: str) -> asyncio.Future:
+        task = self._inflight.get(package_name)
+        if task is None:
+            task = asyncio.ensure_future(self._request(package_name))
+            self._inflight[package_name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(package_name, None))
+        return task
+
+    async def _request(self, package_name: str) -> str:
+        cached = self._cache.get(package_name)
+        headers = {"If-None-Match": cached.etag} if cached is not None and cached.etag else {}
+        url = f"/v2/{os.getenv('GITHUB_USERNAME')}/{package_name}/tags/list"
+        try:
+            response = await self._get_client().get(url, headers=headers)
+        except httpx.HTTPError as e:
+            custom_logger.warning("Could not reach the registry for %s: %s", package_name, e)
+            return cached.version if cached is not None else UNKNOWN_VERSION
+
+        if response.status_code == 304 and cached is not None:
+            cached.fetched_at = time.monotonic()
+            return cached.version
+        if response.is_error:
+            custom_logger.warning("Registry returned %d for %s", response.status_code, package_name)
+            return cached.version if cached is not None else UNKNOWN_VERSION
+
+        try:
+            tags = response.json().get("tags") or []
+        except ValueError as e:
+            custom_logger.warning("Invalid registry response for %s: %s", package_name, e)
+            return cached.version if cached is not None else UNKNOWN_VERSION
+        latest = latest_semantic_tag(tags)
+        self._cache[package_name] = _CachedVersion(latest, response.headers.get("etag"), time.monotonic())
+        return latest
+
+
+registry_versions = RegistryVersions()
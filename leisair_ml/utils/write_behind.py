@@ -0,0 +1,88 @@
+"""
+Contains a coalescing write-behind buffer for MongoDB $set updates.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from typing import Callable, Dict
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+custom_logger = logging.getLogger("leisair")
+
+
+class WriteBehindBuffer:
+    """
+    Buffers $set updates per document id and writes them in a single bulk_write.
+
+    Repeated updates to the same document are merged, so only the latest values are
+    written. A background thread flushes every `interval` seconds, or sooner once
+    `max_pending` documents are waiting. Flushes are serialized, so a synchronous
+    flush always lands after any flush that was already in flight.
+    """
+
+    def __init__(self, get_collection: Callable[[], Collection], interval: float = 1.0, max_pending: int = 100):
+        self.get_collection = get_collection
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread_pid = None
+        atexit.register(self.flush)
+
+    def _ensure_thread(self) -> None:
+        # Threads do not survive a fork, so each process starts its own flusher
+        if self._thread_pid == os.getpid():
+            return
+        with self._pending_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="write-behind", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                custom_logger.error(f"Write-behind flush failed: {e}")
+
+    def set(self, document_id, fields: Dict) -> None:
+        """
+        Queue a $set of fields on a document.
+        """
+        self._ensure_thread()
+        with self._pending_lock:
+            self._pending.setdefault(document_id, {}).update(fields)
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write every pending update now.
+
+        Returns:
+            int: The number of documents written.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            operations = [UpdateOne({"_id": document_id}, {"$set": fields}) for document_id, fields in pending.items()]
+            try:
+                self.get_collection().bulk_write(operations, ordered=False)
+            except Exception:
+                # Put the updates back unless newer values arrived meanwhile
+                with self._pending_lock:
+                    for document_id, fields in pending.items():
+                        self._pending[document_id] = {**fields, **self._pending.get(document_id, {})}
+                raise
+            return len(operations)
@@ -0,0 +1,150 @@
+import asyncio
+import unittest
+from unittest import mock
+import httpx
+from leisair_ml.utils import registry_versions
+from leisair_ml.utils.registry_versions import UNKNOWN_VERSION, RegistryVersions, latest_semantic_tag
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRegistry:
+    """
+    Plays the registry on an httpx.MockTransport: serves the current tags with an ETag,
+    and 304 when If-None-Match matches it. Requests wait for `release` when it is set.
+    """
+
+    def __init__(self, tags):
+        self.tags = list(tags)
+        self.etag = '"v1"'
+        self.status_code = 200
+        self.requests = []
+        self.release = None
+        self.transport = httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.release is not None:
+            await self.release.wait()
+        if self.status_code != 200:
+            return httpx.Response(self.status_code)
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, json={"tags": self.tags}, headers={"ETag": self.etag})
+
+    def publish(self, tags, etag: str) -> None:
+        self.tags, self.etag = list(tags), etag
+
+
+class RegistryVersionsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(registry_versions.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = FakeRegistry(["1.0.0", "1.2.0", "latest", "2.0.0rc1"])
+        self.versions = RegistryVersions(ttl=60, stale_ttl=3600, transport=self.registry.transport)
+
+    async def asyncTearDown(self):
+        await self.versions.aclose()
+
+    async def revalidated(self) -> None:
+        await asyncio.gather(*list(self.versions._inflight.values()))
+
+    async def test_fresh_version_is_served_from_the_cache(self):
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        self.clock.now += 59
+        self.registry.publish(["1.3.0"], '"v2"')
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        self.assertEqual(len(self.registry.requests), 1)
+
+    async def test_expired_version_is_fetched_again(self):
+        await self.versions.latest_version("leisair-ml")
+        self.clock.now += 3600
+        self.registry.publish(["1.3.0"], '"v2"')
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.3.0")
+        self.assertEqual(len(self.registry.requests), 2)
+
+    async def test_stale_version_is_served_while_one_request_revalidates_it(self):
+        await self.versions.latest_version("leisair-ml")
+        self.clock.now += 120
+        self.registry.publish(["1.3.0"], '"v2"')
+
+        stale = await asyncio.gather(*(self.versions.latest_version("leisair-ml") for _ in range(5)))
+        self.assertEqual(stale, ["1.2.0"] * 5)
+        await self.revalidated()
+
+        self.assertEqual(len(self.registry.requests), 2)
+        self.assertEqual(self.registry.requests[1].headers["if-none-match"], '"v1"')
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.3.0")
+        self.assertEqual(len(self.registry.requests), 2)
+
+    async def test_not_modified_keeps_the_version_and_makes_it_fresh(self):
+        await self.versions.latest_version("leisair-ml")
+        self.clock.now += 120
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        await self.revalidated()
+        self.clock.now += 59
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        self.assertEqual(len(self.registry.requests), 2)
+
+    async def test_expired_version_is_revalidated_with_its_etag(self):
+        await self.versions.latest_version("leisair-ml")
+        self.clock.now += 3600
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        self.assertEqual(self.registry.requests[1].headers["if-none-match"], '"v1"')
+
+    async def test_concurrent_lookups_share_one_request(self):
+        self.registry.release = asyncio.Event()
+        lookups = asyncio.gather(*(self.versions.latest_version("leisair-ml") for _ in range(10)))
+        await asyncio.sleep(0)
+        self.registry.release.set()
+
+        self.assertEqual(await lookups, ["1.2.0"] * 10)
+        self.assertEqual(len(self.registry.requests), 1)
+
+    async def test_cancelled_lookup_does_not_cancel_the_shared_request(self):
+        self.registry.release = asyncio.Event()
+        first = asyncio.ensure_future(self.versions.latest_version("leisair-ml"))
+        second = asyncio.ensure_future(self.versions.latest_version("leisair-ml"))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.registry.release.set()
+
+        self.assertEqual(await second, "1.2.0")
+        self.assertEqual(len(self.registry.requests), 1)
+
+    async def test_registry_error_serves_the_cached_version(self):
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+        self.clock.now += 3600
+        self.registry.status_code = 503
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), "1.2.0")
+
+    async def test_registry_error_without_a_cached_version_is_unknown(self):
+        self.registry.status_code = 503
+
+        self.assertEqual(await self.versions.latest_version("leisair-ml"), UNKNOWN_VERSION)
+
+
+class LatestSemanticTagTest(unittest.TestCase):
+    def test_skips_pre_releases_and_non_versions(self):
+        self.assertEqual(latest_semantic_tag(["1.9.0", "1.10.0", "2.0.0rc1", "2.0.0.dev1", "latest"]), "1.10.0")
+
+    def test_no_release_is_unknown(self):
+        self.assertEqual(latest_semantic_tag(["latest", "main"]), UNKNOWN_VERSION)
+
+
+if __name__ == "__main__":
+    unittest.main()